@@ -1,32 +1,34 @@
+"""Aggregate per-site metrics: count, mean, min, max, p50/p75/p95 and a 95% CI.
+
+summarize() computes every statistic for every metric in one vectorised
+pass over a (groups x sites x metrics) array, optionally grouped by green
+hosting, carbon.txt presence or audit round (from history.sqlite). summary()
+keeps the ungrouped result per frame, so within one build aggregated.csv/.tex/.md,
+the spreadsheet and the averages all come from a single pass.
+
+With --runs the per-run rows in history.sqlite are aggregated through
+mergeable quantile sketches (sketch.py): one sketch per round is built
+by streaming the rows in chunks and cached in evidence/sketches, so only
+new rounds are read.
+
+Usage:
+    python aggregate.py [--by green|carbon_txt|round]
+    python aggregate.py --runs
+"""
+import argparse
+import json
+import warnings
+import weakref
 from pathlib import Path
-import pandas as pd
+
 import numpy as np
+import pandas as pd
 
-# Locate evidence folder
-evidence_dir = Path(__file__).resolve().parents[2] / "evidence"
-csv_path = evidence_dir / "summary.csv"
-if not csv_path.exists():
-    csv_path = evidence_dir / "results.csv"
-if not csv_path.exists():
-    raise SystemExit(f"No summary.csv or results.csv found in {evidence_dir}")
-
-df = pd.read_csv(csv_path)
-
-# Normalize dtypes
-num_cols = [
-    "performanceScore", "transferBytes", "requests", "jsBytes",
-    "co2_onebyte_grams", "co2_swd_grams",
-    "fcp_ms", "lcp_ms", "speed_index_ms", "tbt_ms", "cls"
-]
-for c in num_cols:
-    if c in df.columns:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
+import dataset
+from stats import bootstrap_ci
 
-# Derive MB columns for readability
-if "transferBytes" in df.columns:
-    df["transferMB"] = df["transferBytes"] / 1e6
-if "jsBytes" in df.columns:
-    df["jsMB"] = df["jsBytes"] / 1e6
+# Locate evidence folder
+evidence_dir = dataset.evidence_dir
 
 metrics_to_aggregate = [
     ("performanceScore", "score (0–100)"),
@@ -41,81 +43,262 @@ metrics_to_aggregate = [
     ("co2_onebyte_grams", "grams"),
     ("co2_swd_grams", "grams"),
 ]
+# Raw byte columns are summarised too (not written to aggregated.csv) so the
+# spreadsheet averages come from the same result
+extra_metrics = [("transferBytes", "bytes"), ("jsBytes", "bytes")]
+
+STAT_COLUMNS = ["mean", "min", "max", "p50", "p75", "p95", "ci_low", "ci_high"]
+QUANTILES = {"p50": 0.50, "p75": 0.75, "p95": 0.95}
+GROUPINGS = ("green", "carbon_txt", "round")
+
+# id(frame) -> (weak reference, columns, summarize() result) for the frames still alive
+_summaries = {}
+
+# Decimals per unit for presentation
+DECIMALS = {"MB": 2, "ms": 1, "grams": 1, "unitless": 4, "score (0–100)": 0, "count": 0}
+
+
+# Round for presentation
+def round_stats(agg):
+    """Round every statistic of `agg` to its unit, one vectorised step per unit."""
+    agg = agg.copy()
+    cols = [c for c in STAT_COLUMNS if c in agg.columns]
+    for unit, decimals in DECIMALS.items():
+        rows = agg["unit"] == unit
+        if rows.any():
+            agg.loc[rows, cols] = agg.loc[rows, cols].round(decimals)
+    return agg
+
+
+def derive(df):
+    # Derive MB columns for readability
+    if "transferBytes" in df.columns:
+        df = df.assign(transferMB=df["transferBytes"] / 1e6)
+    if "jsBytes" in df.columns:
+        df = df.assign(jsMB=df["jsBytes"] / 1e6)
+    return df
+
+
+def green_labels(df):
+    # normalize to strings: green/not_green/unknown
+    if "greenHosting" not in df.columns:
+        return pd.Series("unknown", index=df.index)
+    labels = {"true": "green", "1.0": "green", "false": "not_green", "0.0": "not_green"}
+    return df["greenHosting"].astype(str).str.lower().map(labels).fillna("unknown")
+
+
+def carbon_txt_labels(df, evidence_dir=evidence_dir):
+    """yes/no/unknown per site from hosting/carbon_txt.json and saved *_carbon.txt files."""
+    hosting = Path(evidence_dir) / "hosting"
+    found = {}
+    try:
+        with open(hosting / "carbon_txt.json", encoding="utf-8") as f:
+            found = {k: v.get("found") for k, v in json.load(f).items()}
+    except (OSError, ValueError):
+        pass
+    found.update({p.name[:-len("_carbon.txt")]: True for p in hosting.glob("*_carbon.txt")})
+    return df["domain"].astype(str).map(found).map({True: "yes", False: "no"}).fillna("unknown")
+
+
+def group_labels(df, by, evidence_dir=evidence_dir):
+    if by == "green":
+        return green_labels(df)
+    if by == "carbon_txt":
+        return carbon_txt_labels(df, evidence_dir)
+    if by == "round":
+        return df["round"].astype(str)
+    raise ValueError(f"unknown grouping {by!r}; expected one of {', '.join(GROUPINGS)}")
+
+
+def _pack(values, codes, n_groups):
+    """Scatter (rows x metrics) values into a NaN-padded (groups x rows-per-group x metrics) array."""
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    sizes = np.bincount(codes, minlength=n_groups)
+    pos = np.arange(len(codes)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    packed = np.full((n_groups, int(sizes.max(initial=0)), values.shape[1]), np.nan)
+    packed[sorted_codes, pos] = values[order]
+    return packed
+
+
+def summarize(df, by=None, evidence_dir=evidence_dir, ci=True):
+    """All statistics for all metrics (optionally per group) in one pass; values are not rounded."""
+    df = derive(df)
+    metrics = [(c, u) for c, u in metrics_to_aggregate + extra_metrics if c in df.columns]
+    cols = [c for c, _ in metrics]
+    values = df[cols].to_numpy(dtype=np.float64)
+    if by:
+        codes, groups = pd.factorize(group_labels(df, by, evidence_dir), sort=True)
+    else:
+        codes, groups = np.zeros(len(df), dtype=np.int64), [None]
+    packed = _pack(values, codes, len(groups))  # (groups, rows, metrics)
+
+    with warnings.catch_warnings():
+        # all-NaN groups/metrics are expected and come out as NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        stats = {
+            "sites": (~np.isnan(packed)).sum(axis=1),
+            "mean": np.nanmean(packed, axis=1),
+            "min": np.nanmin(packed, axis=1),
+            "max": np.nanmax(packed, axis=1),
+        }
+        qs = np.nanquantile(packed, list(QUANTILES.values()), axis=1)
+    stats.update(zip(QUANTILES, qs))
+    if ci:
+        # 95% bootstrap CI of the mean; every (group, metric) pair is one resampled row
+        g, n, m = packed.shape
+        _, low, high = bootstrap_ci(packed.transpose(0, 2, 1).reshape(g * m, n), stat="mean")
+        stats["ci_low"], stats["ci_high"] = low.reshape(g, m), high.reshape(g, m)
+
+    agg = pd.DataFrame({
+        "metric": np.tile(cols, len(groups)),
+        "unit": np.tile([u for _, u in metrics], len(groups)),
+        **{k: v.ravel() for k, v in stats.items()},
+    })
+    if by:
+        agg.insert(0, by, np.repeat(np.asarray(groups, dtype=object), len(cols)))
+    agg = agg[agg["sites"] > 0]
+    return agg.sort_values(([by] if by else []) + ["metric"]).reset_index(drop=True)
+
+
+def summary(df):
+    """summarize(df), computed once per frame and shared by every caller; do not modify it."""
+    key = id(df)
+    hit = _summaries.get(key)
+    if hit is not None and hit[0]() is df and hit[1] == tuple(df.columns):
+        return hit[2]
+    result = summarize(df)
+    _summaries[key] = (weakref.ref(df, lambda _, key=key: _summaries.pop(key, None)), tuple(df.columns), result)
+    return result
+
+
+def aggregate(df, by=None, evidence_dir=evidence_dir):
+    """Rounded table of the aggregated.csv metrics plus green hosting counts."""
+    agg = summarize(df, by, evidence_dir) if by else summary(df)
+    agg = agg[agg["metric"].isin([c for c, _ in metrics_to_aggregate])]
+    agg = round_stats(agg.astype({"sites": int})).reset_index(drop=True)
+
+    # Green hosting counts
+    green_counts = green_labels(df).value_counts().to_dict() if "greenHosting" in df.columns else {}
+    return agg, green_counts
+
+
+def write_outputs(agg, green_counts, evidence_dir=evidence_dir, by=None):
+    name = f"aggregated_by_{by}" if by else "aggregated"
+    out_csv = evidence_dir / f"{name}.csv"
+    out_tex = evidence_dir / f"{name}_table.tex"
+    out_md = evidence_dir / f"{name}.md"
+
+    agg.to_csv(out_csv, index=False)
+
+    # LaTeX (booktabs) table for the paper
+    caption = "Aggregated results across all municipalities" + (f" by {by.replace('_', '.')}" if by else "")
+    with open(out_tex, "w", encoding="utf-8") as f:
+        f.write("\\begin{table}[h]\n\\centering\n")
+        f.write(f"\\caption{{{caption}}}\n\\label{{tab:{name}}}\n")
+        f.write("\\begin{tabular}{" + ("l" if by else "") + "lrrrrrr}\n\\toprule\n")
+        f.write(("Group & " if by else "") + "Metric & Sites & Mean & Median & P95 & Min & Max \\\\\n\\midrule\n")
+        for r in agg.itertuples(index=False):
+            group = f"{getattr(r, by)} & " if by else ""
+            f.write(f"{group}{r.metric} ({r.unit}) & {int(r.sites)} & {r.mean} & {r.p50} & {r.p95} & "
+                    f"{r.min} & {r.max} \\\\\n")
+        f.write("\\bottomrule\n\\end{tabular}\n\\end{table}\n")
+
+    # Markdown summary
+    lines = ["# Aggregated metrics" + (f" by {by}" if by else ""), "", agg.to_markdown(index=False)]
+    if green_counts:
+        lines += ["", "## Green hosting counts", ""]
+        for k in ("green", "not_green", "unknown"):
+            if k in green_counts:
+                lines.append(f"- {k.replace('_',' ').title()}: {green_counts[k]}")
+    with open(out_md, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+    return [out_csv, out_tex, out_md]
+
+
+def run_sketches(db, cache_dir, metrics=None):
+    """{round label: QuantileSketch} of the per-run rows in history.sqlite, cached per round."""
+    import history
+    from sketch import QuantileSketch
+
+    metrics = list(metrics or [*history.RUN_METRICS, "requests"])
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    index = {m: i for i, m in enumerate(metrics)}
+    sketches = {}
+    with history.History(db) as h:
+        for r in h.rounds().itertuples(index=False):
+            path = cache_dir / f"run_metrics_round{r.id}.npz"
+            if path.exists():
+                cached = QuantileSketch.load(path)
+                if cached.metrics == metrics:
+                    sketches[r.label] = cached
+                    continue
+            # rounds are append-only, so a round's sketch never goes stale
+            sk = QuantileSketch(metrics)
+            for metric, values in h.iter_run_values(r.id, metrics):
+                sk.update_long(np.full(len(values), index[metric]), values)
+            sk.save(path)
+            sketches[r.label] = sk
+    return sketches
+
+
+def _sketch_frame(label, sk):
+    qs = sk.quantiles(list(QUANTILES.values()))
+    seen = sk.count > 0
+    frame = pd.DataFrame({"round": label, "metric": sk.metrics, "runs": sk.count, "mean": sk.mean(),
+                          "min": np.where(seen, sk.min, np.nan), "max": np.where(seen, sk.max, np.nan),
+                          **dict(zip(QUANTILES, qs))})
+    return frame[seen]
+
+
+def summarize_sketches(sketches):
+    """Per-round and overall ("all") statistics from run sketches."""
+    from sketch import QuantileSketch
+
+    frames, total = [], None
+    for label, sk in sketches.items():
+        frames.append(_sketch_frame(label, sk))
+        if total is None:
+            total = QuantileSketch(sk.metrics, sk.rel_err, sk.min_value, sk.max_value)
+        total.merge(sk)
+    if total is None:
+        return pd.DataFrame(columns=["round", "metric", "runs", "mean", "min", "max", *QUANTILES])
+    frames.append(_sketch_frame("all", total))
+    return pd.concat(frames, ignore_index=True)
+
+
+def main(df=None, evidence_dir=evidence_dir, by=None):
+    if df is None:
+        df = dataset.load(evidence_dir=evidence_dir)
+    agg, green_counts = aggregate(df, by, evidence_dir)
+    outputs = write_outputs(agg, green_counts, Path(evidence_dir), by)
+    for p in outputs:
+        print(f"Saved: {p}")
+    if green_counts:
+        print("Green hosting counts:", green_counts)
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate per-site metrics")
+    parser.add_argument("--evidence", type=Path, default=evidence_dir)
+    parser.add_argument("--by", choices=GROUPINGS, help="group sites (round reads history.sqlite)")
+    parser.add_argument("--runs", action="store_true", help="aggregate per-run rows of history.sqlite via sketches")
+    args = parser.parse_args()
+
+    if args.runs:
+        import history
+
+        out = args.evidence / "aggregated_runs.csv"
+        summarize_sketches(run_sketches(args.evidence / history.DB_NAME, args.evidence / "sketches")).to_csv(
+            out, index=False)
+        print(f"Saved: {out}")
+    elif args.by == "round":
+        import history
 
-rows = []
-for col, unit in metrics_to_aggregate:
-    if col in df.columns:
-        s = df[col].dropna()
-        if len(s) == 0:
-            continue
-        rows.append({
-            "metric": col,
-            "unit": unit,
-            "sites": int(s.count()),
-            "mean": float(s.mean()),
-            "min": float(s.min()),
-            "max": float(s.max()),
-        })
-
-agg = pd.DataFrame(rows).sort_values("metric")
-
-# Round for presentation 
-def round_col(series, unit):
-    if unit in ("MB",):
-        return series.round(2)
-    if unit in ("ms", "grams"):
-        return series.round(1)
-    if unit in ("unitless",):
-        return series.round(4)
-    if unit in ("score (0–100)", "count"):
-        return series.round(0)
-    return series
-
-for i, row in agg.iterrows():
-    unit = row["unit"]
-    for k in ("mean", "min", "max"):
-        agg.at[i, k] = round_col(pd.Series([row[k]]), unit).iloc[0]
-
-# Green hosting counts
-green_counts = {}
-if "greenHosting" in df.columns:
-    # normalize to strings: true/false/unknown
-    gh = df["greenHosting"].astype(str).str.lower().map(
-        {"true": "green", "false": "not_green"}
-    ).fillna("unknown")
-    green_counts = gh.value_counts().to_dict()
-
-# Write outputs
-out_csv = evidence_dir / "aggregated.csv"
-out_tex = evidence_dir / "aggregated_table.tex"
-out_md = evidence_dir / "aggregated.md"
-
-agg.to_csv(out_csv, index=False)
-
-# LaTeX (booktabs) table for the paper
-with open(out_tex, "w", encoding="utf-8") as f:
-    f.write("\\begin{table}[h]\n\\centering\n")
-    f.write("\\caption{Aggregated results across all municipalities}\n\\label{tab:aggregated}\n")
-    f.write("\\begin{tabular}{lrrrr}\n\\toprule\n")
-    f.write("Metric & Sites & Mean & Min & Max \\\\\n\\midrule\n")
-    for _, r in agg.iterrows():
-        name = r['metric']
-        unit = r['unit']
-        f.write(f"{name} ({unit}) & {int(r['sites'])} & {r['mean']} & {r['min']} & {r['max']} \\\\\n")
-    f.write("\\bottomrule\n\\end{tabular}\n\\end{table}\n")
-
-# Markdown summary 
-lines = ["# Aggregated metrics", "", agg.to_markdown(index=False)]
-if green_counts:
-    lines += ["", "## Green hosting counts", ""]
-    for k in ("green", "not_green", "unknown"):
-        if k in green_counts:
-            lines.append(f"- {k.replace('_',' ').title()}: {green_counts[k]}")
-with open(out_md, "w", encoding="utf-8") as f:
-    f.write("\n".join(lines))
-
-print(f"Saved: {out_csv}")
-print(f"Saved: {out_tex}")
-print(f"Saved: {out_md}")
-if green_counts:
-    print("Green hosting counts:", green_counts)
\ No newline at end of file
+        with history.History(args.evidence / history.DB_NAME) as h:
+            main(h.site_frame(), args.evidence, by="round")
+    else:
+        main(evidence_dir=args.evidence, by=args.by)
@@ -0,0 +1,350 @@
+"""Compact, deduplicated archive of Lighthouse JSON reports.
+
+A report is split three ways when archived:
+
+- base64 data: URIs (fullPageScreenshot, screenshot thumbnails, final
+  screenshot) are decoded and stored once under blobs/ by SHA-256
+- sections that repeat across runs and sites (i18n, configSettings,
+  categoryGroups, stackPacks, categories and any large audit) are stored once
+  under sections/ by the SHA-256 of their canonical JSON
+- the remaining skeleton is written to reports/<round>/<name>.json.zst
+  (zstandard when installed, otherwise .json.gz) with {"$blob": ...} /
+  {"$section": ...} references in place of the moved values
+
+Every conversion is one audit round, labelled like history.py's rounds (by
+default the earliest summary.csv timestamp), so archiving a later round keeps
+the earlier ones; index.json lists the rounds and their reports. Blobs and
+sections are shared by all rounds.
+
+read_report() puts everything back, so callers get the same dict (same keys
+in the same order) as json.load on the original file. ingest.find_run_files()
+lists archived runs next to the plain ones (a plain file wins), so ingest,
+per_site_xlsx and audit's resume keep working after `convert --remove`.
+
+Usage:
+    python archive.py convert [--src evidence/lighthouse] [--out evidence/archive] [--round LABEL] [--remove]
+    python archive.py rounds
+    python archive.py cat <report name> [--round LABEL]
+"""
+import argparse
+import base64
+import binascii
+import csv
+import gzip
+import hashlib
+import json
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # gzip fallback
+    zstandard = None
+
+# Locate evidence folder
+evidence_dir = Path(__file__).resolve().parents[2] / "evidence"
+lighthouse_dir = evidence_dir / "lighthouse"
+archive_dir = evidence_dir / "archive"
+
+DEDUP_SECTIONS = ("i18n", "configSettings", "categoryGroups", "stackPacks", "categories")
+# Audits whose JSON is at least this big are deduplicated individually
+MIN_SECTION_BYTES = 512
+# data: URIs shorter than this stay inline
+MIN_BLOB_CHARS = 1024
+DATA_URI_RE = re.compile(r"^(data:[\w/+.-]+;base64,)")
+INDEX_NAME = "index.json"
+SUFFIXES = (".zst", ".gz")
+
+
+def _hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _compress(raw):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(raw), ".zst"
+    return gzip.compress(raw, compresslevel=9, mtime=0), ".gz"
+
+
+def _decompress(path):
+    data = path.read_bytes()
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"{path} is zstd-compressed; pip install zstandard to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if path.suffix == ".gz":
+        return gzip.decompress(data)
+    return data
+
+
+def _dir_name(label):
+    # round labels are timestamps; ":" is not allowed in Windows file names
+    return re.sub(r"[^\w.-]", "_", label)
+
+
+def _find(directory, name):
+    for suffix in (*SUFFIXES, ""):
+        p = directory / f"{name}{suffix}"
+        if p.exists():
+            return p
+    raise FileNotFoundError(directory / name)
+
+
+class Archive:
+    """Content-addressed store rooted at `root` (blobs/, sections/, reports/)."""
+
+    def __init__(self, root=archive_dir):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.sections = self.root / "sections"
+        self.reports = self.root / "reports"
+        self.index_path = self.root / INDEX_NAME
+        self._section_cache = {}
+
+    # -- rounds ----------------------------------------------------------
+
+    def index(self):
+        """{"rounds": {label: {"dir", "archived_at", "reports": [...]}}}, oldest round first."""
+        if not self.index_path.exists():
+            return {"rounds": {}}
+        with open(self.index_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_index(self, index):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.index_path.with_name(INDEX_NAME + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        tmp.replace(self.index_path)
+
+    def rounds(self):
+        return list(self.index()["rounds"])
+
+    def _round_dir(self, round_label=None, name=None):
+        """reports/<round>/ of `round_label`, or of the latest round (holding `name`)."""
+        rounds = self.index()["rounds"]
+        if round_label is not None:
+            if round_label not in rounds:
+                raise ValueError(f"no round {round_label!r} in {self.index_path} (known: {', '.join(rounds)})")
+            return self.reports / rounds[round_label]["dir"]
+        for info in reversed(rounds.values()):
+            if name is None or name in info["reports"]:
+                return self.reports / info["dir"]
+        # archives written before rounds keep their reports directly under reports/
+        return self.reports
+
+    def add_to_round(self, round_label, names):
+        """Record `names` as archived in `round_label`, creating the round if it is new."""
+        index = self.index()
+        info = index["rounds"].setdefault(round_label, {
+            "dir": _dir_name(round_label),
+            "archived_at": datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z"),
+            "reports": [],
+        })
+        info["reports"] = sorted(set(info["reports"]) | set(names))
+        self._save_index(index)
+
+    # -- writing ---------------------------------------------------------
+
+    def _put_blob(self, value):
+        prefix = DATA_URI_RE.match(value).group(1)
+        try:
+            raw = base64.b64decode(value[len(prefix):], validate=True)
+        except binascii.Error:
+            # malformed data: URI, kept inline as it is
+            return value
+        # only strip canonical base64, otherwise the round trip would differ
+        if base64.b64encode(raw).decode("ascii") != value[len(prefix):]:
+            return value
+        digest = _hash(raw)
+        path = self.blobs / digest[:2] / digest
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(raw)
+        return {"$blob": digest, "prefix": prefix}
+
+    def _extract_blobs(self, node):
+        if isinstance(node, dict):
+            return {k: self._extract_blobs(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [self._extract_blobs(v) for v in node]
+        if isinstance(node, str) and len(node) >= MIN_BLOB_CHARS and DATA_URI_RE.match(node):
+            return self._put_blob(node)
+        return node
+
+    def _put_section(self, value):
+        raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = _hash(raw)
+        if not any((self.sections / f"{digest}.json{s}").exists() for s in SUFFIXES):
+            self.sections.mkdir(parents=True, exist_ok=True)
+            data, suffix = _compress(raw)
+            (self.sections / f"{digest}.json{suffix}").write_bytes(data)
+        return {"$section": digest}
+
+    def write_report(self, name, lhr, round_label=None):
+        """Archive one parsed report under `name` (e.g. "www.as.kommune.no_run1") in `round_label`.
+
+        The caller lists it in the round's index entry with add_to_round().
+        """
+        skeleton = {}
+        for key, value in lhr.items():
+            if key == "audits" and isinstance(value, dict):
+                audits = {}
+                for audit_id, audit in value.items():
+                    audit = self._extract_blobs(audit)
+                    if len(json.dumps(audit, ensure_ascii=False)) >= MIN_SECTION_BYTES:
+                        audit = self._put_section(audit)
+                    audits[audit_id] = audit
+                skeleton[key] = audits
+            elif key in DEDUP_SECTIONS:
+                skeleton[key] = self._put_section(self._extract_blobs(value))
+            else:
+                skeleton[key] = self._extract_blobs(value)
+
+        directory = self.reports / _dir_name(round_label) if round_label else self.reports
+        directory.mkdir(parents=True, exist_ok=True)
+        data, suffix = _compress(json.dumps(skeleton, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        out = directory / f"{name}.json{suffix}"
+        out.write_bytes(data)
+        # a copy in the other format would shadow or duplicate this one
+        for other in SUFFIXES:
+            if other != suffix:
+                (directory / f"{name}.json{other}").unlink(missing_ok=True)
+        return out
+
+    # -- reading ---------------------------------------------------------
+
+    def _section(self, digest):
+        if digest not in self._section_cache:
+            self._section_cache[digest] = _decompress(_find(self.sections, f"{digest}.json"))
+        # parse per call so callers can mutate the result freely
+        return self._restore(json.loads(self._section_cache[digest]))
+
+    def _restore(self, node):
+        if isinstance(node, dict):
+            if len(node) == 1 and "$section" in node:
+                return self._section(node["$section"])
+            if len(node) == 2 and "$blob" in node and "prefix" in node:
+                raw = (self.blobs / node["$blob"][:2] / node["$blob"]).read_bytes()
+                return node["prefix"] + base64.b64encode(raw).decode("ascii")
+            return {k: self._restore(v) for k, v in node.items()}
+        if isinstance(node, list):
+            return [self._restore(v) for v in node]
+        return node
+
+    def read_report(self, name, round_label=None):
+        """Return the archived report `name` (of the latest round holding it) as the original JSON dict."""
+        directory = self._round_dir(round_label, name)
+        return self._restore(json.loads(_decompress(_find(directory, f"{name}.json"))))
+
+    def read_file(self, path):
+        """Return the report archived at `path` (a reports/.../<name>.json.zst or .gz file)."""
+        return self._restore(json.loads(_decompress(Path(path))))
+
+    def report_files(self):
+        """{name: path} of every archived report, from the latest round holding it."""
+        found = {}
+        rounds = self.index()["rounds"].values()
+        for directory in [self.reports] + [self.reports / info["dir"] for info in rounds]:
+            for p in directory.glob("*.json*"):
+                if p.is_file():
+                    found[re.sub(r"\.json(\.zst|\.gz)?$", "", p.name)] = p
+        return found
+
+    def names(self, round_label=None):
+        """Report names of a round (default: the latest), each once."""
+        directory = self._round_dir(round_label)
+        return sorted({re.sub(r"\.json(\.zst|\.gz)?$", "", p.name) for p in directory.glob("*.json*")})
+
+
+def is_archived(path):
+    """True for a report file inside an archive (reports/.../<name>.json.zst or .gz)."""
+    p = Path(path)
+    return p.suffix in SUFFIXES and "reports" in p.parent.parts
+
+
+def read_report(path_or_name, root=archive_dir, round_label=None):
+    """Read a Lighthouse report from a plain .json path, an archived file, or the archive by name."""
+    p = Path(path_or_name)
+    if p.suffix == ".json" and p.exists():
+        with open(p, encoding="utf-8") as f:
+            return json.load(f)
+    if is_archived(p) and p.exists():
+        root = next(d.parent for d in p.parents if d.name == "reports")
+        return Archive(root).read_file(p)
+    return Archive(root).read_report(p.name[:-5] if p.name.endswith(".json") else p.name, round_label)
+
+
+def round_label(src=lighthouse_dir):
+    """Default round label: the earliest summary.csv timestamp next to `src`, as in history.py."""
+    summary = Path(src).parent / "summary.csv"
+    if summary.exists():
+        with open(summary, newline="", encoding="utf-8") as f:
+            stamps = [row["timestamp"] for row in csv.DictReader(f) if row.get("timestamp")]
+        if stamps:
+            return min(stamps)
+    return datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def convert(src=lighthouse_dir, out=archive_dir, remove=False, verify=True, label=None, log=print):
+    """Archive every report under `src` (runs/*.json and synthesized *.json) as round `label`."""
+    archive = Archive(out)
+    src = Path(src)
+    label = label or round_label(src)
+    before = after = 0
+    archive.add_to_round(label, [])
+    done = []
+    try:
+        for path in sorted(list(src.glob("runs/*.json")) + list(src.glob("*.json"))):
+            with open(path, encoding="utf-8") as f:
+                lhr = json.load(f)
+            written = archive.write_report(path.stem, lhr, label)
+            if verify and archive.read_report(path.stem, label) != lhr:
+                written.unlink()
+                raise RuntimeError(f"Round trip mismatch for {path}")
+            done.append(path.stem)
+            before += path.stat().st_size
+            if remove:
+                path.unlink()
+            log(f"Archived {path.name}")
+    finally:
+        # reports written before an error are kept in the index
+        archive.add_to_round(label, done)
+
+    for p in archive.root.rglob("*"):
+        if p.is_file():
+            after += p.stat().st_size
+    return before, after
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive Lighthouse evidence with blob and section dedup")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_convert = sub.add_parser("convert", help="archive an existing evidence/lighthouse folder")
+    p_convert.add_argument("--src", type=Path, default=lighthouse_dir)
+    p_convert.add_argument("--out", type=Path, default=archive_dir)
+    p_convert.add_argument("--remove", action="store_true", help="delete originals after a verified round trip")
+    p_convert.add_argument("--no-verify", action="store_true")
+    p_convert.add_argument("--round", default=None, help="round label (default: earliest summary timestamp)")
+    p_rounds = sub.add_parser("rounds", help="list archived rounds")
+    p_rounds.add_argument("--archive", type=Path, default=archive_dir)
+    p_cat = sub.add_parser("cat", help="print an archived report as JSON")
+    p_cat.add_argument("name")
+    p_cat.add_argument("--archive", type=Path, default=archive_dir)
+    p_cat.add_argument("--round", default=None, help="round label (default: the latest holding the report)")
+    args = parser.parse_args()
+
+    if args.cmd == "convert":
+        before, after = convert(args.src, args.out, remove=args.remove, verify=not args.no_verify, label=args.round)
+        print(f"Archive size: {after / 1e6:.1f} MB (originals {before / 1e6:.1f} MB)")
+        print(f"Saved: {args.out}")
+    elif args.cmd == "rounds":
+        for label, info in Archive(args.archive).index()["rounds"].items():
+            print(f"{label}  {len(info['reports'])} reports  archived {info['archived_at']}")
+    else:
+        try:
+            lhr = Archive(args.archive).read_report(args.name, args.round)
+        except (ValueError, FileNotFoundError) as e:
+            parser.exit(1, f"{e}\n")
+        print(json.dumps(lhr, indent=2, ensure_ascii=False))
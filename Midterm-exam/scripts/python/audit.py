@@ -0,0 +1,334 @@
+"""Parallel Lighthouse audit orchestrator (Python port of scripts/node/audit.js).
+
+Sites from municipalities.json are audited by a bounded pool of workers. Each
+worker runs its site's Lighthouse runs one after another, and every run gets a
+fresh Chrome profile directory that is removed afterwards, so runs start cold
+(as chrome-launcher's do in audit.js) and concurrent Chromes never share state. Run files that
+already exist in evidence/lighthouse/runs (or were archived into
+evidence/archive) are reused, so an interrupted audit picks up where it
+stopped.
+
+Outputs match audit.js: runs/<domain>_runN.json, the synthesized
+lighthouse/<domain>.json, hosting/*_greencheck.json, *_carbon.txt,
+summary.json and summary.csv.
+
+Greencheck and carbon.txt lookups for all sites run once, up front, through
+hosting.py (async, connection reuse, cached in evidence/hosting).
+
+With --adaptive, each site gets between --min-runs and --max-runs runs: after
+every run past the minimum, stats.needs_more_runs() checks the spread of the
+runs (bootstrap CIs from four runs on) and the site stops as soon as every
+metric is within its relative or absolute tolerance.
+
+Usage:
+    python audit.py [--workers N] [--runs 3] [--lighthouse "npx lighthouse"]
+    python audit.py --adaptive [--min-runs 3] [--max-runs 6] [--ci-rel-width 0.1]
+"""
+import argparse
+import copy
+import json
+import math
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import archive
+import hosting
+import stats
+from co2 import onebyte_per_byte, swd_per_byte
+from common import domain_key, iso_now
+
+# Locate repo folders
+repo_root = Path(__file__).resolve().parents[2]
+municipalities_path = repo_root / "scripts" / "municipalities.json"
+
+NUM_RUNS = 3
+# Lighthouse needs about two cores per concurrent run for stable timings
+CORES_PER_RUN = 2
+SUMMARY_KEYS = [
+    "url", "domain", "timestamp", "performanceScore", "transferBytes", "requests",
+    "jsBytes", "co2_onebyte_grams", "co2_swd_grams", "greenHosting",
+    "fcp_ms", "lcp_ms", "speed_index_ms", "tbt_ms", "cls",
+] + stats.ci_columns()
+MEDIAN_AUDITS = {
+    "fcp": "first-contentful-paint",
+    "lcp": "largest-contentful-paint",
+    "speed": "speed-index",
+    "bytes": "total-byte-weight",
+    "tbt": "total-blocking-time",
+    "cls": "cumulative-layout-shift",
+}
+JS_URL_RE = re.compile(r"\.m?js(\?|#|$)", re.IGNORECASE)
+
+
+def default_workers():
+    return max(1, (os.cpu_count() or 1) // CORES_PER_RUN)
+
+
+def median(values):
+    nums = sorted(v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool) and not math.isnan(v))
+    if not nums:
+        return None
+    mid = len(nums) // 2
+    return nums[mid] if len(nums) % 2 else (nums[mid - 1] + nums[mid]) / 2
+
+
+def js_round(x):
+    # Math.round: halves go up
+    return int(math.floor(x + 0.5))
+
+
+def get_audit_numeric(run, audit_id):
+    return ((run or {}).get("audits") or {}).get(audit_id, {}).get("numericValue")
+
+
+def request_items(run):
+    items = (((run or {}).get("audits") or {}).get("network-requests") or {}).get("details", {}).get("items")
+    return items if isinstance(items, list) else []
+
+
+def is_js(item):
+    return (
+        item.get("resourceType") == "Script"
+        or "javascript" in (item.get("mimeType") or "")
+        or bool(JS_URL_RE.search(item.get("url") or ""))
+    )
+
+
+class Auditor:
+    """Holds the paths and settings shared by every worker."""
+
+    def __init__(self, evidence_dir, lighthouse_cmd, num_runs=NUM_RUNS, timeout=300, retries=1,
+                 check_hosting=True, adaptive=False, min_runs=stats.MIN_RUNS, ci_rel_width=stats.CI_REL_WIDTH,
+                 log=print):
+        self.evidence_dir = Path(evidence_dir)
+        self.lighthouse_dir = self.evidence_dir / "lighthouse"
+        self.runs_dir = self.lighthouse_dir / "runs"
+        self.hosting_dir = self.evidence_dir / "hosting"
+        self.lighthouse_cmd = shlex.split(lighthouse_cmd)
+        self.num_runs = num_runs
+        self.timeout = timeout
+        self.retries = retries
+        self.check_hosting = check_hosting
+        self.adaptive = adaptive
+        self.min_runs = min(min_runs, num_runs)
+        self.ci_rel_width = ci_rel_width
+        self.log = log
+        self.hosting_results = {}
+        for d in (self.lighthouse_dir, self.runs_dir, self.hosting_dir):
+            d.mkdir(parents=True, exist_ok=True)
+
+    def run_file(self, url, i):
+        return self.runs_dir / f"{domain_key(url)}_run{i}.json"
+
+    def _valid_run(self, path):
+        # a run moved into evidence/archive by `archive.py convert --remove` counts as done too
+        try:
+            return archive.read_report(path, self.evidence_dir / "archive")
+        except (OSError, ValueError, RuntimeError):
+            return None
+
+    def _lighthouse_cmd(self, url, run_file, profile_dir):
+        return self.lighthouse_cmd + [
+            url,
+            "--output=json",
+            f"--output-path={run_file}",
+            f"--chrome-flags=--headless --user-data-dir={profile_dir}",
+            "--quiet",
+        ]
+
+    def run_lighthouse(self, url, run_file):
+        for attempt in range(1, self.retries + 2):
+            try:
+                # A fresh profile per run: no cache, service workers or HSTS state carried over
+                with tempfile.TemporaryDirectory(prefix="lh-chrome-", ignore_cleanup_errors=True) as profile_dir:
+                    subprocess.run(self._lighthouse_cmd(url, run_file, profile_dir), check=True,
+                                   timeout=self.timeout)
+                run = self._valid_run(run_file)
+                if run is not None:
+                    return run
+                self.log(f"Lighthouse wrote no valid JSON for {url} (attempt {attempt})")
+            except subprocess.TimeoutExpired:
+                self.log(f"Lighthouse timed out after {self.timeout}s for {url} (attempt {attempt})")
+            except (subprocess.CalledProcessError, OSError) as e:
+                self.log(f"Lighthouse run failed for {url} (attempt {attempt}): {e}")
+            run_file.unlink(missing_ok=True)
+        return None
+
+    def prefetch_hosting(self, urls):
+        """Greencheck and carbon.txt for every site in one async pass, cached in hosting/."""
+        self.hosting_results = hosting.HostingChecker(self.hosting_dir, log=self.log).check(urls)
+
+    def collect_runs(self, url):
+        """Run Lighthouse for every missing run file and return the parsed runs.
+
+        In adaptive mode num_runs is the upper bound and collection stops once
+        the bootstrap CIs have converged.
+        """
+        runs = []
+        for i in range(1, self.num_runs + 1):
+            if self.adaptive and len(runs) >= self.min_runs and not stats.needs_more_runs(runs, self.ci_rel_width):
+                self.log(f"CIs converged for {url} after {len(runs)} runs")
+                break
+            run_file = self.run_file(url, i)
+            run = self._valid_run(run_file)
+            if run is None:
+                run = self.run_lighthouse(url, run_file)
+            else:
+                self.log(f"Reusing {run_file.name}")
+            if run is not None:
+                runs.append(run)
+        return runs
+
+    def audit_site(self, url):
+        """Audit one site; returns (summary row or None, per-run CI metric values)."""
+        greenHosting = self.hosting_results.get(url, {}).get("green") if self.check_hosting else None
+        runs = self.collect_runs(url)
+        row = None
+        if not runs:
+            self.log(f"No successful Lighthouse runs for {url}")
+        else:
+            row = self.synthesize(url, runs, greenHosting)
+        return row, [stats.run_values(r) for r in runs]
+
+    def synthesize(self, url, runs, greenHosting):
+        """Write the median report for `url` and return its summary row."""
+        med = {k: median([get_audit_numeric(r, a) for r in runs]) for k, a in MEDIAN_AUDITS.items()}
+        med_perf = median([((r.get("categories") or {}).get("performance") or {}).get("score") for r in runs])
+        req_lens = [len(request_items(r)) for r in runs]
+        med_reqs = js_round(median(req_lens) or 0)
+
+        # Choose the run whose request count is closest to the median
+        target = med_reqs or js_round(median(req_lens) or 0)
+        idx = min(range(len(req_lens)), key=lambda i: abs(req_lens[i] - target))
+        chosen_items = request_items(runs[idx])
+
+        synthesized = copy.deepcopy(runs[0])
+        synthesized["requestedUrl"] = runs[0].get("requestedUrl") or url
+        synthesized["finalUrl"] = runs[0].get("finalUrl") or url
+        perf = synthesized.setdefault("categories", {}).setdefault("performance", {})
+        if med_perf is not None:
+            perf["score"] = med_perf
+        audits = synthesized.setdefault("audits", {})
+        for key, audit_id in MEDIAN_AUDITS.items():
+            audit = audits.setdefault(audit_id, {})
+            if med[key] is not None:
+                audit["numericValue"] = med[key]
+        network = audits.setdefault("network-requests", {"details": {"items": []}})
+        network.setdefault("details", {})["items"] = chosen_items
+
+        lighthouse_file = self.lighthouse_dir / f"{domain_key(url)}.json"
+        with open(lighthouse_file, "w", encoding="utf-8") as f:
+            json.dump(synthesized, f, indent=2, ensure_ascii=False)
+        self.log(f"Saved synthesized median report for {url} -> {lighthouse_file}")
+
+        transferBytes = med["bytes"]
+        return {
+            "url": url,
+            "domain": domain_key(url),
+            "timestamp": iso_now(),
+            "performanceScore": js_round(med_perf * 100) if med_perf is not None else None,
+            "transferBytes": transferBytes,
+            "requests": med_reqs,
+            "jsBytes": sum(it.get("transferSize") or 0 for it in chosen_items if is_js(it)),
+            "co2_onebyte_grams": onebyte_per_byte(transferBytes or 0),
+            "co2_swd_grams": swd_per_byte(transferBytes or 0),
+            "greenHosting": greenHosting,
+            "fcp_ms": med["fcp"],
+            "lcp_ms": med["lcp"],
+            "speed_index_ms": med["speed"],
+            "tbt_ms": med["tbt"],
+            "cls": med["cls"],
+        }
+
+
+def _csv_value(v):
+    # Same text as String(v) in audit.js
+    if v is None:
+        return ""
+    if isinstance(v, bool):
+        s = "true" if v else "false"
+    elif isinstance(v, float) and v.is_integer():
+        s = str(int(v))
+    else:
+        s = str(v)
+    return '"' + s.replace('"', '""') + '"'
+
+
+def write_summary(rows, evidence_dir):
+    evidence_dir = Path(evidence_dir)
+    with open(evidence_dir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=2, ensure_ascii=False)
+    lines = [",".join(SUMMARY_KEYS)]
+    lines += [",".join(_csv_value(row.get(k)) for k in SUMMARY_KEYS) for row in rows]
+    with open(evidence_dir / "summary.csv", "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def run_audit(urls, auditor, workers):
+    """Audit `urls` on `workers` threads; rows come back in input order with CI columns."""
+    if auditor.check_hosting:
+        auditor.prefetch_hosting(urls)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = [(row, values) for row, values in pool.map(auditor.audit_site, urls) if row is not None]
+    if not results:
+        return []
+
+    # One vectorised bootstrap over all sites
+    _, low, high = stats.bootstrap_ci(stats.pack_runs([values for _, values in results]))
+    rows = []
+    for i, (row, _) in enumerate(results):
+        for j, m in enumerate(stats.CI_METRICS):
+            row[f"{m}_ci_low"] = None if math.isnan(low[i, j]) else float(low[i, j])
+            row[f"{m}_ci_high"] = None if math.isnan(high[i, j]) else float(high[i, j])
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run Lighthouse audits for all municipalities in parallel")
+    parser.add_argument("--evidence", type=Path, default=repo_root / "evidence")
+    parser.add_argument("--sites", type=Path, default=municipalities_path, help="JSON list of URLs")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help=f"concurrent sites (default: CPU cores / {CORES_PER_RUN})")
+    parser.add_argument("--runs", type=int, default=NUM_RUNS)
+    parser.add_argument("--adaptive", action="store_true", help="stop early once metrics have settled")
+    parser.add_argument("--min-runs", type=int, default=stats.MIN_RUNS)
+    parser.add_argument("--max-runs", type=int, default=6, help="upper bound on runs with --adaptive")
+    parser.add_argument("--ci-rel-width", type=float, default=stats.CI_REL_WIDTH,
+                        help="target CI width as a share of the median")
+    parser.add_argument("--timeout", type=int, default=300, help="seconds per Lighthouse run")
+    parser.add_argument("--retries", type=int, default=1)
+    parser.add_argument("--lighthouse", default=os.environ.get("LIGHTHOUSE_BIN", "npx lighthouse"),
+                        help="Lighthouse command, e.g. a stub that writes canned JSON")
+    parser.add_argument("--skip-hosting", action="store_true", help="skip greencheck and carbon.txt")
+    parser.add_argument("--no-history", action="store_true", help="do not append this round to history.sqlite")
+    args = parser.parse_args()
+
+    with open(args.sites, encoding="utf-8") as f:
+        urls = json.load(f)
+
+    auditor = Auditor(args.evidence, args.lighthouse, num_runs=args.max_runs if args.adaptive else args.runs,
+                      timeout=args.timeout, retries=args.retries, check_hosting=not args.skip_hosting,
+                      adaptive=args.adaptive, min_runs=args.min_runs, ci_rel_width=args.ci_rel_width)
+    import telemetry
+
+    started = time.perf_counter()
+    with telemetry.cli_stage("audit", args.evidence, workers=args.workers, sites=len(urls)) as s:
+        summary = run_audit(urls, auditor, args.workers)
+        write_summary(summary, args.evidence)
+        s["rows"] = len(summary)
+    print(f"Audited {len(summary)}/{len(urls)} sites with {args.workers} workers "
+          f"in {time.perf_counter() - started:.1f}s")
+    print("Summary written to evidence/summary.json and evidence/summary.csv")
+
+    if summary and not args.no_history:
+        import history
+
+        # record() refreshes the store, so the round's per-run metrics come from this audit's run files
+        print(f"Recorded round {history.record(args.evidence)} in {args.evidence / history.DB_NAME}")
@@ -0,0 +1,237 @@
+"""Scaling benchmark: every pipeline stage on synthetic evidence of growing size.
+
+For each scale (by default 10, 1000 and 10000 sites x 3 runs) an evidence tree
+is generated by synthetic.py, once, and kept under --work. Every stage then
+runs in its own Python process, so the peak memory it reports is its own and
+not the high-water mark of the stages before it:
+
+    load          dataset.load of summary.csv
+    aggregate     aggregate.main
+    charts        charts.render of every registered chart
+    spreadsheets  spreadsheet_maker.main (audit_results.xlsx)
+    per_site      per_site_xlsx.build of every site's workbook
+    ingest        ingest.ingest of every run file
+    requests      request_analytics.main
+    co2           co2.main from the store
+    phases        phases.main (Lighthouse gather/audit timings)
+    history       history.record of the tree as one round, in a fresh database
+
+A stage's telemetry record (telemetry.py: wall and CPU time, peak RSS, rows)
+is collected per scale. All of them, with the host information, are written
+to one JSON file; --compare flags the stages that got slower or bigger.
+
+Usage:
+    python benchmark.py [--sites 10 1000 10000] [--runs 3] [--stages load charts ...] [--work DIR] [--out FILE]
+    python benchmark.py --compare BASELINE.json RESULTS.json [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import json
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import dataset
+import telemetry
+
+SCALES = (10, 1000, 10000)
+# A stage whose wall time or peak memory grows by more than this share is a regression
+TOLERANCE = 0.2
+# Stages that take less than this many seconds are too noisy to compare
+MIN_WALL_S = 0.25
+work_dir = Path(tempfile.gettempdir()) / "lighthouse-benchmark"
+results_dir = dataset.evidence_dir / "benchmarks"
+
+
+def _load(ev):
+    return len(dataset.load(evidence_dir=ev))
+
+
+def _aggregate(ev):
+    import aggregate
+
+    df = dataset.load(evidence_dir=ev)
+    aggregate.main(df, ev)
+    return len(df)
+
+
+def _charts(ev):
+    import charts
+
+    df = dataset.load(evidence_dir=ev)
+    charts.render(df, None, ev / "charts")
+    return len(df)
+
+
+def _spreadsheets(ev):
+    import spreadsheet_maker
+
+    df = dataset.load(evidence_dir=ev)
+    spreadsheet_maker.main(df, ev)
+    return len(df)
+
+
+def _per_site(ev):
+    import ingest
+    import per_site_xlsx
+
+    per_site_xlsx.build(ev, force=True)
+    return len(ingest.find_run_files(ev / "lighthouse" / "runs"))
+
+
+def _ingest(ev):
+    import ingest
+
+    return ingest.ingest(ev / "lighthouse" / "runs", ev / "store")["requests"]
+
+
+def _requests(ev):
+    import ingest
+    import request_analytics
+
+    request_analytics.main(None, ev)
+    return ingest.table_rows("requests", ev / "store")
+
+
+def _co2(ev):
+    import co2
+    import ingest
+
+    co2.main("store", ev)
+    return ingest.table_rows("requests", ev / "store")
+
+
+def _phases(ev):
+    import ingest
+    import phases
+
+    phases.main(None, ev)
+    return ingest.table_rows("timings", ev / "store")
+
+
+def _history(ev):
+    import history
+
+    db = ev / history.DB_NAME
+    db.unlink(missing_ok=True)
+    history.record(ev, label="benchmark")
+    with history.History(db) as h:
+        return int(h.conn.execute("SELECT COUNT(*) FROM site_metrics").fetchone()[0]
+                   + h.conn.execute("SELECT COUNT(*) FROM run_metrics").fetchone()[0])
+
+
+# Run order matters: requests, co2, phases and history read the store ingest writes
+STAGES = {
+    "load": _load,
+    "aggregate": _aggregate,
+    "charts": _charts,
+    "spreadsheets": _spreadsheets,
+    "per_site": _per_site,
+    "ingest": _ingest,
+    "requests": _requests,
+    "co2": _co2,
+    "phases": _phases,
+    "history": _history,
+}
+
+
+def run_stage(name, evidence_dir):
+    """Run one stage in this process and return its telemetry record."""
+    tel = telemetry.Telemetry("benchmark")
+    # the stages' own progress output would drown the benchmark's
+    with contextlib.redirect_stdout(sys.stderr), tel.stage(name) as record:
+        record["rows"] = STAGES[name](Path(evidence_dir))
+    return tel.stages[0]
+
+
+def tree_for(sites, runs, seed, work=work_dir, log=print):
+    """Path of the synthetic tree for this scale, generated on first use."""
+    import synthetic
+
+    tree = Path(work) / f"sites{sites}_runs{runs}_seed{seed}"
+    if not (tree / "summary.csv").exists():
+        log(f"Generating {sites} sites x {runs} runs in {tree}")
+        tel = telemetry.Telemetry("generate")
+        with tel.stage("generate") as record:
+            synthetic.generate(tree, sites, runs, seed, log=lambda *a: None)
+            record["rows"] = sites * runs
+        tel.save(tree)
+    return tree
+
+
+def _child(name, tree):
+    proc = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--run-stage", name, "--evidence",
+                           str(tree)], capture_output=True, text=True, cwd=Path(__file__).resolve().parent)
+    if proc.returncode != 0:
+        return {"stage": name, "rows": None, "error": proc.stderr.strip().splitlines()[-1:] or ["failed"]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run(scales=SCALES, runs=3, stages=tuple(STAGES), seed=0, work=work_dir, log=print):
+    """Benchmark `stages` at every scale; returns the results document."""
+    results = {"host": telemetry.host_info(), "runs": runs, "seed": seed, "results": []}
+    for sites in scales:
+        tree = tree_for(sites, runs, seed, work, log)
+        for name in STAGES:
+            if name not in stages:
+                continue
+            record = {"sites": sites, **_child(name, tree)}
+            results["results"].append(record)
+            if "error" in record:
+                log(f"{sites:>6} sites  {name:<13} failed: {record['error'][0]}")
+            else:
+                log(f"{sites:>6} sites  {name:<13} {record['wall_s']:>9.2f} s  {record['peak_rss_mb']:>8.1f} MB  "
+                    f"{record['rows']} rows")
+    return results
+
+
+def compare(baseline, current, tolerance=TOLERANCE):
+    """[(sites, stage, wall ratio, memory ratio)] for stages that grew by more than `tolerance`."""
+    before = {(r["sites"], r["stage"]): r for r in baseline["results"] if "error" not in r}
+    regressions = []
+    for r in current["results"]:
+        old = before.get((r["sites"], r["stage"]))
+        if old is None or "error" in r or old["wall_s"] < MIN_WALL_S:
+            continue
+        wall = r["wall_s"] / old["wall_s"]
+        memory = r["peak_rss_mb"] / old["peak_rss_mb"] if old.get("peak_rss_mb") else 1.0
+        if wall > 1 + tolerance or memory > 1 + tolerance:
+            regressions.append((r["sites"], r["stage"], round(wall, 2), round(memory, 2)))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic evidence")
+    parser.add_argument("--sites", type=int, nargs="+", default=list(SCALES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--work", type=Path, default=work_dir, help="where the synthetic trees are kept")
+    parser.add_argument("--out", type=Path, default=None, help="results file (default: evidence/benchmarks/)")
+    parser.add_argument("--compare", nargs=2, type=Path, metavar=("BASELINE", "RESULTS"))
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--run-stage", choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument("--evidence", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        print(json.dumps(run_stage(args.run_stage, args.evidence)))
+    elif args.compare:
+        docs = []
+        for path in args.compare:
+            with open(path, encoding="utf-8") as f:
+                docs.append(json.load(f))
+        found = compare(*docs, tolerance=args.tolerance)
+        for sites, stage, wall, memory in found:
+            print(f"{sites:>6} sites  {stage:<13} wall x{wall}  memory x{memory}")
+        print(f"{len(found)} regression(s) beyond {args.tolerance:.0%}")
+        sys.exit(1 if found else 0)
+    else:
+        results = run(args.sites, args.runs, args.stages, args.seed, args.work)
+        out = args.out or results_dir / f"benchmark_{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+        out.parent.mkdir(parents=True, exist_ok=True)
+        with open(out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved: {out}")
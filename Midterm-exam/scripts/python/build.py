@@ -0,0 +1,299 @@
+"""Incremental rebuild of the derived files in evidence/.
+
+Every output belongs to a Target that lists the summary.csv columns (or
+other evidence files, such as the run files) it reads, the source files
+of the code that writes it, and its output paths. Targets that read the
+ingest store depend on the run files it is built from; they refresh the
+store themselves (ingest.ensure_store).
+evidence/build_manifest.json keeps, per target, the hashes of those inputs
+and of the files it last wrote. A target is rebuilt only when an input
+column, its code or one of its outputs changed (or the output is missing),
+so editing the CO₂ columns re-renders only the charts that plot CO₂.
+File hashes are cached in the manifest with each file's size and mtime, and a
+file is only read again when those change, so planning a build over thousands
+of run files costs a stat per file.
+
+Each build that rebuilds something writes a telemetry manifest
+(telemetry.py) with wall time, peak memory and rows processed per target.
+
+Usage:
+    python build.py [--dry-run] [--force] [step ...]
+"""
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+import dataset
+import telemetry
+
+MANIFEST_NAME = "build_manifest.json"
+# manifest key of the file hash cache (the other keys are target names)
+DIGESTS_KEY = "_digests"
+# Where run reports live: the plain run files, and those archive.py moved out of them
+RUN_FILES = ["lighthouse/runs", "archive/index.json"]
+scripts_dir = Path(__file__).resolve().parent
+
+
+class Target:
+    """One rebuildable unit: `run(df, evidence_dir)` writes `outputs`."""
+
+    def __init__(self, name, step, outputs, columns, sources, run, chart=None, files=(), rows=None):
+        self.name = name
+        self.step = step
+        self.outputs = list(outputs)  # paths relative to evidence/
+        self.columns = columns  # None means the whole source CSV
+        self.sources = ["dataset.py", "build.py"] + list(sources)
+        self.run = run
+        self.chart = chart  # charts.REGISTRY name; chart targets are rendered together in a pool
+        self.files = list(files)  # other inputs relative to evidence/; directories are hashed whole
+        self.rows = rows or (lambda df, ev: len(df))  # rows processed, for telemetry
+
+
+def targets():
+    """All targets in report order; a later target claiming an output replaces the earlier one."""
+    import aggregate
+    import charts
+    import ingest
+    import per_site_xlsx
+    import phases
+    import request_analytics
+    import spreadsheet_maker
+    import visualize
+
+    agg_columns = sorted({c for c, _ in aggregate.metrics_to_aggregate if c in dataset.METRIC_COLUMNS}
+                         | {"transferBytes", "jsBytes", "greenHosting"})
+    found = [
+        Target("aggregate", "aggregate", ["aggregated.csv", "aggregated_table.tex", "aggregated.md"],
+               agg_columns, ["aggregate.py", "stats.py"],
+               lambda df, ev: aggregate.write_outputs(*aggregate.aggregate(df), ev)),
+    ]
+    found += [Target(f"{c.step}.{c.name}", c.step, [f"charts/{c.name}.png"], c.columns, ["charts.py"],
+                     None, chart=c.name) for c in charts.REGISTRY]
+    found.append(Target("visualize.averages", "visualize", ["averages_summary.csv"], visualize.AVERAGES_COLUMNS,
+                        ["visualize.py", "aggregate.py", "stats.py"], lambda df, ev: visualize.averages(df, ev)))
+    found.append(Target("spreadsheets", "spreadsheets",
+                        ["spreadsheets/averages.csv", "spreadsheets/green_hosting_summary.csv",
+                         "spreadsheets/audit_results.xlsx"],
+                        None, ["spreadsheet_maker.py", "aggregate.py", "stats.py"],
+                        lambda df, ev: spreadsheet_maker.main(df, ev)))
+    found.append(Target("spreadsheets.per_site", "spreadsheets", ["spreadsheets/per_site/manifest.json"], (),
+                        list(per_site_xlsx.CODE_FILES), lambda df, ev: per_site_xlsx.main(df, ev),
+                        files=RUN_FILES,
+                        rows=lambda df, ev: len(ingest.find_run_files(Path(ev) / "lighthouse" / "runs"))))
+    found.append(Target("requests", "requests",
+                        ["requests_by_site.csv", "requests_aggregated.csv"]
+                        + [f"charts/{n}.png" for n in request_analytics.CHART_NAMES],
+                        (), ["request_analytics.py", "ingest.py", "charts.py"],
+                        lambda df, ev: request_analytics.main(df, ev), files=RUN_FILES,
+                        rows=lambda df, ev: ingest.table_rows("requests", Path(ev) / "store")))
+    found.append(Target("phases", "phases", ["lighthouse_phases.csv", "lighthouse_phase_breakdown.csv"],
+                        (), ["phases.py", "ingest.py"], lambda df, ev: phases.main(df, ev),
+                        files=RUN_FILES,
+                        rows=lambda df, ev: ingest.table_rows("timings", Path(ev) / "store")))
+
+    # Same outcome as running the scripts in order: the last writer of a file owns it
+    owner = {}
+    for t in found:
+        for out in t.outputs:
+            owner[out] = t.name
+    return [t for t in found if all(owner[o] == t.name for o in t.outputs)]
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_sha(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Digests:
+    """SHA-256 of evidence files, keyed by path relative to evidence/; a file is re-read only
+    when its size or mtime differs from the cached entry."""
+
+    def __init__(self, evidence_dir, cached=None):
+        self.evidence_dir = Path(evidence_dir)
+        self.cached = cached or {}
+        self.seen = {}
+        self._kept = None
+
+    def file(self, path):
+        path = Path(path)
+        try:
+            key = path.relative_to(self.evidence_dir).as_posix()
+        except ValueError:  # already relative to evidence/
+            key = path.as_posix()
+            path = self.evidence_dir / path
+        st = path.stat()
+        entry = self.seen.get(key) or self.cached.get(key)
+        if not entry or entry.get("size") != st.st_size or entry.get("mtime_ns") != st.st_mtime_ns:
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha": _file_sha(path)}
+        self.seen[key] = entry
+        return entry["sha"]
+
+    def path(self, rel):
+        """Hash of a file, or of every file under a directory; None if it does not exist."""
+        path = self.evidence_dir / rel
+        if path.is_file():
+            return self.file(path)
+        if not path.is_dir():
+            return None
+        return _sha("".join(f"{p.relative_to(path)}:{self.file(p)}\n" for p in sorted(path.rglob("*"))
+                            if p.is_file()).encode())
+
+    def changed(self):
+        return any(self.cached.get(k) != v for k, v in self.seen.items())
+
+    def entries(self):
+        """The cache to save: this build's entries and the earlier ones whose file still exists."""
+        if self._kept is None:
+            self._kept = {k: v for k, v in self.cached.items() if (self.evidence_dir / k).is_file()}
+        return dict(sorted({**self._kept, **self.seen}.items()))
+
+
+def column_hashes(df, columns):
+    out = {}
+    for c in columns:
+        if c in df.columns:
+            out[c] = _sha(pd.util.hash_pandas_object(df[c], index=False).to_numpy().tobytes()
+                          + str(df[c].dtype).encode())
+        else:
+            out[c] = None
+    return out
+
+
+def input_hashes(target, df, evidence_dir, digests):
+    if target.columns is None:
+        inputs = {"source": digests.file(dataset.source_csv(evidence_dir))}
+    else:
+        inputs = column_hashes(df, target.columns)
+    inputs.update({f: digests.path(f) for f in target.files})
+    code = _sha(b"".join((scripts_dir / s).read_bytes() for s in target.sources))
+    return {"inputs": inputs, "code": code}
+
+
+def load_manifest(evidence_dir):
+    path = Path(evidence_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, evidence_dir):
+    with open(Path(evidence_dir) / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def stale_reason(target, entry, current, evidence_dir, digests):
+    """Why `target` must be rebuilt, or None if it is up to date."""
+    if entry is None:
+        return "never built"
+    if entry.get("code") != current["code"]:
+        return "code changed"
+    changed = [k for k, v in current["inputs"].items() if entry.get("inputs", {}).get(k) != v]
+    if changed:
+        return "inputs changed: " + ", ".join(changed)
+    for out in target.outputs:
+        p = evidence_dir / out
+        if not p.exists():
+            return f"missing {out}"
+        if entry.get("outputs", {}).get(out) != digests.file(p):
+            return f"{out} modified"
+    return None
+
+
+def plan(df, evidence_dir=dataset.evidence_dir, steps=None, force=False, digests=None):
+    """Return [(target, reason, input hashes)] for the targets that need a rebuild."""
+    evidence_dir = Path(evidence_dir)
+    manifest = load_manifest(evidence_dir)
+    if digests is None:
+        digests = Digests(evidence_dir, manifest.get(DIGESTS_KEY))
+    todo = []
+    for t in targets():
+        if steps and t.step not in steps:
+            continue
+        current = input_hashes(t, df, evidence_dir, digests)
+        reason = "forced" if force else stale_reason(t, manifest.get(t.name), current, evidence_dir, digests)
+        if reason:
+            todo.append((t, reason, current))
+    return todo
+
+
+def build(df=None, evidence_dir=dataset.evidence_dir, steps=None, force=False, dry_run=False, workers=None,
+          log=print, tel=None):
+    """Rebuild stale targets and update the manifest; returns the planned (target, reason) pairs.
+
+    Stages are recorded in `tel` (a telemetry.Telemetry); without one, a manifest
+    is saved to evidence/telemetry when anything was rebuilt.
+    """
+    evidence_dir = Path(evidence_dir)
+    if df is None:
+        df = dataset.load(evidence_dir=evidence_dir)
+    manifest = load_manifest(evidence_dir)
+    digests = Digests(evidence_dir, manifest.get(DIGESTS_KEY))
+    todo = plan(df, evidence_dir, steps, force, digests)
+    if dry_run:
+        for t, reason, _ in todo:
+            log(f"would rebuild {t.name} ({reason})")
+        return [(t, reason) for t, reason, _ in todo]
+
+    if digests.changed():
+        # keep the hashes of this plan even when nothing needs a rebuild
+        manifest[DIGESTS_KEY] = digests.entries()
+        save_manifest(manifest, evidence_dir)
+    save_telemetry = tel is None and bool(todo)
+    if tel is None:
+        tel = telemetry.Telemetry("build")
+
+    def done(t, current):
+        # a target may change its own file inputs while it runs
+        current["inputs"].update({f: digests.path(f) for f in t.files})
+        current["outputs"] = {o: digests.file(evidence_dir / o) for o in t.outputs if (evidence_dir / o).exists()}
+        manifest[t.name] = current
+        manifest[DIGESTS_KEY] = digests.entries()
+        # save as we go so an interrupted build keeps finished targets
+        save_manifest(manifest, evidence_dir)
+
+    chart_jobs = [(t, reason, current) for t, reason, current in todo if t.chart]
+    if chart_jobs:
+        import charts
+        for t, reason, _ in chart_jobs:
+            log(f"Rebuilding {t.name} ({reason})")
+        with tel.stage("charts", targets=len(chart_jobs)) as s:
+            charts.render(df, [t.chart for t, _, _ in chart_jobs], evidence_dir / "charts", workers)
+            s["rows"] = len(df)
+        for t, _, current in chart_jobs:
+            done(t, current)
+    for t, reason, current in todo:
+        if not t.chart:
+            log(f"Rebuilding {t.name} ({reason})")
+            with tel.stage(t.name) as s:
+                t.run(df, evidence_dir)
+                s["rows"] = t.rows(df, evidence_dir)
+            done(t, current)
+    if save_telemetry:
+        log(f"Telemetry: {tel.save(evidence_dir)}")
+    return [(t, reason) for t, reason, _ in todo]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild only the evidence outputs whose inputs changed")
+    parser.add_argument("steps", nargs="*", help="aggregate, charts, visualize, spreadsheets, requests, phases (default: all)")
+    parser.add_argument("--evidence", type=Path, default=dataset.evidence_dir)
+    parser.add_argument("--force", action="store_true", help="rebuild everything")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be rebuilt")
+    parser.add_argument("--workers", type=int, default=None, help="chart rendering processes")
+    args = parser.parse_args()
+
+    done = build(evidence_dir=args.evidence, steps=args.steps or None, force=args.force, dry_run=args.dry_run,
+                 workers=args.workers)
+    if not done:
+        print("Everything up to date")
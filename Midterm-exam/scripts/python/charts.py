@@ -1,77 +1,209 @@
+"""Chart registry and parallel renderer for evidence/charts.
+
+Every figure is declared once in REGISTRY as a Chart: how to select its
+data from the shared dataset, the plot kind, output name and dpi. render()
+draws the requested charts in a process pool on the Agg backend; the frame
+is sent to each worker once through the pool initializer instead of being
+re-read from summary.csv.
+
+Large datasets keep figures bounded: scatter charts with more than
+HEXBIN_MIN_POINTS sites are drawn as hexbin density plots, and bar charts
+over more than MAX_BARS sites become histograms.
+
+Usage:
+    python charts.py [--workers N] [name ...]
+"""
+import argparse
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-repo = Path(__file__).resolve().parents[2]  
-evidence = repo / "evidence"
-charts_dir = evidence / "charts"
-charts_dir.mkdir(parents=True, exist_ok=True)
-
-csv_path = evidence / "summary.csv"
-df = pd.read_csv(csv_path)
-
-# Coerce numeric columns
-num_cols = ["performanceScore","transferBytes","requests","jsBytes",
-            "co2_onebyte_grams","co2_swd_grams","fcp_ms","lcp_ms",
-            "speed_index_ms","tbt_ms","cls"]
-for c in num_cols:
-    if c in df.columns:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-
-# Short domain label
-df["label"] = df.get("domain", df.get("url", "")).astype(str).str.replace(r"^https?://", "", regex=True)
-
-sns.set_theme(style="whitegrid")
-
-# 1) Top 15 by transfer size
-if "transferBytes" in df.columns:
-    top = df.sort_values("transferBytes", ascending=False).head(15)
-    plt.figure(figsize=(12,7))
-    sns.barplot(data=top, x="transferBytes", y="label", palette="viridis")
-    plt.xlabel("Transfer size (bytes)"); plt.ylabel("")
-    plt.title("Top 15 pages by transfer size")
-    plt.tight_layout()
-    plt.savefig(charts_dir / "top15_transfer_bytes.png", dpi=200)
-    plt.close()
-
-# 2) Performance vs Transfer size
-if "performanceScore" in df.columns and "transferBytes" in df.columns:
-    plt.figure(figsize=(10,7))
-    sns.scatterplot(data=df, x="transferBytes", y="performanceScore",
-                    size="jsBytes" if "jsBytes" in df.columns else None,
-                    hue="co2_swd_grams" if "co2_swd_grams" in df.columns else None,
-                    palette="mako", sizes=(20,200), alpha=0.8)
-    plt.xlabel("Transfer size (bytes)")
-    plt.ylabel("Performance score (0–100)")
-    plt.title("Performance vs Transfer size")
-    plt.tight_layout()
-    plt.savefig(charts_dir / "perf_vs_transfer.png", dpi=200)
-    plt.close()
-
-# 3) CO2 model comparison
-if "co2_onebyte_grams" in df.columns and "co2_swd_grams" in df.columns:
-    plt.figure(figsize=(10,7))
-    sns.scatterplot(data=df, x="co2_onebyte_grams", y="co2_swd_grams")
-    plt.xlabel("CO₂ (grams) – OneByte model")
-    plt.ylabel("CO₂ (grams) – SWD model")
-    plt.title("CO₂ estimates comparison")
-    plt.tight_layout()
-    plt.savefig(charts_dir / "co2_models_comparison.png", dpi=200)
-    plt.close()
-
-# 4) JS bytes share vs total bytes
-if "jsBytes" in df.columns and "transferBytes" in df.columns:
+import dataset
+
+evidence = dataset.evidence_dir
+
+HEXBIN_MIN_POINTS = 2000
+HEXBIN_GRIDSIZE = 60
+MAX_BARS = 60
+
+
+class Chart:
+    """Declarative description of one figure."""
+
+    def __init__(self, name, kind, x, y, title, xlabel="", ylabel="", columns=(), select=None,
+                 step="charts", figsize=(10, 6), dpi=150, color=None, cmap=None, size=None, hue=None,
+                 hue_label=None, point_size=35, alpha=0.85, style=None):
+        self.name = name  # output is charts/<name>.png
+        self.kind = kind  # "bar", "barh" or "scatter"
+        self.x = x
+        self.y = y
+        self.title = title
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.columns = tuple(columns)  # summary.csv columns read (for build.py)
+        self.select = select  # df -> plot frame
+        self.step = step  # report step the chart belongs to
+        self.figsize = figsize
+        self.dpi = dpi
+        self.color = color
+        self.cmap = cmap  # colour map for bars, or for `hue` on scatter charts
+        self.size = size  # column holding marker sizes
+        self.hue = hue  # column mapped through `cmap`
+        self.hue_label = hue_label
+        self.point_size = point_size
+        self.alpha = alpha
+        self.style = style  # matplotlib style sheet
+
+
+def _top(column, n=None):
+    def select(df):
+        ranked = df.sort_values(column, ascending=False)
+        return ranked if n is None else ranked.head(n)
+    return select
+
+
+def _js_share(df):
     share = df[df["transferBytes"] > 0].copy()
     share["js_share_pct"] = (share["jsBytes"].fillna(0) / share["transferBytes"]) * 100
-    plt.figure(figsize=(12,7))
-    sns.barplot(data=share.sort_values("js_share_pct", ascending=False).head(15),
-                x="js_share_pct", y="label", palette="rocket")
-    plt.xlabel("JS share of transfer (%)"); plt.ylabel("")
-    plt.title("Top 15 pages by JS share (%)")
-    plt.tight_layout()
-    plt.savefig(charts_dir / "top15_js_share.png", dpi=200)
-    plt.close()
-
-print(f"Charts written to: {charts_dir}")
\ No newline at end of file
+    return share.sort_values("js_share_pct", ascending=False).head(15)
+
+
+def _perf_vs_transfer(df):
+    js_share = (df["jsBytes"] / df["transferBytes"].where(df["transferBytes"] != 0)) * 100
+    return df.assign(transfer_kb=df["transferBytes"] / 1024.0, bubble=js_share.fillna(0) * 2 + 20)
+
+
+WHITEGRID = "seaborn-v0_8-whitegrid"
+
+REGISTRY = [
+    # from visualize.py
+    Chart("performance_scores", "bar", "label", "performanceScore", "Municipality Performance Scores",
+          ylabel="Performance Score (0–100)", columns=("domain", "performanceScore"), step="visualize",
+          select=_top("performanceScore"), color="#4b8bbe"),
+    Chart("jsbytes_vs_co2", "scatter", "js_kb", "co2_swd_grams", "JS Bytes vs CO₂",
+          xlabel="JS Transfer (KB)", ylabel="CO₂ (SWD grams)", columns=("jsBytes", "co2_swd_grams"),
+          step="visualize", select=lambda df: df.assign(js_kb=df["jsBytes"] / 1024.0),
+          figsize=(7, 5), color="#6a4fbf"),
+    Chart("perf_vs_transfer", "scatter", "transfer_kb", "performanceScore",
+          "Performance vs Transfer Size (bubble=JS share %, color=CO₂)",
+          xlabel="Transfer Size (KB)", ylabel="Performance Score",
+          columns=("transferBytes", "performanceScore", "jsBytes", "co2_swd_grams"), step="visualize",
+          select=_perf_vs_transfer, figsize=(7, 5), size="bubble", hue="co2_swd_grams", cmap="viridis",
+          hue_label="CO₂ SWD (g)"),
+    Chart("top10_transfer", "bar", "label", "transfer_kb", "Top 10 Heaviest Pages",
+          ylabel="Transfer Size (KB)", columns=("domain", "transferBytes"), step="visualize",
+          select=lambda df: _top("transferBytes", 10)(df).assign(transfer_kb=lambda d: d["transferBytes"] / 1024.0),
+          color="#ff7043"),
+    Chart("co2_models", "scatter", "co2_onebyte_grams", "co2_swd_grams", "CO₂ Model Comparison",
+          xlabel="CO₂ OneByte (g)", ylabel="CO₂ SWD (g)", columns=("co2_onebyte_grams", "co2_swd_grams"),
+          step="visualize", figsize=(6, 5), color="#00897b", point_size=40, alpha=0.8),
+    # from the original charts.py
+    Chart("top15_transfer_bytes", "barh", "transferBytes", "label", "Top 15 pages by transfer size",
+          xlabel="Transfer size (bytes)", columns=("domain", "transferBytes"),
+          select=_top("transferBytes", 15), figsize=(12, 7), dpi=200, cmap="viridis", style=WHITEGRID),
+    Chart("co2_models_comparison", "scatter", "co2_onebyte_grams", "co2_swd_grams", "CO₂ estimates comparison",
+          xlabel="CO₂ (grams) – OneByte model", ylabel="CO₂ (grams) – SWD model",
+          columns=("co2_onebyte_grams", "co2_swd_grams"), figsize=(10, 7), dpi=200, style=WHITEGRID),
+    Chart("top15_js_share", "barh", "js_share_pct", "label", "Top 15 pages by JS share (%)",
+          xlabel="JS share of transfer (%)", columns=("domain", "jsBytes", "transferBytes"),
+          select=_js_share, figsize=(12, 7), dpi=200, cmap="magma", style=WHITEGRID),
+]
+BY_NAME = {c.name: c for c in REGISTRY}
+
+
+def draw(chart, df, charts_dir):
+    """Render one Chart from the shared frame and return the PNG path (None if columns are missing)."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    if any(c not in df.columns for c in chart.columns):
+        return None
+    data = chart.select(df) if chart.select else df
+
+    with plt.style.context(chart.style or "default"):
+        fig, ax = plt.subplots(figsize=chart.figsize)
+        if chart.kind == "scatter" and len(data) > HEXBIN_MIN_POINTS:
+            hb = ax.hexbin(data[chart.x], data[chart.y], gridsize=HEXBIN_GRIDSIZE, mincnt=1,
+                           C=data[chart.hue] if chart.hue else None, reduce_C_function=np.mean,
+                           cmap=chart.cmap or "viridis")
+            fig.colorbar(hb, label=chart.hue_label if chart.hue else "sites")
+        elif chart.kind == "scatter":
+            sc = ax.scatter(data[chart.x], data[chart.y],
+                            s=data[chart.size] if chart.size else chart.point_size,
+                            c=data[chart.hue] if chart.hue else chart.color,
+                            cmap=chart.cmap if chart.hue else None, alpha=chart.alpha)
+            if chart.hue:
+                fig.colorbar(sc, label=chart.hue_label)
+        elif len(data) > MAX_BARS:
+            value, label = (chart.y, chart.ylabel) if chart.kind == "bar" else (chart.x, chart.xlabel)
+            ax.hist(data[value].dropna(), bins=40, color=chart.color or "#4b8bbe")
+        else:
+            colors = chart.color
+            if chart.cmap:
+                colors = plt.get_cmap(chart.cmap)(np.linspace(0.1, 0.9, len(data)))
+            if chart.kind == "bar":
+                ax.bar(data[chart.x].astype(str), data[chart.y], color=colors)
+                ax.tick_params(axis="x", labelrotation=90, labelsize=8)
+            else:
+                ax.barh(data[chart.y].astype(str), data[chart.x], color=colors)
+                ax.invert_yaxis()
+        if chart.kind != "scatter" and len(data) > MAX_BARS:
+            ax.set_xlabel(label)
+            ax.set_ylabel("sites")
+        else:
+            ax.set_xlabel(chart.xlabel)
+            ax.set_ylabel(chart.ylabel)
+        ax.set_title(chart.title)
+        fig.tight_layout()
+        out = Path(charts_dir) / f"{chart.name}.png"
+        fig.savefig(out, dpi=chart.dpi)
+        plt.close(fig)
+    return out
+
+
+# Worker state: the frame arrives once per process via the pool initializer
+_worker_df = None
+
+
+def _init_worker(df):
+    global _worker_df
+    _worker_df = df
+
+
+def _draw_named(name, charts_dir):
+    return draw(BY_NAME[name], _worker_df, charts_dir)
+
+
+def render(df, names=None, charts_dir=None, workers=None):
+    """Render the named charts (default: all) concurrently; returns {name: path}."""
+    names = list(names) if names is not None else [c.name for c in REGISTRY]
+    charts_dir = Path(charts_dir or evidence / "charts")
+    charts_dir.mkdir(parents=True, exist_ok=True)
+    if workers is None:
+        workers = min(len(names), os.cpu_count() or 1)
+    if workers <= 1 or len(names) <= 1:
+        return {n: draw(BY_NAME[n], df, charts_dir) for n in names}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(df,)) as pool:
+        return dict(zip(names, pool.map(_draw_named, names, [charts_dir] * len(names))))
+
+
+def main(df=None, evidence_dir=evidence, names=None, workers=None):
+    if df is None:
+        df = dataset.load(evidence_dir=evidence_dir)
+    charts_dir = Path(evidence_dir) / "charts"
+    if names is None:
+        names = [c.name for c in REGISTRY if c.step == "charts"]
+    render(df, names, charts_dir, workers)
+
+    print(f"Charts written to: {charts_dir}")
+    return charts_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render charts from the registry")
+    parser.add_argument("names", nargs="*", help=f"any of: {', '.join(BY_NAME)} (default: all)")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    main(names=args.names or list(BY_NAME), workers=args.workers)
@@ -0,0 +1,262 @@
+"""CO₂ per byte estimates, ported from @tgwf/co2 0.16 (1byte and SWD v3).
+
+Both functions accept a scalar or a NumPy array of byte counts and give the
+same grams as `new co2({ model }).perByte(bytes, green)` in audit.js.
+
+The rest of the module re-scores existing evidence without re-running the
+audit, as array operations over site-level bytes (summary.csv) or
+request-level bytes (the ingest store):
+
+- green hosting: each site is scored with its greencheck result, which
+  audit.js fetched but never passed to perByte
+- attribution: grams per resourceType and per entity for every site
+- what-if: scale the bytes of some resource types, e.g. Script=0.5
+- cross-check: recompute summary.csv's co2 columns from its transferBytes
+
+Usage:
+    python co2.py [--source store|summary] [--check]
+    python co2.py [--source store] --what-if Script=0.5 [--what-if Image=0.8 ...]
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+# OneByte model
+CO2_PER_KWH_IN_DC_GREY = 519
+CO2_PER_KWH_NETWORK_GREY = 475
+CO2_PER_KWH_IN_DC_GREEN = 0
+KWH_PER_BYTE_IN_DC = 72e-12
+FIXED_NETWORK_WIRED = 429e-12
+FIXED_NETWORK_WIFI = 152e-12
+FOUR_G_MOBILE = 884e-12
+KWH_PER_BYTE_FOR_NETWORK = (FIXED_NETWORK_WIRED + FIXED_NETWORK_WIFI + FOUR_G_MOBILE) / 3
+
+# Sustainable Web Design model (v3)
+GIGABYTE = 1e3 * 1e3 * 1e3
+KWH_PER_GB = 0.81
+END_USER_DEVICE_ENERGY = 0.52
+NETWORK_ENERGY = 0.14
+DATACENTER_ENERGY = 0.15
+PRODUCTION_ENERGY = 0.19
+GLOBAL_GRID_INTENSITY = 472.94
+RENEWABLES_GRID_INTENSITY = 50
+
+
+def onebyte_per_byte(bytes_, green=False):
+    b = np.asarray(bytes_, dtype=np.float64)
+    grey = b * (KWH_PER_BYTE_IN_DC + KWH_PER_BYTE_FOR_NETWORK) * CO2_PER_KWH_IN_DC_GREY
+    greener = b * KWH_PER_BYTE_IN_DC * CO2_PER_KWH_IN_DC_GREEN + b * KWH_PER_BYTE_FOR_NETWORK * CO2_PER_KWH_NETWORK_GREY
+    out = np.where(np.asarray(green, dtype=bool), greener, grey)
+    out = np.where(b < 1, 0.0, out)
+    return out if out.ndim else float(out)
+
+
+def swd_per_byte(bytes_, green=False):
+    b = np.asarray(bytes_, dtype=np.float64)
+    b = np.where(b < 1, 0.0, b)
+    energy = b / GIGABYTE * KWH_PER_GB
+    dc_intensity = np.where(np.asarray(green, dtype=bool), RENEWABLES_GRID_INTENSITY, GLOBAL_GRID_INTENSITY)
+    out = (
+        energy * END_USER_DEVICE_ENERGY * GLOBAL_GRID_INTENSITY
+        + energy * NETWORK_ENERGY * GLOBAL_GRID_INTENSITY
+        + energy * PRODUCTION_ENERGY * GLOBAL_GRID_INTENSITY
+        + energy * DATACENTER_ENERGY * dc_intensity
+    )
+    return out if out.ndim else float(out)
+
+
+MODELS = {"onebyte": onebyte_per_byte, "swd": swd_per_byte}
+ATTRIBUTION_DIMENSIONS = ("resourceType", "entity")
+
+# Locate evidence folder
+evidence_dir = Path(__file__).resolve().parents[2] / "evidence"
+
+
+def score(bytes_, green=False, prefix=""):
+    """Grams for every model, as {"<prefix>co2_<model>_grams": array}."""
+    return {f"{prefix}co2_{name}_grams": fn(bytes_, green) for name, fn in MODELS.items()}
+
+
+def parse_what_if(specs):
+    """["Script=0.5", "Image=0.8"] -> {"Script": 0.5, "Image": 0.8}."""
+    scale = {}
+    for spec in specs or []:
+        name, sep, factor = spec.partition("=")
+        if not sep:
+            raise ValueError(f"what-if must look like ResourceType=factor, got {spec!r}")
+        scale[name] = float(factor)
+    return scale
+
+
+def green_hosting(evidence_dir=evidence_dir):
+    """{domain: bool} from hosting/*_greencheck.json."""
+    green = {}
+    for p in Path(evidence_dir, "hosting").glob("*_greencheck.json"):
+        with open(p, encoding="utf-8") as f:
+            data = json.load(f)
+        green[data.get("domain") or p.name[:-len("_greencheck.json")]] = bool(data.get("green"))
+    return green
+
+
+def _green_flags(domains, green):
+    return np.array([bool(green.get(d, False)) for d in domains])
+
+
+def score_summary(df, green=None):
+    """Site-level scores from summary.csv: grey (as audit.js) and green-adjusted grams."""
+    import pandas as pd
+
+    domains = df["domain"].astype(str).to_numpy()
+    if green is None and "greenHosting" in df.columns:
+        flags = df["greenHosting"].fillna(False).astype(bool).to_numpy()
+    else:
+        flags = _green_flags(domains, green or {})
+    transfer = df["transferBytes"].to_numpy(dtype=np.float64)
+    return pd.DataFrame({"domain": domains, "greenHosting": flags, "transferBytes": transfer,
+                         **score(transfer), **score(transfer, flags, prefix="green_")})
+
+
+def _scaled_transfer(requests, scale):
+    transfer = np.clip(np.asarray(requests["transferSize"]), 0, None).astype(np.float64)
+    if not scale:
+        return transfer
+    codes, cats = requests["resourceType"]
+    factors = np.array([scale.get(c, 1.0) for c in cats])
+    return transfer * factors[np.asarray(codes)]
+
+
+def score_store(store_dir=None, green=None, scale=None):
+    """Request-level scores from the ingest store; returns (sites, attribution) frames.
+
+    Site bytes are the median across runs of each run's total, as in summary.csv.
+    Attribution uses the mean across runs instead, so a site's categories add up
+    to its mean total and the rows stay sparse (no sites x entities matrix).
+    With `scale` ({resourceType: factor}) whatif_* columns are added.
+    """
+    import pandas as pd
+
+    import ingest
+
+    store_dir = Path(store_dir) if store_dir else ingest.store_dir
+    runs = ingest.load_table("runs", store_dir)
+    requests = ingest.load_table("requests", store_dir)
+    domain_codes, domains = runs["domain"]
+    domain_codes = np.asarray(domain_codes)
+    n_runs, n_domains = len(domain_codes), len(domains)
+    flags = _green_flags(domains, green or {})
+    run_index = np.asarray(requests["run_index"])
+    variants = {"": _scaled_transfer(requests, None)}
+    if scale:
+        variants["whatif_"] = _scaled_transfer(requests, scale)
+
+    # site level: per-run totals, median across each site's runs
+    sites = pd.DataFrame({"domain": domains, "greenHosting": flags})
+    for prefix, transfer in variants.items():
+        per_run = np.bincount(run_index, weights=transfer, minlength=n_runs)
+        median = pd.Series(per_run).groupby(domain_codes).median().reindex(range(n_domains)).to_numpy()
+        sites[f"{prefix}transferBytes"] = median
+        sites = sites.assign(**score(median, prefix=prefix), **score(median, flags, prefix=prefix + "green_"))
+
+    # attribution: sparse (site, category) sums over runs / runs per site
+    runs_per_site = np.bincount(domain_codes, minlength=n_domains)
+    site_of_request = domain_codes[run_index]
+    frames = []
+    for dimension in ATTRIBUTION_DIMENSIONS:
+        codes, cats = requests[dimension]
+        cats = np.array([c or "Other" for c in cats], dtype=object)
+        keys, inverse = np.unique(site_of_request.astype(np.int64) * len(cats) + np.asarray(codes),
+                                  return_inverse=True)
+        site_idx, cat_idx = np.divmod(keys, len(cats))
+        frame = pd.DataFrame({"domain": np.asarray(domains, dtype=object)[site_idx], "dimension": dimension,
+                              "category": cats[cat_idx]})
+        for prefix, transfer in variants.items():
+            mean = np.bincount(inverse, weights=transfer, minlength=len(keys)) / runs_per_site[site_idx]
+            frame[f"{prefix}transferBytes"] = mean
+            frame = frame.assign(**score(mean, prefix=prefix),
+                                 **score(mean, flags[site_idx], prefix=prefix + "green_"))
+        frames.append(frame)
+    return sites, pd.concat(frames, ignore_index=True)
+
+
+def check_summary(df, rtol=1e-5):
+    """Recompute summary.csv's co2 columns from transferBytes; returns mismatching rows."""
+    import pandas as pd
+
+    transfer = df["transferBytes"].to_numpy(dtype=np.float64)
+    out = pd.DataFrame({"domain": df["domain"].astype(str).to_numpy()})
+    bad = np.zeros(len(df), dtype=bool)
+    for column, expected in score(transfer).items():
+        if column not in df.columns:
+            continue
+        recorded = df[column].to_numpy(dtype=np.float64)
+        out[column] = recorded
+        out[f"expected_{column}"] = expected
+        bad |= ~np.isclose(recorded, expected, rtol=rtol, atol=1e-9)
+    return out[bad]
+
+
+def main(source="store", evidence=evidence_dir, store_dir=None, what_if=None, check=False):
+    import dataset
+
+    if what_if and source == "summary":
+        # summary.csv has no per-type bytes to scale
+        raise ValueError("--what-if needs the request-level store; use --source store")
+    evidence = Path(evidence)
+    df = dataset.load(evidence_dir=evidence)
+    green = green_hosting(evidence)
+    if check:
+        mismatches = check_summary(df)
+        print(f"co2 columns checked for {len(df)} sites: {len(mismatches)} mismatch(es)")
+        if len(mismatches):
+            print(mismatches.to_string(index=False))
+
+    scale = parse_what_if(what_if)
+    outputs = []
+    if source == "summary":
+        sites = score_summary(df, green or None)
+    else:
+        import ingest
+
+        store_dir = Path(store_dir) if store_dir else evidence / "store"
+        ingest.ensure_store(evidence / "lighthouse" / "runs", store_dir)
+        sites, attribution = score_store(store_dir, green, scale)
+        out = evidence / "co2_by_resource.csv"
+        attribution.to_csv(out, index=False)
+        outputs.append(out)
+        if check:
+            recorded = df.set_index(df["domain"].astype(str))["transferBytes"]
+            drift = sites["transferBytes"] / sites["domain"].map(recorded) - 1
+            print(f"store vs summary.csv transferBytes: max relative difference {np.nanmax(np.abs(drift)):.4f}")
+    out = evidence / "co2_by_site.csv"
+    sites.to_csv(out, index=False)
+    outputs.insert(0, out)
+
+    grams = [c for c in sites.columns if c.endswith("_grams")]
+    print(sites[grams].sum().round(3).to_string())
+    for p in outputs:
+        print(f"Saved: {p}")
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score CO₂ from existing evidence")
+    parser.add_argument("--source", choices=("store", "summary"), default="store",
+                        help="request-level store (default) or site-level summary.csv")
+    parser.add_argument("--evidence", type=Path, default=evidence_dir)
+    parser.add_argument("--store", type=Path, default=None, help="columnar store (default: <evidence>/store)")
+    parser.add_argument("--what-if", action="append", metavar="TYPE=FACTOR",
+                        help="scale a resourceType's bytes, e.g. Script=0.5 (store source only)")
+    parser.add_argument("--check", action="store_true", help="cross-check summary.csv's co2 columns")
+    args = parser.parse_args()
+    if args.what_if and args.source == "summary":
+        parser.error("--what-if scales request-level bytes; it cannot be used with --source summary")
+    import telemetry
+
+    with telemetry.cli_stage("co2", args.evidence, source=args.source) as s:
+        outputs = main(args.source, args.evidence, args.store, args.what_if, args.check)
+        if args.source == "store":
+            import ingest
+
+            s["rows"] = ingest.table_rows("requests", args.store or args.evidence / "store")
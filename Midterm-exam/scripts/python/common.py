@@ -0,0 +1,21 @@
+"""Helpers shared by audit.py, hosting.py and synthetic.py.
+
+Site URLs map to evidence file names and hosts, and timestamps are written,
+exactly as audit.js does it.
+"""
+import re
+from datetime import datetime, timezone
+
+
+def domain_key(url):
+    """File name stem of a site: https://www.as.kommune.no/ -> www.as.kommune.no_"""
+    return re.sub(r"[/:]", "_", re.sub(r"^https?://", "", url))
+
+
+def host_of(url):
+    return re.sub(r"/+$", "", re.sub(r"^https?://", "", url))
+
+
+def iso_now():
+    """UTC now as new Date().toISOString() writes it."""
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
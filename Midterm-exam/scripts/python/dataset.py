@@ -0,0 +1,98 @@
+"""Shared loader for the per-site audit table (evidence/summary.csv).
+
+Every report step gets the same frame from load(): categorical domain,
+float32 scores and timings, float64 byte, request and CO₂ columns (float32
+would round page weights above 16 MB), and a nullable boolean greenHosting,
+parsed once with an explicit dtype schema. Steps that use other column names rename a view of it
+with the maps below instead of re-reading the CSV.
+"""
+from pathlib import Path
+
+import pandas as pd
+
+# Locate evidence folder
+evidence_dir = Path(__file__).resolve().parents[2] / "evidence"
+
+METRIC_COLUMNS = [
+    "performanceScore", "transferBytes", "requests", "jsBytes",
+    "co2_onebyte_grams", "co2_swd_grams",
+    "fcp_ms", "lcp_ms", "speed_index_ms", "tbt_ms", "cls",
+]
+# Exact counts and the CO₂ derived from them; every other metric is read as float32
+FLOAT64_COLUMNS = {"transferBytes", "requests", "jsBytes", "co2_onebyte_grams", "co2_swd_grams"}
+TEXT_COLUMNS = {"url": "string", "timestamp": "string"}
+
+# Column names used by visualize.py and the spreadsheet exports
+VISUALIZE_NAMES = {
+    "domain": "Municipality",
+    "performanceScore": "PerfScore",
+    "fcp_ms": "FCP",
+    "lcp_ms": "LCP",
+    "speed_index_ms": "SpeedIndex",
+    "transferBytes": "PageWeightBytes",
+    "jsBytes": "JSBytes",
+    "co2_swd_grams": "CO2_SWD_g",
+    "co2_onebyte_grams": "CO2_OneByte_g",
+}
+SPREADSHEET_NAMES = {
+    "performanceScore": "PerfScore",
+    "fcp_ms": "FCP",
+    "lcp_ms": "LCP",
+    "speed_index_ms": "SpeedIndex",
+    "tbt_ms": "TBT",
+    "cls": "CLS",
+    "transferBytes": "PageWeightBytes",
+    "jsBytes": "JSBytes",
+    "co2_swd_grams": "CO2_SWD_g",
+    "co2_onebyte_grams": "CO2_OneByte_g",
+    "requests": "Requests",
+    "domain": "Municipality",
+    "greenHosting": "GreenHosting",
+}
+
+
+def source_csv(evidence_dir=evidence_dir):
+    """summary.csv as written by the audit, or results.csv for older evidence folders."""
+    evidence_dir = Path(evidence_dir)
+    for name in ("summary.csv", "results.csv"):
+        if (evidence_dir / name).exists():
+            return evidence_dir / name
+    raise SystemExit(f"No summary.csv or results.csv found in {evidence_dir}")
+
+
+def schema(columns):
+    """dtype mapping for the columns present in a summary CSV header."""
+    dtype = {}
+    for c in columns:
+        if c in FLOAT64_COLUMNS:
+            dtype[c] = "float64"
+        elif c in METRIC_COLUMNS or c.endswith(("_ci_low", "_ci_high")):
+            dtype[c] = "float32"
+        elif c in TEXT_COLUMNS:
+            dtype[c] = TEXT_COLUMNS[c]
+    if "domain" in columns:
+        dtype["domain"] = "category"
+    if "greenHosting" in columns:
+        dtype["greenHosting"] = "boolean"
+    return dtype
+
+
+def load(path=None, evidence_dir=evidence_dir):
+    """Read the summary CSV once with the shared schema."""
+    path = Path(path) if path else source_csv(evidence_dir)
+    dtype = schema(pd.read_csv(path, nrows=0).columns)
+    try:
+        # round_trip: the default parser can be off in the last digit of the float64 columns
+        df = pd.read_csv(path, dtype=dtype, float_precision="round_trip")
+    except (ValueError, TypeError):
+        # Hand-edited files may contain stray text: coerce it to NaN as before
+        loose = {c: t for c, t in dtype.items() if t not in ("float32", "float64")}
+        df = pd.read_csv(path, dtype=loose, float_precision="round_trip")
+        for c, t in dtype.items():
+            if t in ("float32", "float64"):
+                df[c] = pd.to_numeric(df[c], errors="coerce").astype(t)
+    if "domain" in df.columns:
+        df["label"] = df["domain"].astype(str).str.replace(r"^https?://", "", regex=True)
+    elif "url" in df.columns:
+        df["label"] = df["url"].astype(str).str.replace(r"^https?://", "", regex=True)
+    return df
@@ -0,0 +1,314 @@
+"""Append-only history of audit rounds in SQLite (evidence/history.sqlite).
+
+summary.csv and the run files only describe the latest audit. record()
+copies one round into the history: every summary.csv metric per site, and
+the per-run metrics from the ingest store, keyed by (domain, metric, round).
+Rounds are never updated; recording a label twice is an error. Queries name
+a round by its label, or by its id written as "#N" (an int from Python).
+
+Metrics are stored long (one row per value) in WITHOUT ROWID tables whose
+primary key serves per-site time series, with a second index on
+(metric, round, domain) for comparisons across all sites, so queries read
+only the rows they return.
+
+Usage:
+    python history.py record [--round LABEL]
+    python history.py rounds
+    python history.py series lcp_ms [--domain www.asker.kommune.no] [--runs]
+    python history.py deltas transferBytes [--from LABEL|#ID] [--to LABEL|#ID]
+    python history.py regressions [metric ...] [--threshold 5] [--from LABEL|#ID] [--to LABEL|#ID]
+"""
+import argparse
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import stats
+
+# Locate evidence folder
+evidence_dir = dataset.evidence_dir
+DB_NAME = "history.sqlite"
+
+# summary.csv columns recorded per site (plus any *_ci_low/_ci_high present)
+SITE_METRICS = dataset.METRIC_COLUMNS + ["greenHosting"]
+# per-run metric -> Lighthouse audit id in the ingest store
+RUN_METRICS = dict(stats.CI_METRICS, transferBytes="total-byte-weight")
+HIGHER_IS_BETTER = {"performanceScore"}
+REGRESSION_METRICS = ("performanceScore", "lcp_ms", "fcp_ms", "tbt_ms", "cls", "transferBytes", "co2_swd_grams")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL UNIQUE,
+    started_at TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    sites INTEGER NOT NULL,
+    runs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS site_metrics (
+    domain TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    round INTEGER NOT NULL REFERENCES rounds(id),
+    timestamp TEXT,
+    value REAL,
+    PRIMARY KEY (domain, metric, round)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS site_metrics_by_round ON site_metrics (metric, round, domain);
+CREATE TABLE IF NOT EXISTS run_metrics (
+    domain TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    round INTEGER NOT NULL REFERENCES rounds(id),
+    run INTEGER NOT NULL,
+    fetch_time TEXT,
+    value REAL,
+    PRIMARY KEY (domain, metric, round, run)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS run_metrics_by_round ON run_metrics (metric, round, domain);
+CREATE INDEX IF NOT EXISTS rounds_by_start ON rounds (started_at, id);
+"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def _long(frame, id_columns, metrics):
+    """Melt wide metric columns to (id..., metric, value) rows, dropping missing values."""
+    long = frame.melt(id_vars=id_columns, value_vars=metrics, var_name="metric", value_name="value")
+    return long.dropna(subset=["value"])
+
+
+def site_rows(df):
+    """summary.csv frame -> long per-site rows."""
+    metrics = [c for c in SITE_METRICS + stats.ci_columns() if c in df.columns]
+    wide = df.assign(domain=df["domain"].astype(str), timestamp=df["timestamp"].astype(object))
+    if "greenHosting" in wide.columns:
+        wide["greenHosting"] = wide["greenHosting"].astype(str).str.lower().map({"true": 1.0, "false": 0.0})
+    wide = wide[["domain", "timestamp"] + metrics].astype({m: "float64" for m in metrics})
+    return _long(wide, ["domain", "timestamp"], metrics)
+
+
+def run_rows(store_dir):
+    """Ingest store -> long per-run rows (performanceScore on the 0-100 scale, like summary.csv)."""
+    import ingest
+
+    runs = ingest.load_table("runs", store_dir)
+    ids, audits = ingest.load_audits(store_dir)
+    col = {a: i for i, a in enumerate(ids)}
+    codes, domains = runs["domain"]
+    fetch_codes, fetch_times = runs["fetchTime"]
+    wide = pd.DataFrame({
+        "domain": np.asarray(domains, dtype=object)[np.asarray(codes)],
+        "run": np.asarray(runs["run"]),
+        "fetch_time": np.asarray(fetch_times, dtype=object)[np.asarray(fetch_codes)],
+        "requests": np.asarray(runs["requests"], dtype=np.float64),
+    })
+    for metric, source in RUN_METRICS.items():
+        if source == "score":
+            wide[metric] = np.round(np.asarray(runs["performanceScore"]) * 100, 6)
+        elif source in col:
+            wide[metric] = audits[:, col[source]]
+    metrics = [m for m in (*RUN_METRICS, "requests") if m in wide.columns]
+    return _long(wide, ["domain", "run", "fetch_time"], metrics)
+
+
+class History:
+    """Query and append API over the SQLite history file."""
+
+    def __init__(self, path=evidence_dir / DB_NAME):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, df, store_dir=None, label=None):
+        """Append one round (summary frame + optional ingest store); returns the round id."""
+        sites = site_rows(df)
+        runs = run_rows(store_dir) if store_dir else sites.iloc[:0]
+        started = min((t for t in df["timestamp"].dropna().astype(str)), default=_now())
+        label = label or started
+        if label.startswith("#"):
+            raise ValueError(f"round label {label!r} may not start with '#', which marks a round id")
+        n_runs = len(runs[["domain", "run"]].drop_duplicates()) if len(runs) else 0
+        with self.conn:
+            if self.conn.execute("SELECT 1 FROM rounds WHERE label = ?", (label,)).fetchone():
+                raise ValueError(f"round {label!r} is already recorded; history is append-only")
+            cur = self.conn.execute(
+                "INSERT INTO rounds (label, started_at, recorded_at, sites, runs) VALUES (?, ?, ?, ?, ?)",
+                (label, started, _now(), int(df["domain"].nunique()), n_runs))
+            round_id = cur.lastrowid
+            self.conn.executemany(
+                "INSERT INTO site_metrics (domain, metric, round, timestamp, value) VALUES (?, ?, ?, ?, ?)",
+                zip(sites["domain"].tolist(), sites["metric"].tolist(), [round_id] * len(sites),
+                    sites["timestamp"].tolist(), sites["value"].tolist()))
+            if len(runs):
+                self.conn.executemany(
+                    "INSERT INTO run_metrics (domain, metric, round, run, fetch_time, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    zip(runs["domain"].tolist(), runs["metric"].tolist(), [round_id] * len(runs),
+                        runs["run"].tolist(), runs["fetch_time"].tolist(), runs["value"].tolist()))
+        return round_id
+
+    def _query(self, sql, params=()):
+        return pd.read_sql_query(sql, self.conn, params=params)
+
+    def rounds(self):
+        return self._query("SELECT id, label, started_at, recorded_at, sites, runs FROM rounds "
+                           "ORDER BY started_at, id")
+
+    def _round_id(self, round_ref):
+        """Id of a round given by label, by "#N" or by an int id; a label is never read as an id."""
+        if isinstance(round_ref, str) and round_ref.startswith("#"):
+            try:
+                round_ref = int(round_ref[1:])
+            except ValueError:
+                raise ValueError(f"bad round id {round_ref!r}; write ids as #N") from None
+        if isinstance(round_ref, (int, np.integer)):
+            row = self.conn.execute("SELECT id FROM rounds WHERE id = ?", (int(round_ref),)).fetchone()
+        else:
+            row = self.conn.execute("SELECT id FROM rounds WHERE label = ?", (str(round_ref),)).fetchone()
+        if row is None:
+            known = [f"#{i} {label}" for i, label in
+                     self.conn.execute("SELECT id, label FROM rounds ORDER BY started_at, id")]
+            ref = f"#{round_ref}" if isinstance(round_ref, (int, np.integer)) else repr(round_ref)
+            raise ValueError(f"no round {ref}; recorded rounds: {', '.join(known) or 'none'}")
+        return row[0]
+
+    def site_frame(self):
+        """Every recorded per-site row as one wide frame (round, started_at, domain, metrics...)."""
+        long = self._query("SELECT r.label AS round, r.started_at, m.domain, m.metric, m.value "
+                           "FROM site_metrics m JOIN rounds r ON r.id = m.round")
+        wide = long.pivot_table(index=["round", "started_at", "domain"], columns="metric", values="value",
+                                aggfunc="first")
+        return wide.reset_index().rename_axis(columns=None).sort_values(["started_at", "domain"])
+
+    def iter_run_values(self, round_id, metrics, chunk_rows=100_000):
+        """Yield (metric, values) chunks of one round's per-run rows, never holding the whole round."""
+        for metric in metrics:
+            cur = self.conn.execute("SELECT value FROM run_metrics WHERE metric = ? AND round = ?",
+                                    (metric, round_id))
+            while True:
+                rows = cur.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield metric, np.array(rows, dtype=np.float64)[:, 0]
+
+    def series(self, metric, domain=None, runs=False):
+        """Time series of `metric` (one site or all), oldest round first."""
+        table, extra = ("run_metrics", "m.run, m.fetch_time") if runs else ("site_metrics", "m.timestamp")
+        where, params = "m.metric = ?", [metric]
+        if domain:
+            where += " AND m.domain = ?"
+            params.append(domain)
+        return self._query(
+            f"SELECT m.domain, r.label AS round, r.started_at, {extra}, m.value "
+            f"FROM {table} m JOIN rounds r ON r.id = m.round WHERE {where} "
+            "ORDER BY m.domain, r.started_at, r.id" + (", m.run" if runs else ""), params)
+
+    def deltas(self, metric, before=None, after=None):
+        """Per-site change of `metric` between two rounds (default: the last two)."""
+        if before is None or after is None:
+            ids = [r[0] for r in self.conn.execute("SELECT id FROM rounds ORDER BY started_at DESC, id DESC LIMIT 2")]
+            if len(ids) < 2:
+                return pd.DataFrame(columns=["domain", "before", "after", "delta", "pct"])
+            after = ids[0] if after is None else after
+            before = ids[1] if before is None else before
+        return self._query(
+            "SELECT a.domain, a.value AS before, b.value AS after, b.value - a.value AS delta, "
+            "(b.value - a.value) * 100.0 / NULLIF(ABS(a.value), 0) AS pct "
+            "FROM site_metrics a JOIN site_metrics b ON b.metric = a.metric AND b.domain = a.domain "
+            "WHERE a.metric = ? AND a.round = ? AND b.round = ? ORDER BY a.domain",
+            (metric, self._round_id(before), self._round_id(after)))
+
+    def regressions(self, metrics=REGRESSION_METRICS, threshold_pct=5.0, before=None, after=None):
+        """Sites whose metrics got worse by more than `threshold_pct` percent between two rounds."""
+        frames = []
+        for metric in metrics:
+            d = self.deltas(metric, before, after)
+            worse = -d["pct"] if metric in HIGHER_IS_BETTER else d["pct"]
+            frames.append(d[worse > threshold_pct].assign(metric=metric))
+        if not frames:
+            return pd.DataFrame(columns=["metric", "domain", "before", "after", "delta", "pct"])
+        out = pd.concat(frames, ignore_index=True)
+        return out[["metric", "domain", "before", "after", "delta", "pct"]]
+
+
+def record(evidence_dir=evidence_dir, label=None, with_runs=True, db=None):
+    """Append the current evidence (summary.csv + ingest store) as a new round."""
+    evidence_dir = Path(evidence_dir)
+    # full float64 values from the CSV, not dataset.load()'s float32 scores and timings
+    df = pd.read_csv(dataset.source_csv(evidence_dir), dtype={"domain": str, "timestamp": str})
+    store_dir = None
+    if with_runs:
+        import ingest
+
+        store_dir = evidence_dir / "store"
+        # the run files may be newer than the store (audit.js, audit.py --no-history)
+        ingest.ensure_store(evidence_dir / "lighthouse" / "runs", store_dir)
+    with History(db or evidence_dir / DB_NAME) as h:
+        return h.record(df, store_dir, label)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append audit rounds to the history and query trends")
+    parser.add_argument("--evidence", type=Path, default=evidence_dir)
+    parser.add_argument("--db", type=Path, default=None, help=f"SQLite file (default: <evidence>/{DB_NAME})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("record", help="append the current summary.csv and run files as a round")
+    p.add_argument("--round", default=None, help="round label (default: earliest summary timestamp)")
+    p.add_argument("--no-runs", action="store_true", help="skip per-run metrics")
+    sub.add_parser("rounds", help="list recorded rounds")
+    p = sub.add_parser("series", help="time series of one metric")
+    p.add_argument("metric")
+    p.add_argument("--domain")
+    p.add_argument("--runs", action="store_true", help="per-run values instead of per-site")
+    p = sub.add_parser("deltas", help="per-site change between two rounds")
+    p.add_argument("metric")
+    p.add_argument("--from", dest="before", help="round label or #id (default: second to last)")
+    p.add_argument("--to", dest="after", help="round label or #id (default: last)")
+    p = sub.add_parser("regressions", help="sites that got worse between two rounds")
+    p.add_argument("metrics", nargs="*", default=list(REGRESSION_METRICS))
+    p.add_argument("--threshold", type=float, default=5.0, help="percent change counted as a regression")
+    p.add_argument("--from", dest="before", help="round label or #id (default: second to last)")
+    p.add_argument("--to", dest="after", help="round label or #id (default: last)")
+    args = parser.parse_args()
+
+    import telemetry
+
+    db = args.db or args.evidence / DB_NAME
+    try:
+        with telemetry.cli_stage("history", args.evidence, command=args.command) as s:
+            if args.command == "record":
+                round_id = record(args.evidence, args.round, not args.no_runs, db)
+                s["round"] = round_id
+            else:
+                with History(db) as h:
+                    if args.command == "rounds":
+                        out = h.rounds()
+                    elif args.command == "series":
+                        out = h.series(args.metric, args.domain, args.runs)
+                    elif args.command == "deltas":
+                        out = h.deltas(args.metric, args.before, args.after)
+                    else:
+                        out = h.regressions(args.metrics, args.threshold, args.before, args.after)
+                s["rows"] = len(out)
+    except ValueError as e:
+        parser.exit(1, f"{e}\n")
+    if args.command == "record":
+        print(f"Recorded round {round_id} in {db}")
+    else:
+        print(out.to_string(index=False) if len(out) else "No rows")
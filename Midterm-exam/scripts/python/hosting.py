@@ -0,0 +1,354 @@
+"""Asynchronous green hosting and carbon.txt checks with an on-disk cache.
+
+All requests go through one asyncio event loop: a semaphore bounds how many
+are in flight, and finished HTTP/1.1 connections are kept alive and reused
+for the next request to the same host. Green Web Foundation lookups are sent
+in batches to the multi-domain endpoint (/v2/greencheckmulti), falling back
+to one /greencheck/<host> request per domain if a batch fails.
+
+evidence/hosting is the cache: <domain>_greencheck.json files (as written by
+audit.js) are reused while their checkedAt is younger than the TTL, and
+carbon.txt outcomes, including misses, are kept in hosting/carbon_txt.json
+next to the saved <domain>_carbon.txt files. Without an index, it starts from
+the <domain>_carbon.txt files already there (dated by their mtime).
+
+Only the standard library is used. --api and plain http:// site URLs make it
+easy to point the checker at a local stub server.
+
+Usage:
+    python hosting.py [--sites FILE] [--ttl-days 7] [--concurrency 32] [--api URL]
+"""
+import argparse
+import asyncio
+import json
+import ssl
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote, urljoin, urlsplit
+
+from common import domain_key, host_of, iso_now
+
+# Locate repo folders
+repo_root = Path(__file__).resolve().parents[2]
+hosting_dir = repo_root / "evidence" / "hosting"
+municipalities_path = repo_root / "scripts" / "municipalities.json"
+
+GREENCHECK_API = "https://api.thegreenwebfoundation.org"
+CACHE_TTL_DAYS = 7
+CONCURRENCY = 32
+BATCH_SIZE = 50
+TIMEOUT = 15
+RETRIES = 2
+MAX_REDIRECTS = 5
+MAX_IDLE_PER_HOST = 4
+CARBON_INDEX = "carbon_txt.json"
+CARBON_SUFFIX = "_carbon.txt"
+
+
+def _parse_iso(value):
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+async def _skipped():
+    return {}
+
+
+class HTTPError(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 client: idle connections are parked per (scheme, host, port)."""
+
+    def __init__(self, concurrency=CONCURRENCY, timeout=TIMEOUT):
+        self.limit = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+        self.idle = {}
+        self.opened = 0
+        self._ssl = None
+
+    async def _connect(self, key):
+        scheme, host, port = key
+        conns = self.idle.get(key)
+        while conns:
+            reader, writer = conns.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        if scheme == "https" and self._ssl is None:
+            self._ssl = ssl.create_default_context()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self._ssl if scheme == "https" else None), self.timeout)
+        self.opened += 1
+        return reader, writer, False
+
+    def _release(self, key, reader, writer, keep):
+        conns = self.idle.setdefault(key, [])
+        if keep and len(conns) < MAX_IDLE_PER_HOST:
+            conns.append((reader, writer))
+        else:
+            writer.close()
+
+    async def _exchange(self, reader, writer, host, target):
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: {host}\r\nUser-Agent: idg3000-hosting-check\r\n"
+                     "Accept: */*\r\nConnection: keep-alive\r\n\r\n".encode("ascii"))
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("connection closed before response")
+        version, status = status_line.split()[:2]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+            body = bytes(body)
+            keep = True
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+            keep = True
+        else:
+            body = await reader.read()
+            keep = False
+        keep = keep and version == b"HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        return int(status), headers, body, keep
+
+    async def get(self, url, retries=RETRIES):
+        """GET `url` following redirects; returns (status, body). Raises HTTPError after retries."""
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            for attempt in range(retries + 1):
+                reused = False
+                async with self.limit:
+                    try:
+                        reader, writer, reused = await self._connect(key)
+                        try:
+                            status, headers, body, keep = await asyncio.wait_for(
+                                self._exchange(reader, writer, parts.netloc, target), self.timeout)
+                        except BaseException:
+                            writer.close()
+                            raise
+                        self._release(key, reader, writer, keep)
+                        break
+                    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                        error = e
+                if attempt < retries:
+                    # a reused keep-alive connection may have been closed by the server; retry at once
+                    await asyncio.sleep(0 if reused else 0.5 * 2 ** attempt)
+            else:
+                raise HTTPError(f"{url}: {error}")
+            if status in (301, 302, 303, 307, 308) and "location" in headers:
+                url = urljoin(url, headers["location"])
+                continue
+            if status >= 500 and retries:
+                retries -= 1
+                continue
+            return status, body
+        raise HTTPError(f"{url}: too many redirects")
+
+    def close(self):
+        for conns in self.idle.values():
+            for _, writer in conns:
+                writer.close()
+        self.idle.clear()
+
+
+class HostingChecker:
+    """Greencheck and carbon.txt lookups for many sites, cached in `hosting_dir`."""
+
+    def __init__(self, hosting_dir=hosting_dir, api=GREENCHECK_API, ttl_days=CACHE_TTL_DAYS,
+                 concurrency=CONCURRENCY, timeout=TIMEOUT, retries=RETRIES, batch_size=BATCH_SIZE, log=print):
+        self.hosting_dir = Path(hosting_dir)
+        self.api = api.rstrip("/")
+        self.ttl = ttl_days * 86400
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.batch_size = batch_size
+        self.log = log
+        self.hosting_dir.mkdir(parents=True, exist_ok=True)
+
+    def _fresh(self, checked_at):
+        checked = _parse_iso(checked_at)
+        return checked is not None and time.time() - checked.timestamp() < self.ttl
+
+    def greencheck_file(self, url):
+        # named by host, as audit.js names it, so its cache files are reused ("/" of a path kept out)
+        return self.hosting_dir / f"{host_of(url).replace('/', '_')}_greencheck.json"
+
+    def cached_green(self, url, fresh_only=True):
+        """The cached greencheck result for `url` (by default only if it is younger than the TTL)."""
+        path = self.greencheck_file(url)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return data if not fresh_only or self._fresh(data.get("checkedAt")) else None
+
+    def _save_green(self, url, host, result):
+        with open(self.greencheck_file(url), "w", encoding="utf-8") as f:
+            json.dump({"url": url, "domain": host, "checkedAt": iso_now(), **result}, f, indent=2)
+
+    async def _green_one(self, pool, host):
+        status, body = await pool.get(f"{self.api}/greencheck/{quote(host, safe='')}", self.retries)
+        if status != 200:
+            raise HTTPError(f"greencheck {host}: HTTP {status}")
+        return json.loads(body)
+
+    async def _green_batch(self, pool, hosts):
+        """{host: result} for one batch; per-host requests if the multi endpoint fails."""
+        try:
+            status, body = await pool.get(
+                f"{self.api}/v2/greencheckmulti/{quote(json.dumps(hosts), safe='')}", self.retries)
+            if status != 200:
+                raise HTTPError(f"greencheckmulti: HTTP {status}")
+            found = json.loads(body)
+            if isinstance(found, dict) and all(h in found for h in hosts):
+                return {h: found[h] for h in hosts}
+            raise HTTPError("greencheckmulti: incomplete response")
+        except (HTTPError, ValueError) as e:
+            self.log(f"Batch greencheck failed ({e}); checking {len(hosts)} domains one by one")
+        results = await asyncio.gather(*(self._green_one(pool, h) for h in hosts), return_exceptions=True)
+        out = {}
+        for host, result in zip(hosts, results):
+            if isinstance(result, Exception):
+                self.log(f"Green Web check error for {host}: {result}")
+            else:
+                out[host] = result
+        return out
+
+    async def greencheck(self, pool, urls):
+        """{url: True/False/None}; fresh cache entries are not re-queried.
+
+        If a lookup fails, an expired cache entry is still better than nothing and is used.
+        """
+        green, todo = {}, {}
+        for url in urls:
+            cached = self.cached_green(url)
+            if cached is not None:
+                green[url] = bool(cached.get("green"))
+            else:
+                todo.setdefault(host_of(url), []).append(url)
+        hosts = list(todo)
+        batches = [hosts[i:i + self.batch_size] for i in range(0, len(hosts), self.batch_size)]
+        for found in await asyncio.gather(*(self._green_batch(pool, b) for b in batches)):
+            for host, result in found.items():
+                for url in todo[host]:
+                    self._save_green(url, host, result)
+                    green[url] = bool(result.get("green"))
+        for url in urls:
+            if url not in green:
+                stale = self.cached_green(url, fresh_only=False)
+                green[url] = bool(stale.get("green")) if stale is not None else None
+        return green
+
+    def _load_carbon_index(self):
+        try:
+            with open(self.hosting_dir / CARBON_INDEX, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self._seed_carbon_index()
+
+    def _seed_carbon_index(self):
+        """Index entries for the <domain>_carbon.txt files audit.js saved, checked when written."""
+        index = {}
+        for path in self.hosting_dir.glob(f"*{CARBON_SUFFIX}"):
+            checked = datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)
+            index[path.name[:-len(CARBON_SUFFIX)]] = {
+                "checkedAt": checked.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+                "found": True, "status": 200}
+        return index
+
+    async def _carbon_one(self, pool, url):
+        try:
+            status, body = await pool.get(f"{url.rstrip('/')}/carbon.txt", self.retries)
+        except HTTPError as e:
+            self.log(f"No carbon.txt for {url} ({e})")
+            return None
+        if status >= 500:
+            # a server error says nothing about the file; keep the cached outcome
+            self.log(f"No carbon.txt for {url} (HTTP {status})")
+            return None
+        found = status == 200
+        if found:
+            with open(self.hosting_dir / f"{domain_key(url)}{CARBON_SUFFIX}", "w", encoding="utf-8") as f:
+                f.write(body.decode("utf-8", errors="replace"))
+            self.log(f"carbon.txt found for {url}")
+        return {"checkedAt": iso_now(), "found": found, "status": status}
+
+    async def carbon_txt(self, pool, urls):
+        """{url: True/False/None}; the outcome of every lookup is cached, misses included."""
+        index = self._load_carbon_index()
+        todo = [u for u in urls if not self._fresh(index.get(domain_key(u), {}).get("checkedAt"))]
+        for url, entry in zip(todo, await asyncio.gather(*(self._carbon_one(pool, u) for u in todo))):
+            if entry is not None:
+                index[domain_key(url)] = entry
+        with open(self.hosting_dir / CARBON_INDEX, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        return {url: index[domain_key(url)]["found"] if domain_key(url) in index else None for url in urls}
+
+    async def check_async(self, urls, green=True, carbon=True):
+        pool = ConnectionPool(self.concurrency, self.timeout)
+        try:
+            greens, carbons = await asyncio.gather(self.greencheck(pool, urls) if green else _skipped(),
+                                                   self.carbon_txt(pool, urls) if carbon else _skipped())
+        finally:
+            pool.close()
+        self.connections = pool.opened
+        return {u: {"green": greens.get(u), "carbonTxt": carbons.get(u)} for u in urls}
+
+    def check(self, urls, green=True, carbon=True):
+        """{url: {"green": bool|None, "carbonTxt": bool|None}} for every url."""
+        return asyncio.run(self.check_async(list(urls), green, carbon))
+
+
+def check(urls, hosting_dir=hosting_dir, **kwargs):
+    return HostingChecker(hosting_dir, **kwargs).check(urls)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check green hosting and carbon.txt for every site")
+    parser.add_argument("--sites", type=Path, default=municipalities_path, help="JSON list of URLs")
+    parser.add_argument("--hosting-dir", type=Path, default=hosting_dir)
+    parser.add_argument("--api", default=GREENCHECK_API, help="Green Web Foundation API base URL")
+    parser.add_argument("--ttl-days", type=float, default=CACHE_TTL_DAYS, help="re-check cached results older than this")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds per request")
+    parser.add_argument("--retries", type=int, default=RETRIES)
+    parser.add_argument("--skip-carbon-txt", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.sites, encoding="utf-8") as f:
+        urls = json.load(f)
+    checker = HostingChecker(args.hosting_dir, api=args.api, ttl_days=args.ttl_days, concurrency=args.concurrency,
+                             timeout=args.timeout, retries=args.retries)
+    import telemetry
+
+    started = time.perf_counter()
+    # hosting/ sits in evidence/, so the manifest goes to evidence/telemetry
+    with telemetry.cli_stage("hosting", args.hosting_dir.parent) as s:
+        results = checker.check(urls, carbon=not args.skip_carbon_txt)
+        s.update(rows=len(urls), connections=checker.connections)
+    green = sum(1 for r in results.values() if r["green"])
+    carbon = sum(1 for r in results.values() if r["carbonTxt"])
+    print(f"Checked {len(urls)} sites in {time.perf_counter() - started:.1f}s over {checker.connections} "
+          f"connections: {green} green, {carbon} with carbon.txt")
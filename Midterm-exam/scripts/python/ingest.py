@@ -0,0 +1,408 @@
+"""Stream Lighthouse run JSONs into a columnar store under evidence/store.
+
+Each run file is walked event by event (ijson when installed, json as a
+fallback), so the audits tree and the base64 screenshots are never held as a
+dict. Four tables are written, one .npy file per column:
+
+- runs:     one row per run file (domain, run, fetchTime, performanceScore)
+- audits:   numericValue of every audit, a (runs x audits) float64 matrix
+- requests: one row per network-requests item, keyed by run_index
+- timings:  one row per Lighthouse timing.entries measure (name, startTime,
+            duration), keyed by run_index; phases.py reads them
+
+String columns are stored as int32 category codes plus a JSON list of
+categories, so every column can be opened with np.load(mmap_mode="r").
+
+store/sources.json records the size and mtime of every run file the store was
+built from, and the hash of this file. Readers call ensure_store(), which
+re-ingests when a run file was added, removed or rewritten since, so they
+never read the previous audit's data.
+
+Runs that `archive.py convert --remove` moved into evidence/archive are read
+from there (a plain run file of the same name takes precedence).
+
+Usage:
+    python ingest.py [--runs-dir DIR] [--out DIR] [--if-changed]
+"""
+import argparse
+import hashlib
+import json
+import re
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+import archive
+
+try:
+    import ijson
+except ImportError:  # plain json fallback, reads each file in one go
+    ijson = None
+
+# Locate evidence folder
+evidence_dir = Path(__file__).resolve().parents[2] / "evidence"
+runs_dir = evidence_dir / "lighthouse" / "runs"
+store_dir = evidence_dir / "store"
+
+# <domain>_run1.json (audit.js) and <domain>_run-1.json (older naming)
+RUN_FILE_RE = re.compile(r"^(?P<domain>.+)_run-?(?P<run>\d+)\.json$")
+
+REQUESTS_PREFIX = "audits.network-requests.details.items.item"
+TIMING_PREFIX = "timing.entries.item"
+TIMING_FIELDS = ("name", "startTime", "duration")
+SOURCES_NAME = "sources.json"
+
+# RuntimeError: an archived run that needs zstandard to read
+READ_ERRORS = (OSError, ValueError, RuntimeError) + ((ijson.JSONError,) if ijson else ())
+
+# Per-request columns: name -> kind ("cat", "i8", "f8", "bool")
+REQUEST_COLUMNS = {
+    "url": "cat",
+    "resourceType": "cat",
+    "mimeType": "cat",
+    "protocol": "cat",
+    "entity": "cat",
+    "priority": "cat",
+    "statusCode": "i8",
+    "transferSize": "i8",
+    "resourceSize": "i8",
+    "rendererStartTime": "f8",
+    "networkRequestTime": "f8",
+    "networkEndTime": "f8",
+    "finished": "bool",
+}
+
+
+class _Column:
+    """Append-only column buffer that keeps numbers in a typed array."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        if kind == "cat":
+            self.codes = array("i")
+            self.categories = {}
+        elif kind == "i8":
+            self.values = array("q")
+        elif kind == "bool":
+            self.values = array("b")
+        else:
+            self.values = array("d")
+
+    def append(self, value):
+        if self.kind == "cat":
+            key = "" if value is None else str(value)
+            code = self.categories.get(key)
+            if code is None:
+                code = self.categories[key] = len(self.categories)
+            self.codes.append(code)
+        elif self.kind == "i8":
+            self.values.append(int(value) if isinstance(value, (int, float)) else 0)
+        elif self.kind == "bool":
+            self.values.append(1 if value else 0)
+        else:
+            self.values.append(float(value) if isinstance(value, (int, float)) else np.nan)
+
+    def to_numpy(self):
+        if self.kind == "cat":
+            return np.array(self.codes, dtype=np.int32)
+        if self.kind == "bool":
+            return np.array(self.values, dtype=np.int8).astype(bool)
+        return np.array(self.values, dtype=np.int64 if self.kind == "i8" else np.float64)
+
+
+def _lhr_events(lhr):
+    # iter_run_events() for a report that is already a dict
+    for key in ("requestedUrl", "finalUrl", "fetchTime"):
+        yield "meta", key, lhr.get(key)
+    yield "meta", "performanceScore", (lhr.get("categories") or {}).get("performance", {}).get("score")
+    for audit_id, audit in (lhr.get("audits") or {}).items():
+        if isinstance(audit.get("numericValue"), (int, float)):
+            yield "audit", audit_id, audit["numericValue"]
+    for entity in lhr.get("entities") or []:
+        if entity.get("isFirstParty"):
+            yield "meta", "firstPartyEntity", entity.get("name")
+    items = (((lhr.get("audits") or {}).get("network-requests") or {}).get("details") or {}).get("items")
+    for item in items or []:
+        yield "request", item
+    for entry in (lhr.get("timing") or {}).get("entries") or []:
+        yield ("timing", *(entry.get(k) for k in TIMING_FIELDS))
+
+
+def iter_run_events(path):
+    """Yield ("meta", key, value), ("audit", id, value), ("request", item) and ("timing", name, start, duration)."""
+    if archive.is_archived(path):
+        yield from _lhr_events(archive.read_report(path))
+        return
+    with open(path, "rb") as f:
+        if ijson is None:
+            yield from _lhr_events(json.load(f))
+            return
+
+        builder = None
+        in_first_party = False
+        entity_name = None
+        timing = None
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if builder is not None:
+                if prefix == REQUESTS_PREFIX and event == "end_map":
+                    builder.event(event, value)
+                    yield "request", builder.value
+                    builder = None
+                else:
+                    builder.event(event, value)
+                continue
+            if prefix == REQUESTS_PREFIX and event == "start_map":
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+            elif prefix.startswith(TIMING_PREFIX):
+                if prefix == TIMING_PREFIX and event == "start_map":
+                    timing = {}
+                elif prefix == TIMING_PREFIX and event == "end_map":
+                    yield ("timing", *(timing.get(k) for k in TIMING_FIELDS))
+                elif timing is not None and prefix[len(TIMING_PREFIX) + 1:] in TIMING_FIELDS:
+                    timing[prefix[len(TIMING_PREFIX) + 1:]] = value
+            elif prefix.startswith("audits.") and prefix.endswith(".numericValue") and event == "number":
+                yield "audit", prefix[len("audits."):-len(".numericValue")], value
+            elif prefix in ("requestedUrl", "finalUrl", "fetchTime") and event == "string":
+                yield "meta", prefix, value
+            elif prefix == "categories.performance.score" and event in ("number", "null"):
+                yield "meta", "performanceScore", value
+            elif prefix == "entities.item" and event == "start_map":
+                in_first_party, entity_name = False, None
+            elif prefix == "entities.item.name":
+                entity_name = value
+            elif prefix == "entities.item.isFirstParty" and value:
+                in_first_party = True
+            elif prefix == "entities.item" and event == "end_map" and in_first_party:
+                yield "meta", "firstPartyEntity", entity_name
+
+
+def find_run_files(directory=runs_dir, archive_root=None):
+    """Return (domain, run, path) for every run JSON, sorted by domain and run.
+
+    Runs archived under `archive_root` (default: evidence/archive next to
+    lighthouse/runs) are included when no plain file of that name is left.
+    """
+    directory = Path(directory)
+    paths = {p.name: p for p in directory.glob("*.json")}
+    archive_root = Path(archive_root) if archive_root else directory.parent.parent / "archive"
+    if archive_root.is_dir():
+        for name, p in archive.Archive(archive_root).report_files().items():
+            paths.setdefault(f"{name}.json", p)
+    found = []
+    for name, p in paths.items():
+        m = RUN_FILE_RE.match(name)
+        if m:
+            found.append((m.group("domain"), int(m.group("run")), p))
+    return sorted(found, key=lambda t: (t[0], t[1]))
+
+
+def _write_table(directory, columns):
+    directory.mkdir(parents=True, exist_ok=True)
+    schema = {}
+    for name, col in columns.items():
+        np.save(directory / f"{name}.npy", col.to_numpy())
+        schema[name] = col.kind
+        if col.kind == "cat":
+            cats = sorted(col.categories, key=col.categories.get)
+            with open(directory / f"{name}.categories.json", "w", encoding="utf-8") as f:
+                json.dump(cats, f, ensure_ascii=False)
+    with open(directory / "schema.json", "w", encoding="utf-8") as f:
+        json.dump(schema, f, indent=2)
+
+
+def sources(directory=runs_dir):
+    """What a store built from `directory` now would record: run file stats and the ingest code hash."""
+    files = {}
+    for _, _, p in find_run_files(directory):
+        st = p.stat()
+        files[p.name] = [st.st_size, st.st_mtime_ns]
+    return {"code": hashlib.sha256(Path(__file__).read_bytes()).hexdigest(), "files": files}
+
+
+def is_current(directory=runs_dir, out_dir=store_dir):
+    """True if the store at `out_dir` was built from the run files now in `directory`."""
+    path = Path(out_dir) / SOURCES_NAME
+    if not path.exists():
+        return False
+    with open(path, encoding="utf-8") as f:
+        return json.load(f) == sources(directory)
+
+
+def ensure_store(directory=runs_dir, out_dir=store_dir, log=print):
+    """Re-ingest `directory` if the store is missing or older than the run files; True if it did."""
+    if is_current(directory, out_dir):
+        return False
+    counts = ingest(directory, out_dir, log)
+    log(f"Ingested {counts['runs']} runs into {out_dir}")
+    return True
+
+
+def _read_run(path):
+    """(meta, first-party entity names, {audit id: value}, requests, timings) of one run file."""
+    meta, first_party, audits, requests, timings = {}, set(), {}, [], []
+    for event in iter_run_events(path):
+        if event[0] == "meta":
+            if event[1] == "firstPartyEntity":
+                first_party.add(event[2])
+            else:
+                meta[event[1]] = event[2]
+        elif event[0] == "audit":
+            audits[event[1]] = event[2]
+        elif event[0] == "timing":
+            timings.append(event[1:])
+        else:
+            requests.append(event[1])
+    return meta, first_party, audits, requests, timings
+
+
+def ingest(directory=runs_dir, out_dir=store_dir, log=print):
+    """Stream every run file in `directory` into the columnar store at `out_dir`.
+
+    A run file that cannot be parsed is left out with a warning; the rows of
+    one run are only added once its whole file has been read.
+    """
+    out_dir = Path(out_dir)
+    run_files = find_run_files(directory)
+    found = sources(directory)
+    # an interrupted ingest must not leave a store that claims to be current
+    (out_dir / SOURCES_NAME).unlink(missing_ok=True)
+
+    runs = {
+        "domain": _Column("cat"),
+        "run": _Column("i8"),
+        "requestedUrl": _Column("cat"),
+        "finalUrl": _Column("cat"),
+        "fetchTime": _Column("cat"),
+        "performanceScore": _Column("f8"),
+        "requests": _Column("i8"),
+        "file": _Column("cat"),
+    }
+    requests = {"run_index": _Column("i8"), "isFirstParty": _Column("bool")}
+    requests.update({name: _Column(kind) for name, kind in REQUEST_COLUMNS.items()})
+    timings = {"run_index": _Column("i8"), "name": _Column("cat"), "startTime": _Column("f8"),
+               "duration": _Column("f8")}
+    audit_ids = {}
+    audit_rows = []
+
+    skipped = []
+    for domain, run, path in run_files:
+        try:
+            meta, first_party, audits, pending, run_timings = _read_run(path)
+        except READ_ERRORS as e:
+            # yajl errors quote the offending text on the following lines
+            skipped.append(path.name)
+            log(f"Skipped {path.name}: {(str(e).splitlines() or [type(e).__name__])[0]}")
+            continue
+        run_index = len(audit_rows)
+        audit_row = {audit_ids.setdefault(a, len(audit_ids)): v for a, v in audits.items()}
+        for entry in run_timings:
+            timings["run_index"].append(run_index)
+            for name, value in zip(TIMING_FIELDS, entry):
+                timings[name].append(value)
+
+        # entities come after audits in the file, so party flags are set here
+        for item in pending:
+            requests["run_index"].append(run_index)
+            requests["isFirstParty"].append(item.get("entity") in first_party)
+            for name in REQUEST_COLUMNS:
+                requests[name].append(item.get(name))
+
+        runs["domain"].append(domain)
+        runs["run"].append(run)
+        runs["requestedUrl"].append(meta.get("requestedUrl"))
+        runs["finalUrl"].append(meta.get("finalUrl"))
+        runs["fetchTime"].append(meta.get("fetchTime"))
+        runs["performanceScore"].append(meta.get("performanceScore"))
+        runs["requests"].append(len(pending))
+        runs["file"].append(path.stem if archive.is_archived(path) else path.name)
+        audit_rows.append(audit_row)
+
+    _write_table(out_dir / "runs", runs)
+    _write_table(out_dir / "requests", requests)
+    _write_table(out_dir / "timings", timings)
+
+    audits_dir = out_dir / "audits"
+    audits_dir.mkdir(parents=True, exist_ok=True)
+    matrix = np.full((len(audit_rows), len(audit_ids)), np.nan)
+    for i, row in enumerate(audit_rows):
+        if row:
+            matrix[i, list(row)] = list(row.values())
+    np.save(audits_dir / "values.npy", matrix)
+    with open(audits_dir / "ids.json", "w", encoding="utf-8") as f:
+        json.dump(sorted(audit_ids, key=audit_ids.get), f)
+    with open(out_dir / SOURCES_NAME, "w", encoding="utf-8") as f:
+        json.dump(found, f, indent=2)
+
+    return {"runs": len(audit_rows), "requests": len(requests["run_index"].values), "audits": len(audit_ids),
+            "timings": len(timings["run_index"].values), "skipped": skipped}
+
+
+def load_table(name, directory=store_dir, mmap=True):
+    """Return a table from the store as a dict of (memory-mapped) arrays.
+
+    Categorical columns come back as (codes, categories) tuples.
+    """
+    table_dir = Path(directory) / name
+    with open(table_dir / "schema.json", encoding="utf-8") as f:
+        schema = json.load(f)
+    mode = "r" if mmap else None
+    out = {}
+    for col, kind in schema.items():
+        values = np.load(table_dir / f"{col}.npy", mmap_mode=mode)
+        if kind == "cat":
+            with open(table_dir / f"{col}.categories.json", encoding="utf-8") as f:
+                values = (values, json.load(f))
+        out[col] = values
+    return out
+
+
+def table_rows(name, directory=store_dir):
+    """Number of rows in a store table, read from the header of its first column."""
+    with open(Path(directory) / name / "schema.json", encoding="utf-8") as f:
+        first = next(iter(json.load(f)))
+    return len(np.load(Path(directory) / name / f"{first}.npy", mmap_mode="r"))
+
+
+def load_frame(name, directory=store_dir):
+    """Return a table from the store as a pandas DataFrame with categorical columns."""
+    import pandas as pd
+
+    cols = {}
+    for col, values in load_table(name, directory).items():
+        if isinstance(values, tuple):
+            codes, cats = values
+            cols[col] = pd.Categorical.from_codes(np.asarray(codes), categories=cats)
+        else:
+            cols[col] = np.asarray(values)
+    return pd.DataFrame(cols)
+
+
+def load_audits(directory=store_dir, mmap=True):
+    """Return (ids, values) where values[i, j] is audit ids[j] for run row i."""
+    audits_dir = Path(directory) / "audits"
+    with open(audits_dir / "ids.json", encoding="utf-8") as f:
+        ids = json.load(f)
+    return ids, np.load(audits_dir / "values.npy", mmap_mode="r" if mmap else None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest Lighthouse run JSONs into a columnar store")
+    parser.add_argument("--runs-dir", type=Path, default=runs_dir)
+    parser.add_argument("--out", type=Path, default=store_dir)
+    parser.add_argument("--if-changed", action="store_true", help="only if the run files changed since")
+    args = parser.parse_args()
+
+    if args.if_changed and is_current(args.runs_dir, args.out):
+        print(f"{args.out} is up to date")
+        raise SystemExit(0)
+    import telemetry
+
+    # the store sits in evidence/, so the manifest goes to evidence/telemetry
+    with telemetry.cli_stage("ingest", args.out.parent) as s:
+        counts = ingest(args.runs_dir, args.out)
+        s.update(rows=counts["runs"], requests=counts["requests"], skipped=len(counts["skipped"]))
+    print(f"Ingested {counts['runs']} runs, {counts['requests']} requests, {counts['audits']} audits, "
+          f"{counts['timings']} timing entries")
+    print(f"Saved: {args.out}")
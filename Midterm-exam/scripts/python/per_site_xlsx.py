@@ -0,0 +1,267 @@
+"""Per-site workbooks (evidence/spreadsheets/per_site/<domain>.xlsx) from the run JSONs.
+
+Python port of scripts/node/per-site-xlsx.js with the same four sheets:
+runs, per_resource_all_runs, summary_by_type and co2. Workbooks are written
+with openpyxl in write-only mode: run files are streamed with
+ingest.iter_run_events() and a run's network requests are appended to
+per_resource_all_runs once its file has been read (CO₂ is computed per chunk
+of rows), so memory holds one run's requests, not the whole request table.
+As in node, runs are numbered by position (iteration 1, 2, ... over the
+readable run files) and an unreadable run file is skipped with a warning.
+
+Sites are built in parallel worker processes. per_site/manifest.json keeps
+the hash of each site's run files and of the code; a site whose inputs are
+unchanged and whose workbook exists is skipped.
+
+Usage:
+    python per_site_xlsx.py [--workers N] [--force] [filter ...]
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from pathlib import Path
+
+import numpy as np
+
+import co2
+import ingest
+
+# Locate evidence folder
+evidence_dir = ingest.evidence_dir
+
+MANIFEST_NAME = "manifest.json"
+CODE_FILES = ("per_site_xlsx.py", "ingest.py", "co2.py")
+scripts_dir = Path(__file__).resolve().parent
+
+METRICS = [
+    ("largest-contentful-paint", "LCP"),
+    ("first-contentful-paint", "FCP"),
+    ("server-response-time", "TTFB"),
+    ("interactive", "TTI"),
+    ("total-blocking-time", "TBT"),
+    ("cumulative-layout-shift", "CLS"),
+    ("speed-index", "SpeedIndex"),
+]
+AUDIT_NAMES = dict(METRICS)
+RUN_COLUMNS = ["iteration", *AUDIT_NAMES.values(), "PerformanceScore_0_100", "TotalBytes_B", "Requests"]
+RESOURCE_COLUMNS = ["iteration", "url", "resourceType", "mimeType", "transferBytes", "resourceBytes",
+                    "CO2_g_transfer_1byte", "CO2_g_transfer_swd"]
+TYPE_COLUMNS = ["type", "requests", "transferBytes", "resourceBytes"]
+CO2_COLUMNS = ["iteration", "TotalBytes_B", "CO2_g_1byte", "CO2_g_swd"]
+SHEETS = ("runs", "per_resource_all_runs", "summary_by_type", "co2")
+
+# Requests are scored and appended in chunks of this many rows
+CHUNK_ROWS = 2000
+
+READ_ERRORS = ingest.READ_ERRORS
+
+
+def _median(values):
+    values = [v for v in values if isinstance(v, (int, float)) and not np.isnan(v)]
+    return float(np.median(values)) if values else None
+
+
+def _append_requests(ws, iteration, items, by_type):
+    """Append one chunk of request rows; returns the chunk's transfer bytes."""
+    transfer = [it.get("transferSize") or 0 for it in items]
+    onebyte = co2.onebyte_per_byte(transfer).tolist()
+    swd = co2.swd_per_byte(transfer).tolist()
+    for it, t, g1, g2 in zip(items, transfer, onebyte, swd):
+        rtype = it.get("resourceType") or "other"
+        resource = it.get("resourceSize") or None
+        ws.append([iteration, it.get("url"), rtype, it.get("mimeType") or "", t, resource, g1, g2])
+        totals = by_type.setdefault(rtype, [0, 0, 0])
+        totals[0] += 1
+        totals[1] += t
+        totals[2] += resource or 0
+    return sum(transfer)
+
+
+def _read_run(path):
+    """Read one run file; returns its runs-sheet row (without iteration and bytes) and its requests."""
+    row = {name: None for name in AUDIT_NAMES.values()}
+    row.update(PerformanceScore_0_100=None, TotalBytes_B=0, Requests=0)
+    items = []
+    for event in ingest.iter_run_events(path):
+        if event[0] == "request":
+            items.append(event[1])
+        elif event[0] == "audit" and event[1] in AUDIT_NAMES:
+            row[AUDIT_NAMES[event[1]]] = event[2]
+        elif event[0] == "meta" and event[1] == "performanceScore" and isinstance(event[2], (int, float)):
+            row["PerformanceScore_0_100"] = round(event[2] * 100)
+    return row, items
+
+
+def build_workbook(domain, runs, out_dir):
+    """Write <out_dir>/<domain>.xlsx from [(run, path)].
+
+    Returns (domain, path or None, error, skipped run file messages).
+    """
+    from openpyxl import Workbook
+
+    out = Path(out_dir) / f"{domain}.xlsx"
+    wb = Workbook(write_only=True)
+    ws_runs, ws_requests, ws_types, ws_co2 = (wb.create_sheet(name) for name in SHEETS)
+    by_type = {}
+    rows = []
+    skipped = []
+    for _, path in runs:
+        try:
+            # read the whole file first, so a broken run leaves no rows behind in the sheet
+            row, items = _read_run(path)
+        except READ_ERRORS as e:
+            # yajl errors quote the offending text on the following lines
+            skipped.append(f"{Path(path).name}: {(str(e).splitlines() or [type(e).__name__])[0]}")
+            continue
+        if not rows:
+            # the first append opens the sheet's temp file; a site without readable runs never does
+            ws_requests.append(RESOURCE_COLUMNS)
+        row["iteration"] = len(rows) + 1
+        for i in range(0, len(items), CHUNK_ROWS):
+            row["TotalBytes_B"] += _append_requests(ws_requests, row["iteration"], items[i:i + CHUNK_ROWS], by_type)
+        row["Requests"] = len(items)
+        rows.append(row)
+    if not rows:
+        return domain, None, "no readable runs", skipped
+
+    medians = {c: _median([r[c] for r in rows]) for c in RUN_COLUMNS[1:]}
+    ws_runs.append(RUN_COLUMNS)
+    for r in [*rows, {**medians, "iteration": "median"}]:
+        ws_runs.append([r[c] for c in RUN_COLUMNS])
+
+    ws_types.append(TYPE_COLUMNS)
+    for rtype, (count, transfer, resource) in by_type.items():
+        ws_types.append([rtype, count, transfer, resource])
+
+    ws_co2.append(CO2_COLUMNS)
+    for r in [*rows, {**medians, "iteration": "median"}]:
+        total = r["TotalBytes_B"] or 0
+        ws_co2.append([r["iteration"], r["TotalBytes_B"], co2.onebyte_per_byte(total), co2.swd_per_byte(total)])
+
+    # write next to the target and rename, so an interrupted save never leaves a truncated workbook
+    tmp = out.with_name(out.name + ".tmp")
+    wb.save(tmp)
+    os.replace(tmp, out)
+    return domain, out, None, skipped
+
+
+def _build_job(job):
+    return build_workbook(*job)
+
+
+def _file_sha(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_entry(path, cached):
+    """{"size", "mtime_ns", "sha"}; the hash is reused while size and mtime are unchanged."""
+    st = path.stat()
+    if cached and cached.get("size") == st.st_size and cached.get("mtime_ns") == st.st_mtime_ns:
+        return cached
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha": _file_sha(path)}
+
+
+def code_sha():
+    return hashlib.sha256(b"".join((scripts_dir / f).read_bytes() for f in CODE_FILES)).hexdigest()
+
+
+def load_manifest(out_dir):
+    path = Path(out_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, out_dir):
+    path = Path(out_dir) / MANIFEST_NAME
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return path
+
+
+def sites(runs_dir):
+    """{domain: [(run, path)]} from the run files in `runs_dir`."""
+    return {d: [(run, path) for _, run, path in group]
+            for d, group in groupby(ingest.find_run_files(runs_dir), key=lambda t: t[0])}
+
+
+def build(evidence_dir=evidence_dir, filters=None, workers=None, force=False, log=print):
+    """Rebuild the stale per-site workbooks; returns {"written": [...], "skipped": n, "failed": {...}}."""
+    evidence_dir = Path(evidence_dir)
+    out_dir = evidence_dir / "spreadsheets" / "per_site"
+    out_dir.mkdir(parents=True, exist_ok=True)
+    found = sites(evidence_dir / "lighthouse" / "runs")
+    if filters:
+        found = {d: r for d, r in found.items() if any(f in d for f in filters)}
+
+    manifest = load_manifest(out_dir)
+    code = code_sha()
+    if manifest.get("code") != code:
+        manifest = {"code": code, "sites": {}}
+    known = manifest.setdefault("sites", {})
+
+    jobs, entries = [], {}
+    for domain, runs in found.items():
+        cached = known.get(domain, {}).get("files", {})
+        files = {p.name: _file_entry(p, cached.get(p.name)) for _, p in runs}
+        entries[domain] = files
+        if force or known.get(domain, {}).get("files") != files or not (out_dir / f"{domain}.xlsx").exists():
+            jobs.append((domain, runs, out_dir))
+
+    result = {"written": [], "skipped": len(found) - len(jobs), "failed": {}}
+
+    def record(domain, out, error, skipped):
+        for message in skipped:
+            log(f"Skipped run ({message}): {domain}")
+        if out is None:
+            known.pop(domain, None)
+            result["failed"][domain] = error
+            log(f"Skipped ({error}): {domain}")
+        else:
+            known[domain] = {"files": entries[domain]}
+            result["written"].append(out)
+
+    if workers is None:
+        workers = min(len(jobs), os.cpu_count() or 1)
+    try:
+        if workers <= 1 or len(jobs) <= 1:
+            for job in jobs:
+                record(*_build_job(job))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for done in pool.map(_build_job, jobs, chunksize=max(1, len(jobs) // (workers * 8))):
+                    record(*done)
+    finally:
+        # finished sites are kept even if the build is interrupted
+        save_manifest(manifest, out_dir)
+    return result
+
+
+def main(df=None, evidence_dir=evidence_dir, filters=None, workers=None, force=False):
+    """`df` is accepted so report.py/build.py can call every step the same way; it is not used."""
+    result = build(evidence_dir, filters, workers, force)
+    print(f"Per-site XLSX: wrote {len(result['written'])}, unchanged {result['skipped']}, "
+          f"failed {len(result['failed'])}")
+    return [Path(evidence_dir) / "spreadsheets" / "per_site" / MANIFEST_NAME]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write one workbook per site from the Lighthouse run files")
+    parser.add_argument("filters", nargs="*", help="only sites whose domain contains one of these")
+    parser.add_argument("--evidence", type=Path, default=evidence_dir)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="rebuild unchanged workbooks too")
+    args = parser.parse_args()
+    import telemetry
+
+    with telemetry.cli_stage("per_site_xlsx", args.evidence) as s:
+        main(evidence_dir=args.evidence, filters=args.filters or None, workers=args.workers, force=args.force)
+        s["rows"] = len(ingest.find_run_files(args.evidence / "lighthouse" / "runs"))
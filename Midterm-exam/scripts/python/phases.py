@@ -0,0 +1,164 @@
+"""Where Lighthouse spends its time, from the timing.entries of every run.
+
+Works on the timings table written by ingest.py (evidence/store). Each run
+has four top-level phases:
+
+- config:   lh:config, resolving the Lighthouse config
+- gather:   lh:runner:gather, loading the page (lh:driver:navigate) and
+            collecting artifacts (lh:gather:getArtifact:*)
+- audit:    lh:runner:audit, running every lh:audit:* and the lh:computed:*
+            artifacts they share
+- generate: lh:runner:generate, building the report
+
+Every other entry is attributed to the phase whose time window contains its
+start time, with vectorised comparisons per phase rather than a loop over
+entries. Entries nest (an audit's computed artifacts sit inside the audit),
+so shares within a phase do not add up to 100%.
+
+Outputs:
+    evidence/lighthouse_phases.csv            per site: median ms per phase across runs
+    evidence/lighthouse_phase_breakdown.csv   per entry: runs, median/mean/p95/total ms, share of its phase
+
+Usage:
+    python phases.py [--store DIR] [--evidence DIR]
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import ingest
+
+# Locate evidence folder
+evidence_dir = dataset.evidence_dir
+
+PHASES = {
+    "config": "lh:config",
+    "gather": "lh:runner:gather",
+    "audit": "lh:runner:audit",
+    "generate": "lh:runner:generate",
+}
+NAVIGATE = "lh:driver:navigate"
+
+
+def per_run(timings, n_runs):
+    """(start, duration) arrays of shape (runs, phases) and the navigate time per run."""
+    codes, names = timings["name"]
+    codes = np.asarray(codes)
+    run_index = np.asarray(timings["run_index"])
+    start_time = np.asarray(timings["startTime"])
+    duration = np.asarray(timings["duration"])
+    start = np.full((n_runs, len(PHASES)), np.nan)
+    length = np.full((n_runs, len(PHASES)), np.nan)
+    for j, name in enumerate(PHASES.values()):
+        if name in names:
+            rows = codes == names.index(name)
+            start[run_index[rows], j] = start_time[rows]
+            length[run_index[rows], j] = duration[rows]
+    navigate = np.zeros(n_runs)
+    if NAVIGATE in names:
+        rows = codes == names.index(NAVIGATE)
+        navigate = np.bincount(run_index[rows], weights=duration[rows], minlength=n_runs)
+    return start, length, navigate
+
+
+def phase_of(timings, start, length):
+    """Phase label of every timing entry; top-level entries are "runner", strays "other"."""
+    codes, names = timings["name"]
+    codes = np.asarray(codes)
+    run_index = np.asarray(timings["run_index"])
+    t = np.asarray(timings["startTime"])
+    labels = np.array([*PHASES, "runner", "other"], dtype=object)
+    out = np.full(len(codes), len(PHASES) + 1)
+    for j in range(len(PHASES)):
+        lo, span = start[run_index, j], length[run_index, j]
+        out[(t >= lo) & (t <= lo + span)] = j
+    top = np.array([n in PHASES.values() for n in names], dtype=bool)
+    out[top[codes]] = len(PHASES)
+    return labels[out]
+
+
+def by_site(store_dir=ingest.store_dir):
+    """Per-run phase durations and their per-site medians."""
+    runs = ingest.load_table("runs", store_dir)
+    timings = ingest.load_table("timings", store_dir)
+    domain_codes, domains = runs["domain"]
+    n_runs = len(domain_codes)
+    _, length, navigate = per_run(timings, n_runs)
+
+    frame = pd.DataFrame(length, columns=[f"{p}_ms" for p in PHASES])
+    frame["navigate_ms"] = navigate
+    frame["total_ms"] = np.nansum(length, axis=1)
+    site = frame.groupby(np.asarray(domain_codes)).median()
+    site.insert(0, "runs", np.bincount(np.asarray(domain_codes), minlength=len(domains))[site.index])
+    site.insert(0, "domain", np.asarray(domains, dtype=object)[site.index])
+    return site.reset_index(drop=True)
+
+
+def breakdown(store_dir=ingest.store_dir):
+    """Statistics per (phase, entry name) over the runs the entry occurs in."""
+    runs = ingest.load_table("runs", store_dir)
+    timings = ingest.load_table("timings", store_dir)
+    n_runs = len(runs["domain"][0])
+    start, length, _ = per_run(timings, n_runs)
+    codes, names = timings["name"]
+
+    entries = pd.DataFrame({
+        "phase": phase_of(timings, start, length),
+        "name": np.asarray(names, dtype=object)[np.asarray(codes)],
+        "run_index": np.asarray(timings["run_index"]),
+        "duration": np.asarray(timings["duration"]),
+    })
+    # an entry can occur several times in a run (two navigations); sum those first
+    per_run_ms = entries.groupby(["phase", "name", "run_index"], sort=False)["duration"].sum()
+    g = per_run_ms.groupby(level=["phase", "name"])
+    agg = pd.DataFrame({
+        "runs": g.size(),
+        "median_ms": g.median(),
+        "mean_ms": g.mean(),
+        "p95_ms": g.quantile(0.95),
+        "total_ms": g.sum(),
+    }).reset_index()
+    phase_total = pd.Series(np.nansum(length, axis=0), index=list(PHASES))
+    agg["share_pct"] = agg["total_ms"] / agg["phase"].map(phase_total).replace(0, np.nan) * 100
+    return agg.sort_values(["phase", "total_ms"], ascending=[True, False]).reset_index(drop=True)
+
+
+def write_outputs(site, agg, evidence_dir=evidence_dir):
+    evidence_dir = Path(evidence_dir)
+    site_csv = evidence_dir / "lighthouse_phases.csv"
+    agg_csv = evidence_dir / "lighthouse_phase_breakdown.csv"
+    site.round(1).to_csv(site_csv, index=False)
+    agg.round({"median_ms": 2, "mean_ms": 2, "p95_ms": 2, "total_ms": 1, "share_pct": 2}).to_csv(agg_csv, index=False)
+    return [site_csv, agg_csv]
+
+
+def main(df=None, evidence_dir=evidence_dir, store_dir=None):
+    """Build the phase tables; re-ingests the run files first if the store is missing or stale.
+
+    `df` is accepted so report.py/build.py can call every step the same way; it is not used.
+    """
+    evidence_dir = Path(evidence_dir)
+    store_dir = Path(store_dir) if store_dir else evidence_dir / "store"
+    ingest.ensure_store(evidence_dir / "lighthouse" / "runs", store_dir)
+
+    site = by_site(store_dir)
+    if site.empty:
+        print("No Lighthouse runs in", store_dir)
+        return []
+    outputs = write_outputs(site, breakdown(store_dir), evidence_dir)
+    for p in outputs:
+        print(f"Saved: {p}")
+    med = site[[f"{p}_ms" for p in PHASES]].median()
+    print("Median per run: " + ", ".join(f"{p} {med[f'{p}_ms']:.0f} ms" for p in PHASES))
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Break down Lighthouse run time by gather/audit phase")
+    parser.add_argument("--evidence", type=Path, default=evidence_dir)
+    parser.add_argument("--store", type=Path, default=None, help="columnar store (default: <evidence>/store)")
+    args = parser.parse_args()
+    main(evidence_dir=args.evidence, store_dir=args.store)
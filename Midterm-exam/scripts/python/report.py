@@ -0,0 +1,57 @@
+"""Build every report output in one process from one loaded dataset.
+
+summary.csv is parsed once by dataset.load() and the same frame is handed
+to each step. Steps import their heavy libraries (matplotlib,
+openpyxl) only when they run, so `report.py aggregate` never loads them.
+Outputs go through build.py, so only outputs whose inputs changed are
+regenerated.
+
+Usage:
+    python report.py                       # aggregate, charts, visualize, spreadsheets, requests, phases
+    python report.py aggregate spreadsheets
+    python report.py --dry-run | --force
+"""
+import argparse
+import time
+from pathlib import Path
+
+import build
+import dataset
+
+# step name -> module with main(df, evidence_dir); build.py splits them into targets
+STEPS = {
+    "aggregate": "aggregate",
+    "charts": "charts",
+    "visualize": "visualize",
+    "spreadsheets": "spreadsheet_maker",
+    "requests": "request_analytics",
+    "phases": "phases",
+}
+
+
+def run(steps=tuple(STEPS), evidence_dir=dataset.evidence_dir, df=None, force=False, dry_run=False):
+    """Rebuild the stale outputs of the named steps on one shared frame; returns seconds per phase."""
+    timings = {}
+    started = time.perf_counter()
+    if df is None:
+        df = dataset.load(evidence_dir=evidence_dir)
+    timings["load"] = time.perf_counter() - started
+    t = time.perf_counter()
+    build.build(df, Path(evidence_dir), steps=list(steps), force=force, dry_run=dry_run)
+    timings["build"] = time.perf_counter() - t
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate aggregated tables, charts and spreadsheets")
+    parser.add_argument("steps", nargs="*", help=f"any of: {', '.join(STEPS)} (default: all)")
+    parser.add_argument("--evidence", type=Path, default=dataset.evidence_dir)
+    parser.add_argument("--force", action="store_true", help="rebuild every output")
+    parser.add_argument("--dry-run", action="store_true", help="list what would be rebuilt")
+    args = parser.parse_args()
+    unknown = [s for s in args.steps if s not in STEPS]
+    if unknown:
+        parser.error(f"unknown step(s): {', '.join(unknown)}")
+
+    timings = run(args.steps or list(STEPS), args.evidence, force=args.force, dry_run=args.dry_run)
+    print("Report timings: " + ", ".join(f"{k} {v:.2f}s" for k, v in timings.items()))
@@ -0,0 +1,202 @@
+"""Per-request byte breakdowns for every run of every site.
+
+Works on the requests table written by ingest.py (evidence/store). Bytes are
+summed per run with np.bincount over the category codes, so there is no
+Python loop over requests; per-site values are medians across runs, taken
+with one pandas groupby. Breakdowns:
+
+- resourceType: Document, Script, Image, Stylesheet, Font, ...
+- party:        first-party vs third-party entity (Lighthouse `entities`)
+- protocol:     h2, h3, http/1.1 and other (data:, blob:, unknown)
+
+Each row carries request count, transfer and resource bytes and the
+compression ratio transferBytes / resourceBytes.
+
+Outputs:
+    evidence/requests_by_site.csv      domain x dimension x category medians
+    evidence/requests_aggregated.csv   the same summed / summarised across sites
+    evidence/charts/requests_*.png
+
+Usage:
+    python request_analytics.py [--store DIR] [--evidence DIR]
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import dataset
+import ingest
+
+# Locate evidence folder
+evidence_dir = dataset.evidence_dir
+
+DIMENSIONS = ("resourceType", "party", "protocol")
+PROTOCOLS = ("h2", "h3", "http/1.1")
+
+
+def _protocol_name(p):
+    return p if p in PROTOCOLS else "other"
+
+
+def _dimension_codes(requests, dimension):
+    """Return (codes, labels) for one dimension; mapping is done on categories, not requests."""
+    if dimension == "total":
+        return np.zeros(len(requests["run_index"]), dtype=np.int64), ["all"]
+    if dimension == "party":
+        return np.where(np.asarray(requests["isFirstParty"]), 0, 1), ["first-party", "third-party"]
+    codes, cats = requests[dimension]
+    if dimension == "protocol":
+        names = [_protocol_name(c) for c in cats]
+    else:
+        names = [c or "Other" for c in cats]
+    labels = sorted(set(names))
+    remap = np.array([labels.index(n) for n in names], dtype=np.int64)
+    return remap[np.asarray(codes)], labels
+
+
+def per_run(requests, n_runs, dimension):
+    """Sum requests/transfer/resource bytes per (run, category) -> dict of (runs x categories) arrays."""
+    codes, labels = _dimension_codes(requests, dimension)
+    run_index = np.asarray(requests["run_index"])
+    flat = run_index * len(labels) + codes
+    size = n_runs * len(labels)
+    shape = (n_runs, len(labels))
+    # transferSize is -1 for requests that never got a response
+    transfer = np.clip(np.asarray(requests["transferSize"]), 0, None).astype(np.float64)
+    resource = np.clip(np.asarray(requests["resourceSize"]), 0, None).astype(np.float64)
+    return labels, {
+        "requests": np.bincount(flat, minlength=size).reshape(shape),
+        "transferBytes": np.bincount(flat, weights=transfer, minlength=size).reshape(shape),
+        "resourceBytes": np.bincount(flat, weights=resource, minlength=size).reshape(shape),
+    }
+
+
+def _ratio(transfer, resource):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(resource > 0, transfer / resource, np.nan)
+
+
+def by_site(store_dir=ingest.store_dir):
+    """Per-site medians across runs for every dimension, as one long frame."""
+    runs = ingest.load_table("runs", store_dir)
+    requests = ingest.load_table("requests", store_dir)
+    domain_codes, domains = runs["domain"]
+    domain_codes = np.asarray(domain_codes)
+    n_runs = len(domain_codes)
+
+    frames = []
+    for dimension in (*DIMENSIONS, "total"):
+        labels, sums = per_run(requests, n_runs, dimension)
+        # one groupby over the (runs x categories) matrices gives the medians across runs
+        stacked = {k: pd.DataFrame(v, columns=labels).groupby(domain_codes).median().stack()
+                   for k, v in sums.items()}
+        frame = pd.DataFrame(stacked).reset_index(names=["domain", "category"])
+        frame.insert(1, "dimension", dimension)
+        frames.append(frame)
+
+    site = pd.concat(frames, ignore_index=True)
+    site["domain"] = np.asarray(domains, dtype=object)[site["domain"].to_numpy()]
+    totals = site[site["dimension"] == "total"].set_index("domain")["transferBytes"]
+    site["share_pct"] = site["transferBytes"] / site["domain"].map(totals).replace(0, np.nan) * 100
+    site["compressionRatio"] = _ratio(site["transferBytes"].to_numpy(), site["resourceBytes"].to_numpy())
+    return site[site["requests"] > 0].reset_index(drop=True)
+
+
+def aggregate(site):
+    """Summarise the per-site table across sites, one row per dimension/category."""
+    g = site.groupby(["dimension", "category"], sort=True)
+    agg = g.agg(
+        sites=("domain", "nunique"),
+        requests=("requests", "sum"),
+        transferBytes=("transferBytes", "sum"),
+        resourceBytes=("resourceBytes", "sum"),
+        median_site_transferBytes=("transferBytes", "median"),
+        median_site_share_pct=("share_pct", "median"),
+    ).reset_index()
+    dim_total = agg.groupby("dimension")["transferBytes"].transform("sum")
+    agg["share_pct"] = agg["transferBytes"] / dim_total.replace(0, np.nan) * 100
+    agg["compressionRatio"] = _ratio(agg["transferBytes"].to_numpy(), agg["resourceBytes"].to_numpy())
+    return agg.sort_values(["dimension", "transferBytes"], ascending=[True, False]).reset_index(drop=True)
+
+
+def _charts():
+    from charts import Chart, WHITEGRID
+
+    def dim(name):
+        return lambda df: (df[df["dimension"] == name]
+                           .assign(transfer_kb=lambda d: d["transferBytes"] / 1024.0)
+                           .sort_values("transfer_kb", ascending=False))
+
+    def third_party(df):
+        share = df[(df["dimension"] == "party") & (df["category"] == "third-party")]
+        return share.sort_values("share_pct", ascending=False)
+
+    return [
+        # drawn from requests_aggregated.csv
+        (Chart("requests_bytes_by_type", "barh", "transfer_kb", "category",
+               "Transfer by resource type (median run, summed over sites)", xlabel="Transfer (KB)",
+               columns=("dimension", "category", "transferBytes"), select=dim("resourceType"),
+               figsize=(10, 6), dpi=150, cmap="viridis", style=WHITEGRID), "aggregated"),
+        (Chart("requests_bytes_by_protocol", "barh", "transfer_kb", "category",
+               "Transfer by protocol (median run, summed over sites)", xlabel="Transfer (KB)",
+               columns=("dimension", "category", "transferBytes"), select=dim("protocol"),
+               figsize=(8, 4), dpi=150, cmap="viridis", style=WHITEGRID), "aggregated"),
+        # drawn from requests_by_site.csv
+        (Chart("requests_third_party_share", "barh", "share_pct", "domain",
+               "Third-party share of transfer per site (%)", xlabel="Third-party share (%)",
+               columns=("dimension", "category", "domain", "share_pct"), select=third_party,
+               figsize=(12, 7), dpi=150, cmap="magma", style=WHITEGRID), "site"),
+    ]
+
+
+CHART_NAMES = ("requests_bytes_by_type", "requests_bytes_by_protocol", "requests_third_party_share")
+
+
+def write_outputs(site, agg, evidence_dir=evidence_dir):
+    import charts
+
+    evidence_dir = Path(evidence_dir)
+    charts_dir = evidence_dir / "charts"
+    charts_dir.mkdir(parents=True, exist_ok=True)
+    site_csv = evidence_dir / "requests_by_site.csv"
+    agg_csv = evidence_dir / "requests_aggregated.csv"
+    site.round({"transferBytes": 0, "resourceBytes": 0, "requests": 1, "share_pct": 2,
+                "compressionRatio": 4}).to_csv(site_csv, index=False)
+    agg.round({"median_site_transferBytes": 0, "median_site_share_pct": 2, "share_pct": 2,
+               "compressionRatio": 4}).to_csv(agg_csv, index=False)
+
+    outputs = [site_csv, agg_csv]
+    for chart, source in _charts():
+        out = charts.draw(chart, agg if source == "aggregated" else site, charts_dir)
+        if out:
+            outputs.append(out)
+    return outputs
+
+
+def main(df=None, evidence_dir=evidence_dir, store_dir=None):
+    """Build the request breakdowns; re-ingests the run files first if the store is missing or stale.
+
+    `df` is accepted so report.py/build.py can call every step the same way; it is not used.
+    """
+    evidence_dir = Path(evidence_dir)
+    store_dir = Path(store_dir) if store_dir else evidence_dir / "store"
+    ingest.ensure_store(evidence_dir / "lighthouse" / "runs", store_dir)
+
+    site = by_site(store_dir)
+    if site.empty:
+        print("No network requests in", store_dir)
+        return []
+    outputs = write_outputs(site, aggregate(site), evidence_dir)
+    for p in outputs:
+        print(f"Saved: {p}")
+    return outputs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Break down request bytes by type, party and protocol")
+    parser.add_argument("--evidence", type=Path, default=evidence_dir)
+    parser.add_argument("--store", type=Path, default=None, help="columnar store (default: <evidence>/store)")
+    args = parser.parse_args()
+    main(evidence_dir=args.evidence, store_dir=args.store)
@@ -0,0 +1,113 @@
+"""Mergeable quantile sketches for aggregating many per-run rows in fixed memory.
+
+A QuantileSketch tracks several metrics at once. Each metric keeps count,
+sum, min and max plus a histogram over logarithmic buckets whose width
+bounds the relative error of every quantile (1% by default), the scheme
+used by DDSketch. The bucket array has a fixed size, so memory does not grow
+with the number of rows; two sketches merge by adding their arrays, which
+lets aggregates be built chunk by chunk or round by round and saved to disk.
+
+Values are assumed non-negative (all Lighthouse metrics are); anything below
+`min_value` counts as zero.
+"""
+import json
+from pathlib import Path
+
+import numpy as np
+
+REL_ERR = 0.01
+MIN_VALUE = 1e-6
+MAX_VALUE = 1e13
+
+
+class QuantileSketch:
+    """Fixed-size log-bucket sketch for `metrics` (a list of names)."""
+
+    def __init__(self, metrics, rel_err=REL_ERR, min_value=MIN_VALUE, max_value=MAX_VALUE):
+        self.metrics = list(metrics)
+        self.rel_err = rel_err
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gamma = (1 + rel_err) / (1 - rel_err)
+        self._log_gamma = np.log(self.gamma)
+        self._offset = int(np.floor(np.log(min_value) / self._log_gamma))
+        n_bins = int(np.ceil(np.log(max_value) / self._log_gamma)) - self._offset + 1
+        m = len(self.metrics)
+        # bucket 0 holds zeros, bucket i > 0 holds values in (gamma^(i-1+offset), gamma^(i+offset)]
+        self.bins = np.zeros((m, n_bins + 1), dtype=np.int64)
+        self.count = np.zeros(m, dtype=np.int64)
+        self.sum = np.zeros(m)
+        self.min = np.full(m, np.inf)
+        self.max = np.full(m, -np.inf)
+
+    def _bucket(self, values):
+        v = np.clip(values, self.min_value, self.max_value)
+        idx = np.ceil(np.log(v) / self._log_gamma).astype(np.int64) - self._offset + 1
+        return np.where(values < self.min_value, 0, np.clip(idx, 1, self.bins.shape[1] - 1))
+
+    def update(self, values):
+        """Add a (rows x metrics) array; NaN entries are skipped."""
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.metrics))
+        metric = np.broadcast_to(np.arange(len(self.metrics)), values.shape)
+        return self.update_long(metric.ravel(), values.ravel())
+
+    def update_long(self, metric, values):
+        """Add values given in long form: metric[i] is the metric index of values[i]."""
+        metric = np.asarray(metric, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        valid = ~np.isnan(values)
+        metric, values = metric[valid], values[valid]
+        if not len(values):
+            return self
+        m = len(self.metrics)
+        self.count += np.bincount(metric, minlength=m)
+        self.sum += np.bincount(metric, weights=values, minlength=m)
+        np.minimum.at(self.min, metric, values)
+        np.maximum.at(self.max, metric, values)
+        # one bincount over (metric, bucket) pairs for the whole chunk
+        flat = metric * self.bins.shape[1] + self._bucket(values)
+        self.bins += np.bincount(flat, minlength=self.bins.size).reshape(self.bins.shape)
+        return self
+
+    def merge(self, other):
+        """Add another sketch with the same metrics and accuracy into this one."""
+        if other.metrics != self.metrics or other.bins.shape != self.bins.shape:
+            raise ValueError("sketches must have the same metrics and accuracy to merge")
+        self.bins += other.bins
+        self.count += other.count
+        self.sum += other.sum
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        return self
+
+    def quantiles(self, qs):
+        """(len(qs) x metrics) array of quantile estimates; NaN for empty metrics."""
+        qs = np.atleast_1d(qs)
+        cum = np.cumsum(self.bins, axis=1)
+        rank = qs[:, None] * np.maximum(self.count - 1, 0)[None, :]  # (qs, metrics)
+        out = np.empty((len(qs), len(self.metrics)))
+        for j in range(len(self.metrics)):
+            out[:, j] = np.searchsorted(cum[j], rank[:, j], side="right")
+        value = 2 * self.gamma ** (out - 1 + self._offset) / (self.gamma + 1)
+        value = np.where(out == 0, 0.0, value)
+        value = np.clip(value, self.min, self.max)
+        return np.where(self.count > 0, value, np.nan)
+
+    def mean(self):
+        return np.where(self.count > 0, self.sum / np.maximum(self.count, 1), np.nan)
+
+    def save(self, path):
+        path = Path(path)
+        np.savez_compressed(path, bins=self.bins, count=self.count, sum=self.sum, min=self.min, max=self.max,
+                            meta=json.dumps({"metrics": self.metrics, "rel_err": self.rel_err,
+                                             "min_value": self.min_value, "max_value": self.max_value}))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            sketch = cls(meta["metrics"], meta["rel_err"], meta["min_value"], meta["max_value"])
+            for name in ("bins", "count", "sum", "min", "max"):
+                setattr(sketch, name, data[name])
+        return sketch
@@ -1,71 +1,112 @@
-import os, shutil, pandas as pd
+"""Spreadsheet exports in evidence/spreadsheets.
+
+audit_results.xlsx (Results, Averages, GreenHostingSummary and Aggregated
+sheets) is written with openpyxl in write-only mode: rows are appended one at
+a time from the dataset in chunks, instead of pd.ExcelWriter building every
+cell object of the workbook in memory first. averages.csv and
+green_hosting_summary.csv hold the same tables as CSV. The per-site
+workbooks in spreadsheets/per_site are written by per_site_xlsx.py.
+
+Usage:
+    python spreadsheet_maker.py [--no-per-site] [--workers N]
+"""
+import argparse
+import os
+import shutil
 from pathlib import Path
 
-base_dir = Path(__file__).resolve().parent              
-evidence_dir = base_dir.parent.parent / "evidence"      
-results = evidence_dir / "results.csv"
-summary = evidence_dir / "summary.csv"
-out_dir = evidence_dir / "spreadsheets"
-out_dir.mkdir(parents=True, exist_ok=True)
-
-source_csv = results if results.exists() else summary
-if not source_csv.exists():
-    raise SystemExit(f"No results.csv or summary.csv found in {evidence_dir}")
-
-shutil.copyfile(source_csv, out_dir / source_csv.name)
-
-df = pd.read_csv(source_csv)
-
-df = df.rename(columns={
-    "performanceScore": "PerfScore",
-    "fcp_ms": "FCP",
-    "lcp_ms": "LCP",
-    "speed_index_ms": "SpeedIndex",
-    "tbt_ms": "TBT",
-    "cls": "CLS",
-    "transferBytes": "PageWeightBytes",
-    "jsBytes": "JSBytes",
-    "co2_swd_grams": "CO2_SWD_g",
-    "co2_onebyte_grams": "CO2_OneByte_g",
-    "requests": "Requests",
-    "domain": "Municipality"
-})
-
-num_cols = ['PerfScore','FCP','LCP','SpeedIndex','TBT','CLS','PageWeightBytes','Requests','JSBytes','CO2_SWD_g','CO2_OneByte_g']
-for c in num_cols:
-    if c in df.columns:
-        df[c] = pd.to_numeric(df[c], errors='coerce')
-
-if "GreenHosting" not in df.columns:
-    df["GreenHosting"] = "unknown"
-
-avg = {
-    'Avg_PerfScore_pct': round(df['PerfScore'].mean(),2),
-    'Avg_FCP_ms': round(df['FCP'].mean(),2),
-    'Avg_LCP_ms': round(df['LCP'].mean(),2),
-    'Avg_SpeedIndex_ms': round(df['SpeedIndex'].mean(),2),
-    'Avg_TBT_ms': round(df['TBT'].mean(),2),
-    'Avg_CLS': round(df['CLS'].mean(),3),
-    'Avg_Requests': round(df['Requests'].mean(),2),
-    'Avg_JSBytes': round(df['JSBytes'].mean(),2),
-    'Avg_PageWeight_MB': round((df['PageWeightBytes'].mean() / (1024*1024)),3),
-    'Avg_CO2_SWD_g': round(df['CO2_SWD_g'].mean(),4),
-    'Avg_CO2_OneByte_g': round(df['CO2_OneByte_g'].mean(),4)
-}
-avg_df = pd.DataFrame(list(avg.items()), columns=['Metric','Value'])
-green_df = df['GreenHosting'].value_counts(dropna=False).rename_axis('GreenHosting').reset_index(name='Count')
-
-avg_df.to_csv(out_dir / 'averages.csv', index=False)
-green_df.to_csv(out_dir / 'green_hosting_summary.csv', index=False)
-
-xlsx = out_dir / 'audit_results.xlsx'
-try:
-    import openpyxl
-    with pd.ExcelWriter(xlsx, engine='openpyxl') as w:
-        df.to_excel(w, sheet_name='Results', index=False)
-        avg_df.to_excel(w, sheet_name='Averages', index=False)
-        green_df.to_excel(w, sheet_name='GreenHostingSummary', index=False)
-except Exception as e:
-    print("Excel export skipped:", e)
-
-print('Wrote spreadsheets to', out_dir)
\ No newline at end of file
+import pandas as pd
+
+import aggregate
+import dataset
+
+evidence_dir = dataset.evidence_dir
+
+# Rows converted to plain Python values per step when streaming a frame
+CHUNK_ROWS = 5000
+
+
+def frame_rows(df, chunk_rows=CHUNK_ROWS):
+    """Yield the rows of `df` as tuples, with NaN/NA as None, one chunk at a time."""
+    for start in range(0, len(df), chunk_rows):
+        block = df.iloc[start:start + chunk_rows]
+        yield from block.astype(object).where(block.notna(), None).itertuples(index=False, name=None)
+
+
+def write_workbook(path, sheets):
+    """Stream {sheet name: frame} into a write-only workbook at `path`."""
+    from openpyxl import Workbook
+
+    path = Path(path)
+    wb = Workbook(write_only=True)
+    for name, frame in sheets.items():
+        ws = wb.create_sheet(name)
+        ws.append([str(c) for c in frame.columns])
+        for row in frame_rows(frame):
+            ws.append(row)
+    # save beside the target and rename, so a failed export never leaves a truncated workbook
+    tmp = path.with_name(path.name + ".tmp")
+    wb.save(tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def main(df=None, evidence_dir=evidence_dir):
+    evidence_dir = Path(evidence_dir)
+    out_dir = evidence_dir / "spreadsheets"
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    source_csv = dataset.source_csv(evidence_dir)
+    shutil.copyfile(source_csv, out_dir / source_csv.name)
+
+    if df is None:
+        df = dataset.load(source_csv)
+    # Averages and the aggregate sheet come from the summary aggregated.csv was written from
+    mean = aggregate.summary(df).set_index("metric")["mean"]
+    agg, _ = aggregate.aggregate(df)
+    df = df.drop(columns=["label"], errors="ignore").rename(columns=dataset.SPREADSHEET_NAMES)
+
+    if "GreenHosting" not in df.columns:
+        df["GreenHosting"] = "unknown"
+
+    avg = {
+        'Avg_PerfScore_pct': round(mean['performanceScore'],2),
+        'Avg_FCP_ms': round(mean['fcp_ms'],2),
+        'Avg_LCP_ms': round(mean['lcp_ms'],2),
+        'Avg_SpeedIndex_ms': round(mean['speed_index_ms'],2),
+        'Avg_TBT_ms': round(mean['tbt_ms'],2),
+        'Avg_CLS': round(mean['cls'],3),
+        'Avg_Requests': round(mean['requests'],2),
+        'Avg_JSBytes': round(mean['jsBytes'],2),
+        'Avg_PageWeight_MB': round((mean['transferBytes'] / (1024*1024)),3),
+        'Avg_CO2_SWD_g': round(mean['co2_swd_grams'],4),
+        'Avg_CO2_OneByte_g': round(mean['co2_onebyte_grams'],4)
+    }
+    avg_df = pd.DataFrame(list(avg.items()), columns=['Metric','Value'])
+    green_df = df['GreenHosting'].value_counts(dropna=False).rename_axis('GreenHosting').reset_index(name='Count')
+
+    avg_df.to_csv(out_dir / 'averages.csv', index=False)
+    green_df.to_csv(out_dir / 'green_hosting_summary.csv', index=False)
+
+    xlsx = out_dir / 'audit_results.xlsx'
+    try:
+        write_workbook(xlsx, {'Results': df, 'Averages': avg_df, 'GreenHostingSummary': green_df,
+                              'Aggregated': agg})
+    except Exception as e:
+        print("Excel export skipped:", e)
+
+    print('Wrote spreadsheets to', out_dir)
+    return out_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write the spreadsheet exports")
+    parser.add_argument("--evidence", type=Path, default=evidence_dir)
+    parser.add_argument("--no-per-site", action="store_true", help="skip the per-site workbooks")
+    parser.add_argument("--workers", type=int, default=None, help="processes for the per-site workbooks")
+    args = parser.parse_args()
+    main(evidence_dir=args.evidence)
+    if not args.no_per_site:
+        import per_site_xlsx
+
+        per_site_xlsx.main(evidence_dir=args.evidence, workers=args.workers)
@@ -0,0 +1,251 @@
+"""Bootstrap confidence intervals for per-site Lighthouse metrics.
+
+All sites are resampled at once: run values are packed into a
+(sites x runs x metrics) array padded with NaN, and each bootstrap draw picks
+n_i run indices for a site with n_i runs. The statistic (median by default,
+as in audit.js) is taken over every draw, and the CI is the percentile
+interval over draws.
+
+Usage:
+    python stats.py [--store DIR] [--summary CSV] [--n-boot 1000]
+"""
+import argparse
+import csv
+from pathlib import Path
+
+import numpy as np
+
+# Locate evidence folder
+evidence_dir = Path(__file__).resolve().parents[2] / "evidence"
+
+# summary.csv column -> Lighthouse source ("score" is categories.performance.score)
+CI_METRICS = {
+    "performanceScore": "score",
+    "fcp_ms": "first-contentful-paint",
+    "lcp_ms": "largest-contentful-paint",
+    "speed_index_ms": "speed-index",
+    "tbt_ms": "total-blocking-time",
+    "cls": "cumulative-layout-shift",
+}
+N_BOOT = 1000
+CI_LEVEL = 0.95
+# Stop adding runs once every metric's CI is narrower than this share of its median...
+CI_REL_WIDTH = 0.10
+# ...or than this absolute tolerance (score points, ms, CLS units), whichever is wider,
+# so fast sites are not held to a few-ms CI
+CI_ABS_WIDTH = {
+    "performanceScore": 5,
+    "fcp_ms": 250,
+    "lcp_ms": 500,
+    "speed_index_ms": 500,
+    "tbt_ms": 100,
+    "cls": 0.025,
+}
+# No decision below MIN_RUNS; below MIN_CI_RUNS the bootstrap CI is little more than the
+# range of the runs, so the observed range is held to the same tolerance instead
+MIN_RUNS = 3
+MIN_CI_RUNS = 4
+# Values per bootstrap draw array; the draws, their indices and uniforms each take 8 bytes a value
+CHUNK_CELLS = 4_000_000
+
+
+def ci_columns(metrics=CI_METRICS):
+    return [f"{m}_ci_{end}" for m in metrics for end in ("low", "high")]
+
+
+def run_values(run):
+    """Return the CI_METRICS values of one parsed run JSON, in CI_METRICS order."""
+    audits = run.get("audits") or {}
+    out = []
+    for source in CI_METRICS.values():
+        if source == "score":
+            v = ((run.get("categories") or {}).get("performance") or {}).get("score")
+            v = round(v * 100, 6) if isinstance(v, (int, float)) else None
+        else:
+            v = (audits.get(source) or {}).get("numericValue")
+        out.append(v if isinstance(v, (int, float)) else np.nan)
+    return out
+
+
+def pack_runs(per_site_runs):
+    """Stack a list of per-site run value lists into a NaN-padded (sites, runs, metrics) array."""
+    max_runs = max((len(r) for r in per_site_runs), default=0)
+    values = np.full((len(per_site_runs), max_runs, len(CI_METRICS)), np.nan)
+    for i, runs in enumerate(per_site_runs):
+        if runs:
+            values[i, :len(runs)] = runs
+    return values
+
+
+def _masked_stat(x, n, stat):
+    # x: NaN-padded values along the last axis, n: valid count per row
+    if stat == "mean":
+        return np.nansum(x, axis=-1) / np.where(n > 0, n, np.nan)
+    s = np.sort(x, axis=-1)  # NaN sorts last, so the n valid values come first
+    lo = np.take_along_axis(s, (np.maximum(n - 1, 0) // 2)[..., None], axis=-1)[..., 0]
+    hi = np.take_along_axis(s, np.minimum(n // 2, s.shape[-1] - 1)[..., None], axis=-1)[..., 0]
+    return np.where(n > 0, (lo + hi) / 2, np.nan)
+
+
+def _nan_quantiles(boot, qs):
+    # Linear-interpolated quantiles along the last axis, ignoring NaN (np.nanquantile is far slower)
+    s = np.sort(boot, axis=-1)
+    last = np.maximum((~np.isnan(s)).sum(axis=-1) - 1, 0)
+    out = []
+    for q in qs:
+        k = q * last
+        f = np.floor(k).astype(np.intp)
+        lo = np.take_along_axis(s, f[..., None], axis=-1)[..., 0]
+        hi = np.take_along_axis(s, np.minimum(f + 1, last)[..., None], axis=-1)[..., 0]
+        out.append(lo + (hi - lo) * (k - f))
+    return out
+
+
+def bootstrap_ci(values, n_boot=N_BOOT, level=CI_LEVEL, stat="median", seed=0, chunk_cells=CHUNK_CELLS):
+    """Percentile bootstrap CI along axis 1 of a (sites, runs[, metrics]) array.
+
+    `stat` is "median" (as audit.js) or "mean". NaN entries count as missing
+    runs. Sites, and if need be the draws themselves, are processed in
+    chunks so the draw array stays under `chunk_cells` values for any input
+    size. Returns (estimate, low, high), each shaped (sites[, metrics]).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    squeeze = values.ndim == 2
+    if squeeze:
+        values = values[:, :, None]
+    # Work on (sites, metrics, runs) so every reduction runs over contiguous memory
+    values = np.ascontiguousarray(values.transpose(0, 2, 1))
+    sites, metrics, runs = values.shape
+
+    # Move valid runs to the front of each (site, metric) row
+    packed = np.sort(values, axis=-1)
+    n = (~np.isnan(values)).sum(axis=-1)  # (sites, metrics)
+    slots = np.arange(runs)
+
+    rng = np.random.default_rng(seed)
+    alpha = (1 - level) / 2
+    estimate = _masked_stat(values, n, stat)
+    low = np.full((sites, metrics), np.nan)
+    high = np.full((sites, metrics), np.nan)
+    # Sites are taken in chunks and, when one site's draws alone exceed the budget
+    # (e.g. a CI across tens of thousands of sites), the draws are taken in blocks
+    step = max(1, chunk_cells // max(1, n_boot * runs * metrics))
+    for a in range(0, sites, step):
+        b = min(a + step, sites)
+        nn = n[a:b, :, None, None]  # (chunk, metrics, 1, 1)
+        block = min(n_boot, max(1, chunk_cells // max(1, (b - a) * runs * metrics)))
+        boot = np.empty((b - a, metrics, n_boot))
+        for c in range(0, n_boot, block):
+            d = min(c + block, n_boot)
+            u = rng.random((b - a, 1, d - c, runs))
+            idx = (u * np.maximum(nn, 1)).astype(np.intp)
+            draws = np.take_along_axis(packed[a:b, :, None, :], idx, axis=-1)  # (chunk, metrics, block, runs)
+            # a site with n runs draws n values; slots past n are padding
+            draws[np.broadcast_to(slots >= nn, draws.shape)] = np.nan
+            boot[..., c:d] = _masked_stat(draws, nn[..., 0], stat)
+        low[a:b], high[a:b] = _nan_quantiles(boot, (alpha, 1 - alpha))
+    low[n == 0] = high[n == 0] = np.nan
+    if squeeze:
+        return estimate[:, 0], low[:, 0], high[:, 0]
+    return estimate, low, high
+
+
+def tolerance(estimate, rel_width=CI_REL_WIDTH, abs_width=CI_ABS_WIDTH):
+    """Allowed CI width per metric: rel_width of the estimate or the absolute floor, whichever is wider."""
+    return np.maximum(rel_width * np.abs(estimate), np.array([abs_width[m] for m in CI_METRICS]))
+
+
+def converged(estimate, low, high, rel_width=CI_REL_WIDTH, abs_width=CI_ABS_WIDTH):
+    """True where the CI width is within tolerance() (a zero-width CI always passes)."""
+    width = high - low
+    return (width <= tolerance(estimate, rel_width, abs_width)) | (width == 0)
+
+
+def settled(values, rel_width=CI_REL_WIDTH, abs_width=CI_ABS_WIDTH, n_boot=N_BOOT, seed=0):
+    """Per (site, metric): have the runs in a (sites, runs, metrics) array settled?
+
+    Fewer than MIN_RUNS runs never count as settled. Up to MIN_CI_RUNS the
+    range of the runs must be within tolerance(); from there on the bootstrap
+    CI must be. A metric with no values at all is not held against the site.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    n = valid.sum(axis=1)
+    est, low, high = bootstrap_ci(values, n_boot=n_boot, seed=seed)
+    spread = np.where(valid, values, -np.inf).max(axis=1) - np.where(valid, values, np.inf).min(axis=1)
+    small = (spread <= tolerance(est, rel_width, abs_width)) | (spread == 0)
+    ok = np.where(n >= MIN_CI_RUNS, converged(est, low, high, rel_width, abs_width), small)
+    return (ok & (n >= MIN_RUNS)) | (n == 0)
+
+
+def needs_more_runs(runs, rel_width=CI_REL_WIDTH, n_boot=N_BOOT, seed=0):
+    """Decide from a site's parsed runs whether another Lighthouse run is worth it."""
+    if len(runs) < MIN_RUNS:
+        return True
+    values = pack_runs([[run_values(r) for r in runs]])
+    return not bool(np.all(settled(values, rel_width, n_boot=n_boot, seed=seed)))
+
+
+def store_run_values(store_dir=evidence_dir / "store"):
+    """Return (domains, values) for every site in the ingest store, (re)building it if needed."""
+    import ingest
+
+    store_dir = Path(store_dir)
+    ingest.ensure_store(store_dir.parent / "lighthouse" / "runs", store_dir)
+    runs = ingest.load_table("runs", store_dir)
+    ids, audits = ingest.load_audits(store_dir)
+    col = {a: i for i, a in enumerate(ids)}
+
+    codes, domains = runs["domain"]
+    codes = np.asarray(codes)
+    flat = np.full((len(codes), len(CI_METRICS)), np.nan)
+    for j, source in enumerate(CI_METRICS.values()):
+        if source == "score":
+            flat[:, j] = np.round(np.asarray(runs["performanceScore"]) * 100, 6)
+        elif source in col:
+            flat[:, j] = audits[:, col[source]]
+
+    # Scatter the long run rows into (site, position-within-site) slots
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    starts = np.searchsorted(sorted_codes, sorted_codes, side="left")
+    pos = np.arange(len(codes)) - starts
+    values = np.full((len(domains), int(pos.max(initial=-1)) + 1, len(CI_METRICS)), np.nan)
+    values[sorted_codes, pos] = flat[order]
+    return domains, values
+
+
+def add_ci_columns(summary_csv, domains, low, high):
+    """Rewrite summary.csv with <metric>_ci_low/_ci_high columns, keeping the quoting."""
+    with open(summary_csv, newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return
+    lookup = {d: i for i, d in enumerate(domains)}
+    keys = [k for k in rows[0] if k not in ci_columns()] + ci_columns()
+    for row in rows:
+        i = lookup.get(row.get("domain"))
+        for j, m in enumerate(CI_METRICS):
+            for end, arr in (("low", low), ("high", high)):
+                v = arr[i, j] if i is not None else np.nan
+                row[f"{m}_ci_{end}"] = "" if np.isnan(v) else repr(float(v))
+    with open(summary_csv, "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=keys, quoting=csv.QUOTE_ALL, lineterminator="\n")
+        w.writeheader()
+        w.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add bootstrap CI columns to summary.csv")
+    parser.add_argument("--store", type=Path, default=evidence_dir / "store")
+    parser.add_argument("--summary", type=Path, default=evidence_dir / "summary.csv")
+    parser.add_argument("--n-boot", type=int, default=N_BOOT)
+    parser.add_argument("--level", type=float, default=CI_LEVEL)
+    args = parser.parse_args()
+
+    domains, values = store_run_values(args.store)
+    est, low, high = bootstrap_ci(values, n_boot=args.n_boot, level=args.level)
+    add_ci_columns(args.summary, domains, low, high)
+    ok = settled(values, n_boot=args.n_boot).all(axis=1)
+    print(f"CI columns added for {len(domains)} sites ({int(ok.sum())} settled)")
+    print(f"Saved: {args.summary}")
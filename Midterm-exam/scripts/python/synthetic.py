@@ -0,0 +1,381 @@
+"""Synthetic Lighthouse evidence for benchmarking the pipeline at scale.
+
+generate() writes an evidence tree with the layout and schema of a real audit:
+
+- lighthouse/runs/<domain>_runN.json: Lighthouse 13 results with the metric
+  audits, total-byte-weight, network-requests items (url, protocol, request
+  times, transfer/resource size, status, MIME and resource type, priority,
+  entity), entities, the performance category and timing.entries for the
+  config, gather, audit and generate phases
+- hosting/<domain>_greencheck.json, hosting/carbon_txt.json and
+  *_carbon.txt for the sites that publish one
+- summary.csv, summary.json and lighthouse/<domain>.json, written by
+  audit.py's own code from the run files (Lighthouse is never started, since
+  every run file already exists, and the hosting cache is fresh)
+
+Values come from seeded distributions shaped like the real 21-site dataset:
+log-normal request counts and sizes per resource type, metrics that vary a
+little between a site's runs, and a performance score computed with
+Lighthouse's log-normal metric curves. Each site has its own random stream,
+so the same seed gives the same tree however many workers write it.
+
+Usage:
+    python synthetic.py OUT_DIR [--sites 1000] [--runs 3] [--seed 0] [--workers N] [--screenshot-kb 40]
+"""
+import argparse
+import base64
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from common import domain_key, iso_now
+
+LIGHTHOUSE_VERSION = "13.0.1"
+USER_AGENT = ("Mozilla/5.0 (Linux; Android 11; moto g power (2022)) AppleWebKit/537.36 "
+              "(KHTML, like Gecko) Chrome/142.0.0.0 Mobile Safari/537.36")
+EPOCH = datetime(2025, 11, 16, 11, 0, tzinfo=timezone.utc)
+
+# resourceType -> (share of requests, median transfer bytes, log-sd, resource/transfer ratio, mimeType, extension)
+RESOURCE_TYPES = {
+    "Script": (0.30, 25_000, 1.3, 3.5, "application/javascript", ".js"),
+    "Image": (0.30, 30_000, 1.4, 1.0, "image/webp", ".webp"),
+    "Stylesheet": (0.08, 12_000, 1.0, 4.0, "text/css", ".css"),
+    "Font": (0.07, 25_000, 0.5, 1.0, "font/woff2", ".woff2"),
+    "XHR": (0.08, 2_000, 1.2, 2.0, "application/json", ""),
+    "Fetch": (0.07, 1_500, 1.2, 2.0, "application/json", ""),
+    "Media": (0.02, 200_000, 1.0, 1.0, "video/mp4", ".mp4"),
+    "Other": (0.08, 500, 1.0, 1.0, "text/plain", ""),
+}
+PRIORITY = {"Document": "VeryHigh", "Script": "High", "Stylesheet": "VeryHigh", "Font": "High", "Image": "Low"}
+PROTOCOLS = (["h2", "h3", "http/1.1"], [0.6, 0.3, 0.1])
+THIRD_PARTIES = [
+    ("Google Tag Manager", "https://www.googletagmanager.com", "tag-manager"),
+    ("Google Analytics", "https://www.google-analytics.com", "analytics"),
+    ("Siteimprove", "https://siteimproveanalytics.com", "analytics"),
+    ("jsDelivr CDN", "https://cdn.jsdelivr.net", "cdn"),
+    ("Cloudflare CDN", "https://cdnjs.cloudflare.com", "cdn"),
+    ("YouTube", "https://www.youtube.com", "video"),
+    ("Vimeo", "https://player.vimeo.com", "video"),
+    ("Hotjar", "https://static.hotjar.com", "analytics"),
+    ("boost.ai", "https://prokom.boost.ai", "customer-success"),
+    ("Microsoft Hosted Libs", "https://js.monitor.azure.com", "cdn"),
+]
+
+# Lighthouse 13 mobile scoring: audit id -> (acronym, weight, p10, median)
+SCORED_METRICS = {
+    "first-contentful-paint": ("FCP", 10, 1800, 3000),
+    "largest-contentful-paint": ("LCP", 25, 2500, 4000),
+    "total-blocking-time": ("TBT", 30, 200, 600),
+    "cumulative-layout-shift": ("CLS", 25, 0.1, 0.25),
+    "speed-index": ("SI", 10, 3387, 5800),
+}
+# Other audits with a numericValue: id -> (title, unit)
+OTHER_AUDITS = {
+    "interactive": ("Time to Interactive", "millisecond"),
+    "server-response-time": ("Initial server response time", "millisecond"),
+    "max-potential-fid": ("Max Potential First Input Delay", "millisecond"),
+    "bootup-time": ("JavaScript execution time", "millisecond"),
+    "mainthread-work-breakdown": ("Main-thread work", "millisecond"),
+    "dom-size": ("DOM size", "element"),
+    "total-byte-weight": ("Total network payload", "byte"),
+    "unused-javascript": ("Reduce unused JavaScript", "millisecond"),
+    "render-blocking-resources": ("Eliminate render-blocking resources", "millisecond"),
+}
+# Artifacts gathered after the page load: name -> median ms
+ARTIFACTS = {
+    "DevtoolsLog": 0.05, "Trace": 40, "Accessibility": 300, "AnchorElements": 25, "CSSUsage": 60,
+    "ConsoleMessages": 0.2, "FullPageScreenshot": 450, "ImageElements": 40, "Inputs": 5, "JsUsage": 30,
+    "LinkElements": 5, "MainDocumentContent": 3, "MetaElements": 3, "RobotsTxt": 80, "Scripts": 10,
+    "SourceMaps": 5, "Stylesheets": 20, "TraceElements": 50, "ViewportDimensions": 1,
+}
+# Computed artifacts an audit spends most of its time in
+COMPUTED = {
+    "speed-index": ["SpeedIndex", "LanternSpeedIndex", "Speedline"],
+    "largest-contentful-paint": ["LargestContentfulPaint", "LanternLargestContentfulPaint"],
+    "first-contentful-paint": ["FirstContentfulPaint", "LanternFirstContentfulPaint"],
+    "total-blocking-time": ["TotalBlockingTime"],
+    "interactive": ["Interactive", "LanternInteractive"],
+    "unused-javascript": ["UnusedJavascriptSummary", "JSBundles"],
+}
+
+
+def iso(t):
+    return t.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def metric_score(value, p10, median):
+    """Lighthouse's log-normal curve: 0.9 at p10, 0.5 at the median."""
+    if value <= 0:
+        return 1.0
+    sigma = (math.log(median) - math.log(p10)) / 1.2815515655446004
+    return 0.5 * math.erfc((math.log(value) - math.log(median)) / (sigma * math.sqrt(2)))
+
+
+def _lognormal(rng, median, sigma, size=None):
+    return median * np.exp(rng.normal(0.0, sigma, size))
+
+
+def site_profile(rng, domain):
+    """Everything that stays the same across a site's runs."""
+    n = int(np.clip(_lognormal(rng, 60, 0.5), 5, 400))
+    names = list(RESOURCE_TYPES)
+    shares = np.array([RESOURCE_TYPES[t][0] for t in names])
+    types = ["Document", *rng.choice(names, n - 1, p=shares / shares.sum())]
+    third = np.r_[False, rng.random(n - 1) < rng.beta(2, 3)]
+    parties = rng.choice(len(THIRD_PARTIES), min(len(THIRD_PARTIES), 1 + rng.poisson(3)), replace=False)
+    entity = [THIRD_PARTIES[parties[rng.integers(len(parties))]] if t else None for t in third]
+
+    requests = []
+    for i, (rtype, party) in enumerate(zip(types, entity)):
+        _, median, sigma, ratio, mime, ext = RESOURCE_TYPES.get(rtype, (0, 15_000, 0.8, 4.0, "text/html", ""))
+        origin = party[1] if party else f"https://{domain}"
+        transfer = int(_lognormal(rng, median, sigma))
+        requests.append({
+            "url": f"{origin}/" if i == 0 else f"{origin}/assets/{rtype.lower()}-{i}{ext}",
+            "protocol": str(rng.choice(PROTOCOLS[0], p=PROTOCOLS[1])),
+            "transferSize": transfer,
+            "resourceSize": int(transfer * ratio * rng.uniform(0.8, 1.2)),
+            "statusCode": 200 if rng.random() > 0.02 else 404,
+            "mimeType": mime,
+            "resourceType": rtype,
+            "priority": PRIORITY.get(rtype, "Low"),
+            "entity": party[0] if party else domain.removeprefix("www."),
+        })
+
+    fcp = float(_lognormal(rng, 2500, 0.5))
+    return {
+        "domain": domain,
+        "requests": requests,
+        "entities": [party for party in THIRD_PARTIES if any(e is party for e in entity)],
+        "metrics": {
+            "first-contentful-paint": fcp,
+            "largest-contentful-paint": fcp * (1 + float(_lognormal(rng, 0.6, 0.6))),
+            "speed-index": fcp * (1 + float(_lognormal(rng, 0.2, 0.8))),
+            "total-blocking-time": float(_lognormal(rng, 150, 1.0)),
+            "cumulative-layout-shift": 0.0 if rng.random() < 0.6 else float(rng.exponential(0.05)),
+            "server-response-time": float(_lognormal(rng, 150, 0.6)),
+            "dom-size": float(int(_lognormal(rng, 900, 0.5))),
+        },
+    }
+
+
+def _timing_entries(rng, run_metrics, audit_ids):
+    """timing.entries sorted by start time, each parent before the entries it contains; returns (entries, total)."""
+    entries = []
+
+    def measure(name, start, duration):
+        entries.append({"startTime": round(start, 2), "name": name, "duration": round(duration, 2),
+                        "entryType": "measure"})
+        return start + duration
+
+    start = float(rng.uniform(1000, 5000))
+    config = float(_lognormal(rng, 220, 0.2))
+    measure("lh:config", start, config)
+    measure("lh:config:resolveArtifactsToDefns", start + 1.5, config * 0.2)
+
+    gather_start = start + config + 1
+    t = measure("lh:driver:connect", gather_start + 100, float(_lognormal(rng, 3.5, 0.2)))
+    t = measure("lh:driver:navigate", t, float(_lognormal(rng, 35, 0.3)))
+    t = measure("lh:gather:getBenchmarkIndex", t, float(_lognormal(rng, 1000, 0.05)))
+    t = measure("lh:gather:getVersion", t, 0.4)
+    t = measure("lh:storage:clearDataForOrigin", t + 10, float(_lognormal(rng, 20, 0.3)))
+    t = measure("lh:gather:prepareThrottlingAndNetwork", t + 5, 0.4)
+    # the page load itself: until the page is interactive plus the quiet windows
+    t = measure("lh:driver:navigate", t + 50, run_metrics["interactive"] * 0.45 + 2000)
+    for name, median in ARTIFACTS.items():
+        t = measure(f"lh:gather:getArtifact:{name}", t + 0.1, float(_lognormal(rng, median, 0.4)))
+    measure("lh:runner:gather", gather_start, t + 5 - gather_start)
+
+    audit_start = t + 6
+    t = audit_start + 0.6
+    for audit_id in audit_ids:
+        inner = t + 0.2
+        for name in COMPUTED.get(audit_id, []):
+            inner = measure(f"lh:computed:{name}", inner, float(_lognormal(rng, 15, 0.8))) + 0.05
+        t = measure(f"lh:audit:{audit_id}", t, inner - t + float(_lognormal(rng, 2, 1.0))) + 0.1
+    measure("lh:runner:audit", audit_start, t + 0.3 - audit_start)
+    measure("lh:runner:auditing", audit_start + 0.05, t + 0.2 - audit_start)
+    end = measure("lh:runner:generate", t + 0.5, 0.22)
+    entries.sort(key=lambda e: e["startTime"])
+    return entries, round(end - start, 2)
+
+
+def run_result(profile, run, rng, screenshot_kb=0):
+    """One Lighthouse result object for `profile`, with run-to-run noise."""
+    domain = profile["domain"]
+    url = f"https://{domain}/"
+    jitter = lambda v, sd=0.08: float(v * _lognormal(rng, 1.0, sd))  # noqa: E731
+    m = {k: jitter(v) for k, v in profile["metrics"].items()}
+    m["cumulative-layout-shift"] = profile["metrics"]["cumulative-layout-shift"]
+    m["largest-contentful-paint"] = max(m["largest-contentful-paint"], m["first-contentful-paint"])
+    m["interactive"] = max(m["largest-contentful-paint"], m["first-contentful-paint"] + m["total-blocking-time"]) * 1.02
+    m["max-potential-fid"] = m["total-blocking-time"] * 0.4 + 30
+    m["bootup-time"] = m["total-blocking-time"] * 3 + 200
+    m["mainthread-work-breakdown"] = m["bootup-time"] * 2.2
+    m["unused-javascript"] = m["bootup-time"] * 0.5
+    m["render-blocking-resources"] = m["first-contentful-paint"] * 0.1
+
+    # a run can miss or add a couple of late requests
+    n = max(1, min(len(profile["requests"]), len(profile["requests"]) + int(rng.integers(-2, 1))))
+    starts = np.sort(rng.uniform(0, m["largest-contentful-paint"], n))
+    starts[0] = 0.0
+    items = []
+    for req, start in zip(profile["requests"][:n], starts.tolist()):
+        request_time = start + float(rng.uniform(0.2, 5))
+        items.append({
+            "url": req["url"],
+            "sessionTargetType": "page",
+            "protocol": req["protocol"],
+            "rendererStartTime": start,
+            "networkRequestTime": request_time,
+            "networkEndTime": request_time + float(_lognormal(rng, 60, 0.8)),
+            "finished": True,
+            "transferSize": int(req["transferSize"] * rng.uniform(0.995, 1.005)),
+            "resourceSize": req["resourceSize"],
+            "statusCode": req["statusCode"],
+            "mimeType": req["mimeType"],
+            "resourceType": req["resourceType"],
+            "priority": req["priority"],
+            "experimentalFromMainFrame": True,
+            "entity": req["entity"],
+        })
+    m["total-byte-weight"] = float(sum(it["transferSize"] for it in items))
+
+    audits = {}
+    score = 0.0
+    for audit_id, (acronym, weight, p10, median) in SCORED_METRICS.items():
+        s = metric_score(m[audit_id], p10, median)
+        score += s * weight / 100
+        audits[audit_id] = {"id": audit_id, "title": acronym, "score": round(s, 2), "scoreDisplayMode": "numeric",
+                            "numericValue": m[audit_id],
+                            "numericUnit": "unitless" if acronym == "CLS" else "millisecond",
+                            "scoringOptions": {"p10": p10, "median": median}}
+    for audit_id, (title, unit) in OTHER_AUDITS.items():
+        audits[audit_id] = {"id": audit_id, "title": title, "score": None, "scoreDisplayMode": "informative",
+                            "numericValue": m[audit_id], "numericUnit": unit}
+    audits["network-requests"] = {
+        "id": "network-requests", "title": "Network Requests", "score": 1, "scoreDisplayMode": "informative",
+        "details": {"type": "table", "headings": [], "items": items},
+    }
+
+    entries, total = _timing_entries(rng, m, list(audits))
+    first_party = {"name": domain.removeprefix("www."), "origins": [f"https://{domain}"], "isFirstParty": True,
+                   "isUnrecognized": True}
+    fetch_time = EPOCH + timedelta(seconds=int(rng.integers(0, 86400)), milliseconds=run)
+    result = {
+        "lighthouseVersion": LIGHTHOUSE_VERSION,
+        "requestedUrl": url,
+        "mainDocumentUrl": url,
+        "finalDisplayedUrl": url,
+        "finalUrl": url,
+        "fetchTime": iso(fetch_time),
+        "gatherMode": "navigation",
+        "runWarnings": [],
+        "userAgent": USER_AGENT,
+        "environment": {"networkUserAgent": USER_AGENT, "hostUserAgent": USER_AGENT,
+                        "benchmarkIndex": int(_lognormal(rng, 2000, 0.05))},
+        "audits": audits,
+        "configSettings": {"output": ["json"], "formFactor": "mobile", "throttlingMethod": "simulate",
+                           "gatherMode": "navigation", "locale": "en-US"},
+        "categories": {"performance": {
+            "title": "Performance", "supportedModes": ["navigation", "timespan", "snapshot"],
+            "auditRefs": [{"id": k, "weight": v[1], "group": "metrics", "acronym": v[0]}
+                          for k, v in SCORED_METRICS.items()],
+            "id": "performance", "score": round(score, 2),
+        }},
+        "categoryGroups": {},
+        "stackPacks": [],
+        "entities": [first_party] + [{"name": name, "origins": [origin], "category": category}
+                                     for name, origin, category in profile["entities"]],
+        "timing": {"entries": entries, "total": total},
+        "i18n": {"rendererFormattedStrings": {}, "icuMessagePaths": {}},
+    }
+    if screenshot_kb:
+        data = base64.b64encode(rng.bytes(screenshot_kb * 768)).decode()
+        result["fullPageScreenshot"] = {"screenshot": {"data": f"data:image/webp;base64,{data}", "width": 412,
+                                                       "height": 4000}, "nodes": {}}
+    return result
+
+
+def site_domain(i):
+    return f"www.site-{i:05d}.example"
+
+
+def write_site(out_dir, i, runs=3, seed=0, screenshot_kb=0):
+    """Write the run files and hosting cache of site `i`; returns its URL."""
+    rng = np.random.default_rng([seed, i])
+    domain = site_domain(i)
+    profile = site_profile(rng, domain)
+    runs_dir = Path(out_dir) / "lighthouse" / "runs"
+    for run in range(1, runs + 1):
+        with open(runs_dir / f"{domain}_run{run}.json", "w", encoding="utf-8") as f:
+            json.dump(run_result(profile, run, rng, screenshot_kb), f)
+
+    green = bool(rng.random() < 0.4)
+    check = {"url": domain, "domain": domain, "checkedAt": iso_now(), "green": green,
+             "modified": iso(EPOCH)}
+    if green:
+        check.update(hosted_by="Cloudflare", hosted_by_website="https://www.cloudflare.com", listed_provider=True,
+                     partner=None, hosted_by_id=779, supporting_documents=[])
+    else:
+        check["data"] = False
+    with open(Path(out_dir) / "hosting" / f"{domain}_greencheck.json", "w", encoding="utf-8") as f:
+        json.dump(check, f, indent=2)
+    carbon = bool(rng.random() < 0.1)
+    if carbon:
+        with open(Path(out_dir) / "hosting" / f"{domain}_carbon.txt", "w", encoding="utf-8") as f:
+            f.write(f'[upstream]\nservices = [{{ domain = "cloudflare.com", service_type = "cdn" }}]\n\n'
+                    f'[org]\ncredentials = [{{ domain = "{domain}", doctype = "sustainability-page", '
+                    f'url = "https://{domain}/baerekraft" }}]\n')
+    return f"https://{domain}", {"checkedAt": iso_now(), "found": carbon, "status": 200 if carbon else 404}
+
+
+def _write_job(job):
+    return write_site(*job)
+
+
+def generate(out_dir, sites=1000, runs=3, seed=0, workers=None, screenshot_kb=0, log=print):
+    """Write a complete synthetic evidence tree to `out_dir`; returns the site URLs."""
+    import audit
+    import hosting
+
+    out_dir = Path(out_dir)
+    for d in (out_dir / "lighthouse" / "runs", out_dir / "hosting"):
+        d.mkdir(parents=True, exist_ok=True)
+    jobs = [(out_dir, i, runs, seed, screenshot_kb) for i in range(sites)]
+    if workers is None:
+        workers = min(sites, os.cpu_count() or 1)
+    if workers <= 1:
+        written = list(map(_write_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            written = list(pool.map(_write_job, jobs, chunksize=max(1, sites // (workers * 8))))
+    urls = [url for url, _ in written]
+    with open(out_dir / "hosting" / hosting.CARBON_INDEX, "w", encoding="utf-8") as f:
+        json.dump({domain_key(url): entry for url, entry in written}, f, indent=2, sort_keys=True)
+    with open(out_dir / "sites.json", "w", encoding="utf-8") as f:
+        json.dump(urls, f, indent=2)
+
+    # summary.csv through the real audit code: every run file exists and the hosting cache is fresh
+    auditor = audit.Auditor(out_dir, "false", num_runs=runs, log=lambda *a: None)
+    audit.write_summary(audit.run_audit(urls, auditor, workers=1), out_dir)
+    log(f"Generated {sites} sites x {runs} runs in {out_dir}")
+    return urls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic evidence tree for benchmarks")
+    parser.add_argument("out", type=Path)
+    parser.add_argument("--sites", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes writing run files")
+    parser.add_argument("--screenshot-kb", type=int, default=0,
+                        help="size of a random fullPageScreenshot per run (real runs carry ~40 KB)")
+    args = parser.parse_args()
+    generate(args.out, args.sites, args.runs, args.seed, args.workers, args.screenshot_kb)
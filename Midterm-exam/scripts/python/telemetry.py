@@ -0,0 +1,142 @@
+"""Per-stage telemetry: wall time, CPU time, peak memory and rows processed.
+
+A Telemetry collects one record per pipeline stage and saves them as one
+manifest per run in evidence/telemetry/<name>_<UTC time>.json:
+
+    tel = Telemetry("build")
+    with tel.stage("aggregate") as s:
+        ...
+        s["rows"] = len(df)
+    tel.save(evidence_dir)
+
+Standalone scripts (ingest.py, audit.py, hosting.py, co2.py, history.py,
+per_site_xlsx.py) record their run as one stage with cli_stage(), which saves
+the manifest even when the script fails. Only the newest KEEP manifests of
+each name are kept; save() removes older ones.
+
+Peak memory is the resident-set high-water mark of the process (VmHWM on
+Linux, getrusage elsewhere) when the stage ends, and of its worker processes
+(chart and per-site pools).
+In one long process the high-water mark only grows, so a stage's own peak
+is only exact when it runs first; benchmark.py therefore runs every stage in
+a fresh process.
+"""
+import json
+import os
+import platform
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+TELEMETRY_DIR = "telemetry"
+# Manifests kept per name (build, ingest, audit, ...); older ones are deleted on save
+KEEP = 50
+
+
+def peak_rss_mb(children=False):
+    """Resident-set high-water mark in MB, of this process or of its finished children."""
+    if not children:
+        # Linux keeps ru_maxrss across fork+exec, so a child started by a big parent
+        # would report the parent's peak; VmHWM starts afresh with the new program
+        try:
+            with open("/proc/self/status", encoding="ascii") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def host_info():
+    import numpy
+    import pandas
+
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": numpy.__version__, "pandas": pandas.__version__}
+
+
+def _utc_now():
+    return datetime.now(timezone.utc)
+
+
+class Telemetry:
+    """Stage records of one pipeline run."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = _utc_now()
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """Time the block; the yielded dict can be given rows and other fields."""
+        record = {"stage": name, "rows": None, **fields}
+        rss_before = peak_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        except BaseException as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record["wall_s"] = round(time.perf_counter() - wall, 4)
+            record["cpu_s"] = round(time.process_time() - cpu, 4)
+            record["peak_rss_mb"] = peak_rss_mb()
+            record["rss_growth_mb"] = (round(record["peak_rss_mb"] - rss_before, 1)
+                                       if rss_before is not None else None)
+            record["children_peak_rss_mb"] = peak_rss_mb(children=True)
+            self.stages.append(record)
+
+    def manifest(self):
+        return {
+            "name": self.name,
+            "started_at": self.started_at.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+            "wall_s": round(sum(s["wall_s"] for s in self.stages), 4),
+            "host": host_info(),
+            "stages": self.stages,
+        }
+
+    def save(self, evidence_dir, keep=KEEP):
+        """Write evidence/telemetry/<name>_<time>.json, drop all but the `keep` newest, return its path."""
+        out_dir = Path(evidence_dir) / TELEMETRY_DIR
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"{self.name}_{self.started_at.strftime('%Y%m%dT%H%M%S%f')[:-3]}Z.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest(), f, indent=2)
+        prune(out_dir, self.name, keep)
+        return path
+
+
+def prune(out_dir, name, keep=KEEP):
+    """Delete all but the `keep` newest manifests of `name` in `out_dir`; returns the deleted paths."""
+    pattern = re.compile(rf"{re.escape(name)}_\d{{8}}T\d{{9}}Z\.json")
+    # the UTC stamp in the file name sorts by time
+    found = sorted(p for p in Path(out_dir).iterdir() if pattern.fullmatch(p.name))
+    old = found[:max(len(found) - keep, 0)]
+    for p in old:
+        p.unlink(missing_ok=True)
+    return old
+
+
+@contextmanager
+def cli_stage(name, evidence_dir, log=print, **fields):
+    """Record a standalone script's run as one stage and save it, also when the script fails."""
+    tel = Telemetry(name)
+    try:
+        with tel.stage(name, **fields) as record:
+            yield record
+    finally:
+        log(f"Telemetry: {tel.save(evidence_dir)}")
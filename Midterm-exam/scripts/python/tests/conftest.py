@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The scripts are flat modules next to this folder, imported the way they import each other
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def evidence(tmp_path):
+    """A small synthetic evidence tree (3 sites x 3 runs) laid out like a real audit."""
+    import synthetic
+
+    synthetic.generate(tmp_path / "evidence", sites=3, runs=3, seed=1, workers=1, log=lambda *a: None)
+    return tmp_path / "evidence"
@@ -0,0 +1,62 @@
+"""Stand-in for `npx lighthouse`: writes a small canned report instead of auditing.
+
+Accepts the arguments audit.py passes (URL, --output=json, --output-path=FILE,
+--chrome-flags=..., --quiet). Metric values depend on the URL and on the run
+number in the output file name, so medians are predictable. If STUB_LIGHTHOUSE_LOG
+is set, one line per call is appended to it:  <url> <user-data-dir>.
+
+Usage:
+    python stub_lighthouse.py URL --output=json --output-path=FILE [--chrome-flags=...]
+"""
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+
+def report(url, run):
+    base = 1000 + 100 * (sum(map(ord, url)) % 7)
+    return {
+        "requestedUrl": url,
+        "finalUrl": url,
+        "fetchTime": "2025-01-01T00:00:00.000Z",
+        "categories": {"performance": {"score": 0.5 + 0.1 * run}},
+        "audits": {
+            "first-contentful-paint": {"numericValue": base + 10 * run},
+            "largest-contentful-paint": {"numericValue": 2 * base + 10 * run},
+            "speed-index": {"numericValue": base + 50 * run},
+            "total-byte-weight": {"numericValue": 100000 * run},
+            "total-blocking-time": {"numericValue": 10 * run},
+            "cumulative-layout-shift": {"numericValue": 0.01 * run},
+            "server-response-time": {"numericValue": 100 + run},
+            "interactive": {"numericValue": 3 * base},
+            "network-requests": {"details": {"items": [
+                {"url": f"{url}app.js", "resourceType": "Script", "mimeType": "application/javascript",
+                 "transferSize": 2000 * run, "resourceSize": 4000 * run},
+                *({"url": f"{url}img{i}.png", "resourceType": "Image", "mimeType": "image/png",
+                   "transferSize": 1000, "resourceSize": 1000} for i in range(run)),
+            ]}},
+        },
+    }
+
+
+def main(argv):
+    url = next(a for a in argv if not a.startswith("--"))
+    opts = dict(a[2:].split("=", 1) for a in argv if a.startswith("--") and "=" in a)
+    out = Path(opts["output-path"])
+    profile = re.search(r"--user-data-dir=(\S+)", opts.get("chrome-flags", ""))
+    profile = profile.group(1) if profile else ""
+    if profile and not os.path.isdir(profile):
+        sys.exit(f"profile directory {profile} does not exist")
+
+    if os.environ.get("STUB_LIGHTHOUSE_LOG"):
+        with open(os.environ["STUB_LIGHTHOUSE_LOG"], "a", encoding="utf-8") as f:
+            f.write(f"{url} {profile}\n")
+    run = int(re.search(r"_run(\d+)\.json$", out.name).group(1))
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report(url, run), f)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
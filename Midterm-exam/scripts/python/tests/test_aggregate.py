@@ -0,0 +1,35 @@
+import pandas as pd
+
+import aggregate
+import build
+import dataset
+
+
+def test_one_summary_per_build(evidence, monkeypatch):
+    calls = []
+    summarize = aggregate.summarize
+    monkeypatch.setattr(aggregate, "summarize", lambda df, *a, **k: calls.append(k) or summarize(df, *a, **k))
+    df = dataset.load(evidence_dir=evidence)
+    done = build.build(df, evidence, steps=["aggregate", "visualize", "spreadsheets"], log=lambda *a: None)
+    assert {"aggregate", "visualize.averages", "spreadsheets"} <= {t.name for t, _ in done}
+    assert len(calls) == 1
+
+    # the shared result is what a fresh pass gives, and feeds every output
+    fresh = summarize(df)
+    pd.testing.assert_frame_equal(aggregate.summary(df), fresh)
+    mean = fresh.set_index("metric")["mean"]
+    averages = pd.read_csv(evidence / "spreadsheets" / "averages.csv").set_index("Metric")["Value"]
+    assert averages["Avg_LCP_ms"] == round(mean["lcp_ms"], 2)
+    written = pd.read_csv(evidence / "aggregated.csv").set_index("metric")
+    assert written.loc["lcp_ms", "ci_low"] == round(fresh.set_index("metric").loc["lcp_ms", "ci_low"], 1)
+
+
+def test_summary_not_shared_across_frames(evidence):
+    df = dataset.load(evidence_dir=evidence)
+    other = df.assign(lcp_ms=df["lcp_ms"] * 2)
+    first = aggregate.summary(df)
+    assert aggregate.summary(df) is first
+    lcp = {id(f): aggregate.summary(f).set_index("metric").loc["lcp_ms", "mean"] for f in (df, other)}
+    assert lcp[id(other)] == 2 * lcp[id(df)]
+    df["extra"] = 1.0  # a new column set is summarised again
+    assert aggregate.summary(df) is not first
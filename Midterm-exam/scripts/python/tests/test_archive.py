@@ -0,0 +1,67 @@
+import json
+
+import numpy as np
+import openpyxl
+
+import archive
+import audit
+import ingest
+import per_site_xlsx
+
+
+def store_tables(store):
+    tables = {name: ingest.load_frame(name, store) for name in ("runs", "requests", "timings")}
+    return tables, ingest.load_audits(store, mmap=False)
+
+
+def workbook_rows(path):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return {ws.title: [list(r) for r in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def test_convert_remove_round_trip(evidence):
+    lighthouse, runs_dir = evidence / "lighthouse", evidence / "lighthouse" / "runs"
+    originals = {p.stem: json.loads(p.read_text(encoding="utf-8")) for p in sorted(runs_dir.glob("*.json"))}
+    ingest.ingest(runs_dir, evidence / "store_plain", log=lambda *a: None)
+    per_site_xlsx.build(evidence, workers=1, log=lambda *a: None)
+    sheets = {p.name: workbook_rows(p) for p in (evidence / "spreadsheets" / "per_site").glob("*.xlsx")}
+
+    archive.convert(lighthouse, evidence / "archive", remove=True, label="round-1", log=lambda *a: None)
+    assert not list(runs_dir.glob("*.json"))
+
+    # cat
+    store = archive.Archive(evidence / "archive")
+    for name, lhr in originals.items():
+        assert store.read_report(name) == lhr
+
+    # ingest reads the archived runs and builds the same store
+    found = ingest.find_run_files(runs_dir)
+    assert [p.stem for _, _, p in found] == [f"{n}.json" for n in originals]
+    counts = ingest.ingest(runs_dir, evidence / "store", log=lambda *a: None)
+    assert counts["runs"] == len(originals) and counts["skipped"] == []
+    (a_tables, (a_ids, a_values)), (b_tables, (b_ids, b_values)) = \
+        store_tables(evidence / "store_plain"), store_tables(evidence / "store")
+    assert a_ids == b_ids and np.array_equal(a_values, b_values, equal_nan=True)
+    for name in a_tables:
+        assert a_tables[name].equals(b_tables[name]), name
+    assert ingest.is_current(runs_dir, evidence / "store")
+
+    # per-site workbooks come out the same, and the audit resume check finds the runs
+    for p in (evidence / "spreadsheets" / "per_site").glob("*.xlsx"):
+        p.unlink()
+    result = per_site_xlsx.build(evidence, workers=1, force=True, log=lambda *a: None)
+    assert result["failed"] == {}
+    assert {p.name: workbook_rows(p) for p in (evidence / "spreadsheets" / "per_site").glob("*.xlsx")} == sheets
+    auditor = audit.Auditor(evidence, "true", check_hosting=False, log=lambda *a: None)
+    name = next(iter(originals))
+    assert auditor._valid_run(runs_dir / f"{name}.json") == originals[name]
+
+
+def test_plain_run_file_wins_over_archived(evidence):
+    runs_dir = evidence / "lighthouse" / "runs"
+    archive.convert(evidence / "lighthouse", evidence / "archive", label="round-1", log=lambda *a: None)
+    found = ingest.find_run_files(runs_dir)
+    assert all(p.parent == runs_dir and p.suffix == ".json" for _, _, p in found)
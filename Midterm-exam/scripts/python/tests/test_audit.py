@@ -0,0 +1,61 @@
+import csv
+import json
+import os
+import shlex
+import subprocess
+import sys
+from pathlib import Path
+
+scripts_dir = Path(__file__).resolve().parents[1]
+stub = Path(__file__).resolve().parent / "stub_lighthouse.py"
+URLS = ["https://www.one.example/", "https://www.two.example/", "https://www.three.example/"]
+
+
+def audit(tmp_path, *args):
+    sites = tmp_path / "sites.json"
+    sites.write_text(json.dumps(URLS), encoding="utf-8")
+    log = tmp_path / "calls.log"
+    log.touch()
+    before = log.read_text(encoding="utf-8").splitlines()
+    cmd = [sys.executable, str(scripts_dir / "audit.py"), "--evidence", str(tmp_path / "evidence"),
+           "--sites", str(sites), "--workers", "2", "--skip-hosting", "--no-history",
+           "--lighthouse", f"{shlex.quote(sys.executable)} {shlex.quote(str(stub))}", *args]
+    subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=scripts_dir,
+                   env={**os.environ, "STUB_LIGHTHOUSE_LOG": str(log)})
+    return [line.split(" ", 1) for line in log.read_text(encoding="utf-8").splitlines()[len(before):]]
+
+
+def test_summary_from_stub_runs(tmp_path):
+    calls = audit(tmp_path)
+    assert sorted(url for url, _ in calls) == sorted(URLS * 3)
+
+    with open(tmp_path / "evidence" / "summary.csv", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["url"] for r in rows] == URLS
+    for r in rows:
+        assert r["performanceScore"] == "70"
+        assert r["transferBytes"] == "200000"
+        assert r["requests"] == "3"
+        assert r["jsBytes"] == "4000"
+    for url in URLS:
+        report = tmp_path / "evidence" / "lighthouse" / f"{url[8:].replace('/', '_')}.json"
+        assert json.loads(report.read_text(encoding="utf-8"))["categories"]["performance"]["score"] == 0.7
+    (manifest,) = (tmp_path / "evidence" / "telemetry").glob("audit_*.json")
+    (stage,) = json.loads(manifest.read_text(encoding="utf-8"))["stages"]
+    assert stage["stage"] == "audit" and stage["rows"] == len(URLS)
+
+
+def test_fresh_profile_per_run_is_removed(tmp_path):
+    profiles = [p for _, p in audit(tmp_path)]
+    assert len(set(profiles)) == len(profiles)
+    assert not any(Path(p).exists() for p in profiles)
+
+
+def test_resume_reuses_existing_runs(tmp_path):
+    audit(tmp_path)
+    assert audit(tmp_path) == []
+
+    (tmp_path / "evidence" / "lighthouse" / "runs" / "www.two.example__run2.json").unlink()
+    calls = audit(tmp_path)
+    assert [url for url, _ in calls] == ["https://www.two.example/"]
+    assert (tmp_path / "evidence" / "lighthouse" / "runs" / "www.two.example__run2.json").exists()
@@ -0,0 +1,54 @@
+import json
+
+import build
+import ingest
+
+STEPS = ["aggregate", "spreadsheets", "requests", "phases"]
+RUN_READERS = {"spreadsheets.per_site", "requests", "phases"}
+
+
+def rebuild(evidence):
+    return {t.name: reason for t, reason in build.build(evidence_dir=evidence, steps=STEPS, log=lambda *a: None)}
+
+
+def test_unchanged_tree_is_a_no_op(evidence):
+    first = rebuild(evidence)
+    assert RUN_READERS | {"aggregate"} <= set(first)
+    assert set(first.values()) == {"never built"}
+    manifest = (evidence / build.MANIFEST_NAME).read_text()
+    store = (evidence / "store" / ingest.SOURCES_NAME).stat().st_mtime_ns
+
+    assert rebuild(evidence) == {}
+    assert (evidence / build.MANIFEST_NAME).read_text() == manifest
+    assert (evidence / "store" / ingest.SOURCES_NAME).stat().st_mtime_ns == store
+
+
+def test_changed_run_file_rebuilds_ingest_and_dependents(evidence):
+    rebuild(evidence)
+    runs_dir = evidence / "lighthouse" / "runs"
+    path = sorted(runs_dir.glob("*.json"))[0]
+    lhr = json.loads(path.read_text(encoding="utf-8"))
+    item = lhr["audits"]["network-requests"]["details"]["items"][0]
+    item["transferSize"] += 12345
+    path.write_text(json.dumps(lhr), encoding="utf-8")
+    assert not ingest.is_current(runs_dir, evidence / "store")
+
+    again = rebuild(evidence)
+    assert set(again) == RUN_READERS  # summary.csv did not change, so aggregate is left alone
+    assert all(r.startswith("inputs changed: lighthouse/runs") for r in again.values())
+    assert ingest.is_current(runs_dir, evidence / "store")
+    sizes = ingest.load_frame("requests", evidence / "store")["transferSize"]
+    assert item["transferSize"] in set(sizes)
+    assert rebuild(evidence) == {}
+
+
+def test_deleted_or_edited_output_is_rebuilt(evidence):
+    rebuild(evidence)
+    (evidence / "lighthouse_phases.csv").unlink()
+    with open(evidence / "aggregated.csv", "a", encoding="utf-8") as f:
+        f.write("edited by hand\n")
+    again = rebuild(evidence)
+    assert again == {"phases": "missing lighthouse_phases.csv", "aggregate": "aggregated.csv modified"}
+    assert (evidence / "lighthouse_phases.csv").exists()
+    assert "edited by hand" not in (evidence / "aggregated.csv").read_text(encoding="utf-8")
+    assert rebuild(evidence) == {}
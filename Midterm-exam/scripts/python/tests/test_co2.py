@@ -0,0 +1,38 @@
+import pytest
+
+import co2
+import dataset
+
+# rows of an audit.js summary.csv (co2 columns from @tgwf/co2 0.16 perByte, grey hosting)
+SUMMARY = """\
+url,domain,timestamp,performanceScore,transferBytes,requests,jsBytes,co2_onebyte_grams,co2_swd_grams,greenHosting,fcp_ms,lcp_ms,speed_index_ms,tbt_ms,cls
+"https://www.aurskog-holand.kommune.no","www.aurskog-holand.kommune.no","2025-11-16T11:47:46.061Z","52","5781495","62","1302092","1.6813339054349998","2.214783198693","false","13108.668","31341.18399999998","13108.668","196.8427500000007","0"
+"https://www.baerum.kommune.no","www.baerum.kommune.no","2025-11-16T11:48:25.881Z","69","1179112","45","651214","0.342901098056","0.45169587571680003","true","2541.02","10565.730979999998","4536.302902744319","50","0"
+"https://www.eidsvoll.kommune.no","www.eidsvoll.kommune.no","2025-11-16T11:49:12.462Z","63","1389065","39","770317","0.40395815984499994","0.5321249648910001","false","4719.998","6117.864","5777.507442720515","148","0.005622565804037638"
+"""
+
+
+@pytest.fixture
+def evidence(tmp_path):
+    (tmp_path / "summary.csv").write_text(SUMMARY, encoding="utf-8")
+    return tmp_path
+
+
+def test_check_matches_audit_js(evidence, capsys):
+    assert co2.check_summary(dataset.load(evidence_dir=evidence)).empty
+    co2.main("summary", evidence, check=True)
+    assert "checked for 3 sites: 0 mismatch(es)" in capsys.readouterr().out
+    assert (evidence / "co2_by_site.csv").exists()
+
+
+def test_check_reports_edited_value(evidence):
+    text = (evidence / "summary.csv").read_text(encoding="utf-8")
+    (evidence / "summary.csv").write_text(text.replace('"0.342901098056"', '"0.35"'), encoding="utf-8")
+    mismatches = co2.check_summary(dataset.load(evidence_dir=evidence))
+    assert list(mismatches["domain"]) == ["www.baerum.kommune.no"]
+
+
+def test_what_if_needs_the_store(evidence):
+    with pytest.raises(ValueError, match="--what-if"):
+        co2.main("summary", evidence, what_if=["Script=0.5"])
+    assert not (evidence / "co2_by_site.csv").exists()
@@ -0,0 +1,19 @@
+import numpy as np
+
+import dataset
+
+
+def test_byte_columns_keep_full_precision(tmp_path):
+    csv = tmp_path / "summary.csv"
+    csv.write_text('url,domain,performanceScore,transferBytes,requests,jsBytes,co2_swd_grams,lcp_ms,lcp_ms_ci_low\n'
+                   '"https://a.no","a.no","58","123456789","63","16777217","0.45373808266020005","10022.24","9000.5"\n'
+                   '"https://b.no","b.no","","n/a","","","","",""\n', encoding="utf-8")
+    df = dataset.load(csv)
+    assert df["transferBytes"].dtype == df["jsBytes"].dtype == df["requests"].dtype == np.float64
+    assert df["co2_swd_grams"].dtype == np.float64
+    assert df["performanceScore"].dtype == df["lcp_ms"].dtype == df["lcp_ms_ci_low"].dtype == np.float32
+    # 16777217 = 2**24 + 1 is the first integer float32 cannot hold
+    assert df.loc[0, "transferBytes"] == 123456789 and df.loc[0, "jsBytes"] == 16777217
+    assert df.loc[0, "co2_swd_grams"] == 0.45373808266020005
+    # stray text still becomes NaN
+    assert np.isnan(df.loc[1, "transferBytes"]) and df["transferBytes"].dtype == np.float64
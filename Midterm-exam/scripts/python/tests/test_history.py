@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+import history
+
+
+def summary(timestamp, lcp, score):
+    return pd.DataFrame({
+        "domain": ["a.no", "b.no"],
+        "timestamp": [timestamp] * 2,
+        "lcp_ms": lcp,
+        "performanceScore": score,
+    })
+
+
+@pytest.fixture
+def db(tmp_path):
+    with history.History(tmp_path / history.DB_NAME) as h:
+        yield h
+
+
+def test_rounds_are_append_only(db):
+    first = db.record(summary("2025-11-16T11:00:00Z", [2000.0, 3000.0], [80.0, 60.0]))
+    before = db.series("lcp_ms")
+    second = db.record(summary("2026-01-10T09:00:00Z", [2500.0, 2400.0], [70.0, 66.0]), label="2026-01")
+    assert second == first + 1
+    assert list(db.rounds()["label"]) == ["2025-11-16T11:00:00Z", "2026-01"]
+    after = db.series("lcp_ms")
+    # the first round's rows are untouched by the second
+    first_rows = after[after["round"] == "2025-11-16T11:00:00Z"].reset_index(drop=True)
+    assert first_rows.equals(before)
+
+
+def test_duplicate_label_rejected(db):
+    db.record(summary("2025-11-16T11:00:00Z", [2000.0, 3000.0], [80.0, 60.0]), label="nov")
+    rows = len(db.series("lcp_ms"))
+    with pytest.raises(ValueError, match="already recorded"):
+        db.record(summary("2026-01-10T09:00:00Z", [1.0, 1.0], [1.0, 1.0]), label="nov")
+    assert list(db.rounds()["label"]) == ["nov"]
+    assert len(db.series("lcp_ms")) == rows
+    with pytest.raises(ValueError, match="#"):
+        db.record(summary("2026-01-10T09:00:00Z", [1.0, 1.0], [1.0, 1.0]), label="#2")
+
+
+def test_deltas_and_regressions(db):
+    db.record(summary("2025-11-16T11:00:00Z", [2000.0, 3000.0], [80.0, 60.0]), label="nov")
+    db.record(summary("2026-01-10T09:00:00Z", [2500.0, 2400.0], [70.0, 66.0]), label="jan")
+    d = db.deltas("lcp_ms")
+    assert list(d["domain"]) == ["a.no", "b.no"]
+    assert list(d["before"]) == [2000.0, 3000.0] and list(d["after"]) == [2500.0, 2400.0]
+    assert list(d["delta"]) == [500.0, -600.0]
+    assert list(d["pct"]) == [25.0, -20.0]
+    assert db.deltas("lcp_ms", "nov", "jan").equals(d)
+    assert list(db.deltas("lcp_ms", "jan", "nov")["delta"]) == [-500.0, 600.0]
+
+    worse = db.regressions(["lcp_ms", "performanceScore"], threshold_pct=5.0)
+    assert sorted(zip(worse["metric"], worse["domain"])) == [("lcp_ms", "a.no"), ("performanceScore", "a.no")]
+
+
+def test_rounds_by_label_or_explicit_id(db):
+    # a label that looks like the other round's id must still mean the label
+    db.record(summary("2025-11-16T11:00:00Z", [2000.0, 3000.0], [80.0, 60.0]), label="2")
+    db.record(summary("2026-01-10T09:00:00Z", [2500.0, 2400.0], [70.0, 66.0]), label="jan")
+    assert db._round_id("2") == 1
+    assert db._round_id("#2") == db._round_id(2) == db._round_id("jan") == 2
+    assert list(db.deltas("lcp_ms", "#1", "#2")["delta"]) == [500.0, -600.0]
+    with pytest.raises(ValueError, match="no round '1'"):
+        db._round_id("1")
+    with pytest.raises(ValueError, match="no round #7"):
+        db._round_id("#7")
+    with pytest.raises(ValueError, match="bad round id"):
+        db._round_id("#x")
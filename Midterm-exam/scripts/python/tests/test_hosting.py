@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import pytest
+
+import hosting
+from common import domain_key, host_of, iso_now
+
+SITES = ["green-a", "green-b", "grey-c", "grey-d", "grey-e"]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Greencheck API and site root in one: /v2/greencheckmulti/<json>, /greencheck/<host>, /<site>/carbon.txt."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.paths.append(self.path)
+        path = unquote(self.path)
+        if server.failing:
+            return self._send(500, b"down")
+        if path.startswith("/v2/greencheckmulti/"):
+            if server.multi_broken:
+                return self._send(500, b"")
+            hosts = json.loads(path[len("/v2/greencheckmulti/"):])
+            return self._send(200, json.dumps({h: self._result(h) for h in hosts}).encode())
+        if path.startswith("/greencheck/"):
+            return self._send(200, json.dumps(self._result(path[len("/greencheck/"):])).encode())
+        if path.endswith("/carbon.txt") and path.startswith("/green-a/"):
+            return self._send(200, b"[upstream]\n")
+        return self._send(404, b"not found")
+
+    @staticmethod
+    def _result(host):
+        return {"url": host, "green": host.rsplit("/", 1)[-1].startswith("green")}
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    httpd.paths, httpd.failing, httpd.multi_broken = [], False, False
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.api = f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.urls = [f"{httpd.api}/{s}/" for s in SITES]
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def checker(server, tmp_path, **kwargs):
+    kwargs = {"batch_size": 2, "retries": 0, "timeout": 5, "log": lambda *a: None, **kwargs}
+    return hosting.HostingChecker(tmp_path / "hosting", api=server.api, **kwargs)
+
+
+def expected(server):
+    return {u: {"green": "/green-" in u, "carbonTxt": "/green-a/" in u} for u in server.urls}
+
+
+def test_batched_lookups(server, tmp_path):
+    assert checker(server, tmp_path).check(server.urls) == expected(server)
+    multi = [p for p in server.paths if p.startswith("/v2/greencheckmulti/")]
+    assert len(multi) == 3  # 5 hosts in batches of 2
+    assert not any(p.startswith("/greencheck/") for p in server.paths)
+    assert sum(p.endswith("/carbon.txt") for p in server.paths) == len(SITES)
+    assert (tmp_path / "hosting" / f"{domain_key(server.urls[0])}_carbon.txt").read_text() == "[upstream]\n"
+
+
+def test_per_host_fallback_when_batch_fails(server, tmp_path):
+    server.multi_broken = True
+    assert checker(server, tmp_path).check(server.urls) == expected(server)
+    assert sum(p.startswith("/greencheck/") for p in server.paths) == len(SITES)
+
+
+def test_fresh_cache_is_not_requeried(server, tmp_path):
+    checker(server, tmp_path).check(server.urls)
+    server.paths.clear()
+    assert checker(server, tmp_path).check(server.urls) == expected(server)
+    assert server.paths == []
+
+    # past the TTL everything is looked up again
+    assert checker(server, tmp_path, ttl_days=0).check(server.urls) == expected(server)
+    assert len(server.paths) == 3 + len(SITES)
+
+
+def test_expired_entries_used_when_lookups_fail(server, tmp_path):
+    checker(server, tmp_path).check(server.urls)
+    server.failing = True
+    assert checker(server, tmp_path, ttl_days=0).check(server.urls) == expected(server)
+
+
+def test_carbon_index_seeded_from_saved_files(server, tmp_path):
+    hosting_dir = tmp_path / "hosting"
+    hosting_dir.mkdir()
+    saved = hosting_dir / f"{domain_key(server.urls[3])}_carbon.txt"
+    saved.write_text("[org]\n")
+    old = time.time() - 30 * 86400
+    stale = hosting_dir / f"{domain_key(server.urls[4])}_carbon.txt"
+    stale.write_text("[org]\n")
+    os.utime(stale, (old, old))
+
+    results = checker(server, tmp_path).check(server.urls, green=False)
+    carbon = [p for p in server.paths if p.endswith("/carbon.txt")]
+    # the recent file counts as a fresh hit; the month-old one is checked again (and is gone)
+    assert not any("/grey-d/" in p for p in carbon)
+    assert any("/grey-e/" in p for p in carbon)
+    assert results[server.urls[3]]["carbonTxt"] is True
+    assert results[server.urls[4]]["carbonTxt"] is False
+    index = json.loads((hosting_dir / hosting.CARBON_INDEX).read_text())
+    assert index[domain_key(server.urls[3])]["found"] is True
+
+
+def test_audit_js_greencheck_files_reused(server, tmp_path):
+    hosting_dir = tmp_path / "hosting"
+    hosting_dir.mkdir()
+    url = "https://www.as.kommune.no"
+    # audit.js: `${host}_greencheck.json` with {url, domain: host, checkedAt, ...greencheck}
+    (hosting_dir / "www.as.kommune.no_greencheck.json").write_text(json.dumps(
+        {"url": url, "domain": host_of(url), "checkedAt": iso_now(), "green": True}))
+    c = checker(server, tmp_path)
+    assert c.greencheck_file(url) == hosting_dir / "www.as.kommune.no_greencheck.json"
+    assert c.check([url], carbon=False) == {url: {"green": True, "carbonTxt": None}}
+    assert server.paths == []
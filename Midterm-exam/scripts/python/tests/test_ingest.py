@@ -0,0 +1,97 @@
+import json
+
+import numpy as np
+import pytest
+
+import ingest
+
+
+def parsed_runs(runs_dir):
+    out = []
+    for _, _, path in ingest.find_run_files(runs_dir):
+        with open(path, encoding="utf-8") as f:
+            out.append(json.load(f))
+    return out
+
+
+def store_arrays(store):
+    tables = {name: ingest.load_table(name, store, mmap=False) for name in ("runs", "requests", "timings")}
+    ids, values = ingest.load_audits(store, mmap=False)
+    return tables, ids, values
+
+
+def test_store_matches_json(evidence):
+    runs_dir, store = evidence / "lighthouse" / "runs", evidence / "store"
+    counts = ingest.ingest(runs_dir, store, log=lambda *a: None)
+    lhrs = parsed_runs(runs_dir)
+    assert counts["runs"] == len(lhrs) == 9
+    assert counts["skipped"] == []
+
+    runs = ingest.load_frame("runs", store)
+    assert list(runs["file"]) == [p.name for _, _, p in ingest.find_run_files(runs_dir)]
+    assert np.allclose(runs["performanceScore"], [r["categories"]["performance"]["score"] for r in lhrs])
+    assert list(runs["fetchTime"]) == [r["fetchTime"] for r in lhrs]
+
+    ids, values = ingest.load_audits(store)
+    col = {a: j for j, a in enumerate(ids)}
+    for i, lhr in enumerate(lhrs):
+        for audit_id, audit in lhr["audits"].items():
+            if isinstance(audit.get("numericValue"), (int, float)):
+                assert values[i, col[audit_id]] == audit["numericValue"]
+
+    requests = ingest.load_frame("requests", store)
+    items = [it for r in lhrs for it in r["audits"]["network-requests"]["details"]["items"]]
+    assert len(requests) == len(items)
+    assert list(requests["url"]) == [it["url"] for it in items]
+    assert list(requests["transferSize"]) == [it["transferSize"] for it in items]
+    assert list(runs["requests"]) == [len(r["audits"]["network-requests"]["details"]["items"]) for r in lhrs]
+    first_party = [{e["name"] for e in r["entities"] if e.get("isFirstParty")} for r in lhrs]
+    assert list(requests["isFirstParty"]) == [it.get("entity") in first_party[i] for i, r in enumerate(lhrs)
+                                              for it in r["audits"]["network-requests"]["details"]["items"]]
+
+    timings = ingest.load_frame("timings", store)
+    entries = [e for r in lhrs for e in r["timing"]["entries"]]
+    assert list(timings["name"]) == [e["name"] for e in entries]
+    assert np.array_equal(timings["duration"], [e["duration"] for e in entries])
+    assert ingest.table_rows("timings", store) == len(entries)
+
+
+def test_json_fallback_writes_the_same_store(evidence, monkeypatch):
+    runs_dir = evidence / "lighthouse" / "runs"
+    ingest.ingest(runs_dir, evidence / "store_ijson", log=lambda *a: None)
+    monkeypatch.setattr(ingest, "ijson", None)
+    ingest.ingest(runs_dir, evidence / "store_json", log=lambda *a: None)
+    a_tables, a_ids, a_values = store_arrays(evidence / "store_ijson")
+    b_tables, b_ids, b_values = store_arrays(evidence / "store_json")
+    assert a_ids == b_ids
+    assert np.array_equal(a_values, b_values, equal_nan=True)
+    for name, table in a_tables.items():
+        for col, values in table.items():
+            other = b_tables[name][col]
+            if isinstance(values, tuple):
+                assert values[1] == other[1]
+                values, other = values[0], other[0]
+            assert np.array_equal(values, other, equal_nan=values.dtype.kind == "f"), (name, col)
+
+
+@pytest.mark.parametrize("damage", ["truncate", "garbage"])
+def test_unreadable_run_is_skipped(evidence, damage):
+    runs_dir, store = evidence / "lighthouse" / "runs", evidence / "store"
+    bad = sorted(runs_dir.glob("*_run2.json"))[0]
+    data = bad.read_bytes()
+    bad.write_bytes(data[:len(data) // 2] if damage == "truncate" else b"{not json")
+    warnings = []
+    counts = ingest.ingest(runs_dir, store, log=warnings.append)
+
+    assert counts["skipped"] == [bad.name]
+    assert len(warnings) == 1 and bad.name in warnings[0]
+    runs = ingest.load_frame("runs", store)
+    assert len(runs) == 8 and bad.name not in set(runs["file"])
+    # no rows of the broken run leak into the other tables
+    good = [json.loads(p.read_text(encoding="utf-8")) for _, _, p in ingest.find_run_files(runs_dir) if p != bad]
+    requests = ingest.load_frame("requests", store)
+    assert requests["run_index"].max() == 7
+    assert len(requests) == int(runs["requests"].sum()) == sum(
+        len(r["audits"]["network-requests"]["details"]["items"]) for r in good)
+    assert ingest.table_rows("timings", store) == sum(len(r["timing"]["entries"]) for r in good)
+    assert ingest.is_current(runs_dir, store)
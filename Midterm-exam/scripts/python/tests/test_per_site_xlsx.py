@@ -0,0 +1,58 @@
+import json
+import shutil
+
+import openpyxl
+
+import per_site_xlsx
+
+
+def sheets(path):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return {ws.title: [list(r) for r in ws.iter_rows(values_only=True)] for ws in wb.worksheets}
+    finally:
+        wb.close()
+
+
+def items(path):
+    lhr = json.loads(path.read_text(encoding="utf-8"))
+    return lhr["audits"]["network-requests"]["details"]["items"]
+
+
+def test_runs_numbered_by_position_and_unreadable_run_skipped(evidence):
+    runs_dir = evidence / "lighthouse" / "runs"
+    domains = sorted({p.name.rsplit("_run", 1)[0] for p in runs_dir.glob("*.json")})
+    site, broken = domains[0], domains[1]
+    # site: runs 1, 3 and 4 readable (run 2 truncated); broken: nothing readable
+    shutil.copyfile(runs_dir / f"{site}_run3.json", runs_dir / f"{site}_run4.json")
+    bad = runs_dir / f"{site}_run2.json"
+    bad.write_bytes(bad.read_bytes()[:500])
+    for p in runs_dir.glob(f"{broken}_run*.json"):
+        p.write_text("{", encoding="utf-8")
+    readable = [runs_dir / f"{site}_run{i}.json" for i in (1, 3, 4)]
+
+    log = []
+    result = per_site_xlsx.build(evidence, workers=1, log=log.append)
+    out_dir = evidence / "spreadsheets" / "per_site"
+    assert sorted(p.name for p in result["written"]) == sorted(f"{d}.xlsx" for d in domains if d != broken)
+    assert result["failed"] == {broken: "no readable runs"}
+    assert not (out_dir / f"{broken}.xlsx").exists()
+    assert any(f"{site}_run2.json" in m and site in m for m in log)
+
+    wb = sheets(out_dir / f"{site}.xlsx")
+    assert list(wb) == list(per_site_xlsx.SHEETS)
+    runs = wb["runs"]
+    assert runs[0] == per_site_xlsx.RUN_COLUMNS
+    assert [r[0] for r in runs[1:]] == [1, 2, 3, "median"]
+    assert [r[-1] for r in runs[1:4]] == [len(items(p)) for p in readable]
+    requests = wb["per_resource_all_runs"]
+    assert requests[0] == per_site_xlsx.RESOURCE_COLUMNS
+    assert len(requests) == 1 + sum(len(items(p)) for p in readable)
+    assert sorted({r[0] for r in requests[1:]}) == [1, 2, 3]
+    assert sum(r[1] for r in wb["summary_by_type"][1:]) == len(requests) - 1
+    assert [r[0] for r in wb["co2"][1:]] == [1, 2, 3, "median"]
+
+    # unchanged inputs are not rebuilt; the broken site is tried again
+    again = per_site_xlsx.build(evidence, workers=1, log=lambda *a: None)
+    assert again["written"] == [] and again["skipped"] == len(domains) - 1
+    assert again["failed"] == {broken: "no readable runs"}
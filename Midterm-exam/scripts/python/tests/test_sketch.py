@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from sketch import REL_ERR, QuantileSketch
+
+METRICS = ["lcp_ms", "transferBytes", "cls"]
+
+
+def sample(n, seed=0):
+    rng = np.random.default_rng(seed)
+    values = np.column_stack([
+        rng.lognormal(8.5, 0.6, n),                      # ms
+        rng.uniform(2e5, 4e7, n).round(),                # bytes, beyond float32's exact range
+        np.where(rng.random(n) < 0.4, 0.0, rng.exponential(0.05, n)),  # many zeros
+    ])
+    values[rng.random(values.shape) < 0.02] = np.nan
+    return values
+
+
+def test_merged_chunks_equal_one_sketch():
+    values = sample(20_000)
+    whole = QuantileSketch(METRICS).update(values)
+    merged = QuantileSketch(METRICS)
+    for chunk in np.array_split(values, 7):
+        merged.merge(QuantileSketch(METRICS).update(chunk))
+    assert np.array_equal(merged.bins, whole.bins)
+    assert np.array_equal(merged.count, whole.count)
+    assert np.array_equal(merged.min, whole.min) and np.array_equal(merged.max, whole.max)
+    assert np.allclose(merged.sum, whole.sum)
+    qs = [0.1, 0.5, 0.9, 0.99]
+    assert np.array_equal(merged.quantiles(qs), whole.quantiles(qs))
+
+
+def test_long_form_update_matches_wide():
+    values = sample(5_000, seed=1)
+    metric = np.broadcast_to(np.arange(len(METRICS)), values.shape)
+    long = QuantileSketch(METRICS).update_long(metric.ravel(), values.ravel())
+    assert np.array_equal(long.bins, QuantileSketch(METRICS).update(values).bins)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_quantiles_within_relative_error(seed):
+    values = sample(50_000, seed)
+    sk = QuantileSketch(METRICS).update(values)
+    qs = [0.5, 0.9]
+    est = sk.quantiles(qs)
+    for j in range(len(METRICS)):
+        col = values[:, j][~np.isnan(values[:, j])]
+        # the sketch answers with the order statistic at rank q * (n - 1), rounded down
+        exact = np.quantile(col, qs, method="lower")
+        assert np.all(np.abs(est[:, j] - exact) <= REL_ERR * exact + 1e-12), METRICS[j]
+    assert np.allclose(sk.mean(), np.nanmean(values, axis=0))
+
+
+def test_empty_metric_and_save_load(tmp_path):
+    sk = QuantileSketch(METRICS).update([[1200.0, 5e5, np.nan], [800.0, 7e5, np.nan]])
+    assert np.isnan(sk.quantiles([0.5])[0, 2]) and np.isnan(sk.mean()[2])
+    loaded = QuantileSketch.load(sk.save(tmp_path / "round.npz"))
+    assert loaded.metrics == METRICS
+    assert np.array_equal(loaded.quantiles([0.5, 0.9]), sk.quantiles([0.5, 0.9]), equal_nan=True)
+
+
+def test_merge_rejects_other_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(METRICS).merge(QuantileSketch(METRICS, rel_err=0.02))
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+import stats
+
+
+def lhr(score, fcp, lcp, si, tbt, cls):
+    audits = {"first-contentful-paint": fcp, "largest-contentful-paint": lcp, "speed-index": si,
+              "total-blocking-time": tbt, "cumulative-layout-shift": cls}
+    return {"categories": {"performance": {"score": score}},
+            "audits": {k: {"numericValue": v} for k, v in audits.items()}}
+
+
+STABLE = [lhr(0.91, 900, 1500, 1200, 20, 0.001), lhr(0.92, 940, 1580, 1260, 35, 0.002),
+          lhr(0.90, 910, 1530, 1210, 28, 0.001)]
+NOISY = [lhr(0.45, 2400, 6100, 5200, 480, 0.05), lhr(0.71, 3900, 9400, 7900, 120, 0.31),
+         lhr(0.58, 3100, 7700, 6100, 900, 0.12), lhr(0.39, 5200, 11800, 9100, 260, 0.02)]
+
+
+def test_stable_site_stops_at_min_runs():
+    assert stats.needs_more_runs(STABLE[:2])  # too few runs to judge either way
+    assert not stats.needs_more_runs(STABLE)
+
+
+def test_fast_site_settles_on_absolute_floor():
+    # 20 ms vs 35 ms TBT is a 50% spread but well inside the ms tolerance
+    runs = [lhr(0.99, 400, 600, 500, 0, 0), lhr(0.99, 420, 640, 510, 30, 0), lhr(0.98, 410, 610, 520, 15, 0)]
+    assert not stats.needs_more_runs(runs)
+    assert not stats.needs_more_runs(runs, rel_width=0.0)
+
+
+def test_noisy_site_keeps_running():
+    for k in range(1, len(NOISY) + 1):
+        assert stats.needs_more_runs(NOISY[:k])
+    assert stats.needs_more_runs(NOISY * 2)
+
+
+def test_bootstrap_decides_from_min_ci_runs():
+    # one wild run among nine: the range is too wide but the median's CI is narrow
+    runs = STABLE * 3
+    runs[0] = lhr(0.91, 2000, 1500, 1200, 20, 0.001)
+    values = stats.pack_runs([[stats.run_values(r) for r in runs]])
+    assert not stats.settled(values[:, :3])[0, 1]
+    assert stats.settled(values)[0, 1]
+
+
+def test_bootstrap_ci_shape_and_bounds():
+    rng = np.random.default_rng(3)
+    values = rng.gamma(4.0, 500.0, size=(7, 5, len(stats.CI_METRICS)))
+    est, low, high = stats.bootstrap_ci(values, n_boot=200)
+    assert est.shape == low.shape == high.shape == (7, len(stats.CI_METRICS))
+    assert np.all(low <= est) and np.all(est <= high)
+    assert np.allclose(est, np.median(values, axis=1))
+
+    est, low, high = stats.bootstrap_ci(values[:, :, 0], n_boot=200, stat="mean")
+    assert est.shape == low.shape == (7,)
+    assert np.all(low <= est) and np.all(est <= high)
+
+
+def test_bootstrap_ci_nan_padding():
+    full = np.array([[1.0, 2.0, 3.0, 4.0], [10.0, 20.0, 30.0, np.nan], [5.0, np.nan, np.nan, np.nan],
+                     [np.nan] * 4])
+    est, low, high = stats.bootstrap_ci(full, n_boot=500)
+    assert est[1] == 20 and est[2] == 5
+    # padding is never drawn: a 3-run site stays within its own values
+    assert 10 <= low[1] <= high[1] <= 30
+    assert low[2] == high[2] == 5
+    assert np.isnan([est[3], low[3], high[3]]).all()
+
+
+@pytest.mark.parametrize("chunk_cells", [stats.CHUNK_CELLS, 50, 1])
+def test_bootstrap_ci_deterministic(chunk_cells):
+    values = np.random.default_rng(5).normal(1000, 200, size=(4, 6, 2))
+    a = stats.bootstrap_ci(values, n_boot=300, seed=11, chunk_cells=chunk_cells)
+    b = stats.bootstrap_ci(values, n_boot=300, seed=11, chunk_cells=chunk_cells)
+    for x, y in zip(a, b):
+        assert np.array_equal(x, y)
+    c = stats.bootstrap_ci(values, n_boot=300, seed=12, chunk_cells=chunk_cells)
+    assert not np.array_equal(a[1], c[1])
@@ -0,0 +1,49 @@
+import json
+import subprocess
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+import telemetry
+
+scripts_dir = Path(__file__).resolve().parents[1]
+
+
+def saved(tmp_path, name, n, keep=telemetry.KEEP):
+    base = telemetry._utc_now()
+    paths = []
+    for i in range(n):
+        tel = telemetry.Telemetry(name)
+        tel.started_at = base + timedelta(seconds=i)
+        paths.append(tel.save(tmp_path, keep=keep))
+    return paths
+
+
+def test_only_newest_manifests_kept_per_name(tmp_path):
+    builds = saved(tmp_path, "build", 5, keep=3)
+    others = saved(tmp_path, "build_charts", 2) + saved(tmp_path, "ingest", 2)
+    left = sorted(p.name for p in (tmp_path / telemetry.TELEMETRY_DIR).iterdir())
+    assert left == sorted(p.name for p in builds[-3:] + others)
+    assert telemetry.prune(tmp_path / telemetry.TELEMETRY_DIR, "ingest", keep=1) == others[2:3]
+
+
+def test_cli_stage_saves_on_failure(tmp_path):
+    log = []
+    with pytest.raises(ValueError):
+        with telemetry.cli_stage("history", tmp_path, log=log.append, command="deltas"):
+            raise ValueError("no round 'x'")
+    (path,) = (tmp_path / telemetry.TELEMETRY_DIR).glob("history_*.json")
+    assert log == [f"Telemetry: {path}"]
+    (stage,) = json.loads(path.read_text(encoding="utf-8"))["stages"]
+    assert stage["stage"] == "history" and stage["command"] == "deltas"
+    assert stage["error"] == "ValueError: no round 'x'"
+
+
+def test_standalone_ingest_writes_telemetry(evidence):
+    subprocess.run([sys.executable, str(scripts_dir / "ingest.py"), "--runs-dir", str(evidence / "lighthouse" / "runs"),
+                    "--out", str(evidence / "store")], check=True, capture_output=True, cwd=scripts_dir)
+    (path,) = (evidence / telemetry.TELEMETRY_DIR).glob("ingest_*.json")
+    (stage,) = json.loads(path.read_text(encoding="utf-8"))["stages"]
+    assert stage["stage"] == "ingest" and stage["rows"] == 9 and stage["skipped"] == 0